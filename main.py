@@ -5,26 +5,111 @@ Built iteratively - starting with Person table
 """
 
 import os
+import time
 import argparse
+from contextlib import nullcontext
 from sqlalchemy import text
 from config.database import DatabaseConfig
 from src.database.connection import DatabaseManager
+from src.database.table_reset import TableResetManager
 from src.extractors.synthea_extractor import SyntheaExtractor
+from typing import Callable, List, Optional
 from src.utils.logging import setup_logging
 import pandas as pd
 
 from src.transformers.person_transformer import PersonTransformer
 from src.loaders.person_loader import PersonLoader
+from src.loaders.bulk_loader import LOAD_MODES, LOAD_MODE_COPY
+from src.vocabulary.vocabulary_service import VocabularyService
+from src.vocabulary.vocabulary_snapshot import VocabularySnapshot
+from src.pipeline.scheduler import TableScheduler, FAIL_FAST, FAILURE_POLICIES, SUCCEEDED, dependents
+from src.pipeline.run_manifest import RunManifest, file_fingerprint, fingerprint
+from src.pipeline.run_context import RunContext
+from src.pipeline.stage_runner import StageRunner
+from src.utils.era_engine import ERA_MODES, ERA_MODE_PYTHON, ERA_MODE_DATABASE
+
+# Tables each table needs loaded first (see run_pipeline); tables outside a run's
+# selection are assumed to be loaded already
+TABLE_DEPENDENCIES = {
+    'location': [],
+    'care_site': ['location'],
+    'provider': ['location', 'care_site'],
+    'person': ['location', 'provider', 'care_site'],
+    'visit_occurrence': ['person', 'provider', 'care_site'],
+    'update_person': ['visit_occurrence'],
+    'condition_occurrence': ['person', 'visit_occurrence'],
+    'observation': ['person', 'visit_occurrence'],
+    'observation_period': ['person'],
+    'procedure_occurrence': ['person', 'visit_occurrence'],
+    'death': ['person'],
+    'drug_exposure': ['person', 'visit_occurrence'],
+    'measurement': ['person', 'visit_occurrence'],
+    'condition_era': ['condition_occurrence'],
+    'drug_era': ['drug_exposure'],
+    'dose_era': ['drug_exposure']
+}
+
+# Synthea files each table is built from; part of the table's resume fingerprint
+TABLE_SOURCES = {
+    'location': ['providers.csv', 'patients.csv'],
+    'care_site': ['providers.csv'],
+    'provider': ['providers.csv'],
+    'person': ['patients.csv'],
+    'visit_occurrence': ['encounters.csv'],
+    'update_person': [],
+    'condition_occurrence': ['conditions.csv'],
+    'observation': ['observations.csv', 'conditions.csv'],
+    'observation_period': ['encounters.csv', 'conditions.csv', 'procedures.csv',
+                           'medications.csv', 'observations.csv', 'patients.csv'],
+    'procedure_occurrence': ['procedures.csv', 'observations.csv'],
+    'death': ['patients.csv', 'observations.csv'],
+    'drug_exposure': ['medications.csv', 'immunizations.csv'],
+    'measurement': ['observations.csv'],
+    'condition_era': [],
+    'drug_era': [],
+    'dose_era': []
+}
 
 class SyntheaToOMOPPipeline:
-    def __init__(self, test_mode: bool = True, batch_size: int = 500):
+    def __init__(self, test_mode: bool = True, batch_size: int = 500, load_mode: str = LOAD_MODE_COPY,
+                 use_vocab_snapshot: bool = True, chunk_size: Optional[int] = None,
+                 use_staging: bool = True, max_workers: int = 1, on_failure: str = FAIL_FAST,
+                 manifest_path: Optional[str] = None, era_mode: str = ERA_MODE_PYTHON,
+                 debug: bool = False, assignment_slices: int = 1, rebuild_indexes: bool = False,
+                 load_workers: int = 1):
         self.test_mode = test_mode
         self.batch_size = batch_size
+        self.load_mode = load_mode
+        # Connections copying slices of one large table load concurrently
+        self.load_workers = load_workers
+        # Rows per streamed source chunk; None loads each source table whole
+        self.chunk_size = chunk_size
+        # Tables processed concurrently once their dependencies are loaded
+        self.max_workers = max_workers
+        self.on_failure = on_failure
+        # Build era tables in pandas or with INSERT ... SELECT in PostgreSQL
+        self.era_mode = era_mode
+        # Transformers print every matched vocabulary code
+        self.debug = debug
+        # person_id ranges the provider/care site assignment UPDATE is split into
+        self.assignment_slices = assignment_slices
+        # Drop indexes and constraints of the processed tables while loading, rebuild them after
+        self.rebuild_indexes = rebuild_indexes
         self.logger = setup_logging(log_level="INFO")
 
         self.db_config = DatabaseConfig.from_env()
         self.db_manager = DatabaseManager(self.db_config)
-        self.extractor = SyntheaExtractor(os.getenv('SYNTHEA_DATA_PATH'))
+        # TRUNCATE along the CDM foreign key graph, DELETE when loaded data depends on a table
+        self.table_reset = TableResetManager(self.db_manager)
+        self.vocabulary = VocabularyService(
+            self.db_manager,
+            snapshot=VocabularySnapshot(self.db_manager) if use_vocab_snapshot else None
+        )
+        self.extractor = SyntheaExtractor(os.getenv('SYNTHEA_DATA_PATH'), use_staging=use_staging)
+        # Completion records used by --resume
+        self.manifest = RunManifest(manifest_path)
+        # Person/visit/location/provider/care_site sets handed from parent to child tables
+        self.context = RunContext(self.db_manager)
 
         self.stats = {
             'patients_extracted': 0,
@@ -46,50 +131,24 @@ class SyntheaToOMOPPipeline:
             if not self._setup_and_validate():
                 return False
 
-            for table in tables_to_process:
-                self.logger.info(f"\n📋 Processing {table.upper()} table...")
-
-                if table == 'person':
-                    success = self._process_person_table()
-                elif table == 'location':
-                    success = self._process_location_table()
-                elif table == 'care_site':
-                    success = self._process_care_site_table()
-                elif table == 'provider':
-                    success = self._process_provider_table()
-                elif table == 'visit_occurrence':
-                    success = self._process_visit_occurrence_table()
-                elif table == 'update_person':
-                    success = self._update_person_assignments()
-                elif table == 'condition_occurrence':
-                    success = self._process_condition_occurrence_table()     
-                elif table == 'observation':
-                    success = self._process_observation_table()
-                elif table == 'observation_period':
-                    success = self._process_observation_period_table()
-                elif table == 'procedure_occurrence':
-                    success = self._process_procedure_occurrence_table()
-                elif table == 'death':
-                    success = self._process_death_table()
-                elif table == 'drug_exposure':
-                    success = self._process_drug_exposure_table()
-                elif table == 'measurement':
-                    success = self._process_measurement_table()
-                elif table == 'condition_era':
-                    success = self._process_condition_era_table()
-                elif table == 'drug_era':
-                    success = self._process_drug_era_table()
-                elif table == 'dose_era':
-                    success = self._process_dose_era_table()
-                else:
-                    self.logger.warning(f"⚠️ Table {table} not implemented yet")
-                    continue
-
-                if not success:
-                    self.logger.error(f"❌ Failed to process {table} table")
-                    return False
+            scheduler = TableScheduler(TABLE_DEPENDENCIES, max_workers=self.max_workers,
+                                       on_failure=self.on_failure, logger=self.logger)
+            if self.max_workers > 1:
+                self.logger.info(f"⚙️ Processing up to {self.max_workers} tables in parallel "
+                                 f"(on failure: {self.on_failure})")
+
+            with self._load_session(tables_to_process):
+                results = scheduler.run(tables_to_process, self._process_table)
 
-                self.logger.info(f"✅ {table.upper()} table processed successfully")
+            for table, status in results.items():
+                duration = scheduler.durations.get(table)
+                timing = f" in {duration:.1f}s" if duration is not None else ""
+                self.logger.info(f"  {table}: {status}{timing}")
+
+            failed = [table for table, status in results.items() if status != SUCCEEDED]
+            if failed:
+                self.logger.error(f"❌ Tables not processed: {failed}")
+                return False
 
             self._print_summary()
             return True
@@ -98,6 +157,109 @@ class SyntheaToOMOPPipeline:
             self.logger.error(f"❌ Pipeline failed: {e}")
             return False
 
+    def _load_session(self, tables_to_process: List[str]):
+        """Index/constraint load session over the processed CDM tables (no-op unless --rebuild-indexes)"""
+        if not self.rebuild_indexes:
+            return nullcontext()
+        tables = [table for table in tables_to_process if hasattr(self, f'clear_{table}_table')]
+        self.logger.info(f"🔧 Dropping indexes and constraints on {len(tables)} tables until they are loaded...")
+        return self.db_manager.load_session(tables)
+
+    def _process_table(self, table: str) -> bool:
+        """Process a single table; called by the scheduler, possibly from a worker thread"""
+        processors = {
+            'person': self._process_person_table,
+            'location': self._process_location_table,
+            'care_site': self._process_care_site_table,
+            'provider': self._process_provider_table,
+            'visit_occurrence': self._process_visit_occurrence_table,
+            'update_person': self._update_person_assignments,
+            'condition_occurrence': self._process_condition_occurrence_table,
+            'observation': self._process_observation_table,
+            'observation_period': self._process_observation_period_table,
+            'procedure_occurrence': self._process_procedure_occurrence_table,
+            'death': self._process_death_table,
+            'drug_exposure': self._process_drug_exposure_table,
+            'measurement': self._process_measurement_table,
+            'condition_era': self._process_condition_era_table,
+            'drug_era': self._process_drug_era_table,
+            'dose_era': self._process_dose_era_table
+        }
+
+        if table not in processors:
+            self.logger.warning(f"⚠️ Table {table} not implemented yet")
+            return True
+
+        self.logger.info(f"\n📋 Processing {table.upper()} table...")
+        table_fingerprint = self._table_fingerprint(table)
+        # Rebuilding a table can cascade into its dependents, so they are no longer complete
+        self.manifest.invalidate(dependents(TABLE_DEPENDENCIES, table))
+        self.manifest.mark_started(table)
+        # The table is about to be cleared, so its reference set is refetched or re-recorded
+        self.context.invalidate(table)
+        started = time.perf_counter()
+
+        success = processors[table]()
+
+        if not success:
+            self.manifest.mark_failed(table)
+            self.logger.error(f"❌ Failed to process {table} table")
+            return False
+
+        self.manifest.mark_complete(table, table_fingerprint, self._count_rows(table),
+                                    time.perf_counter() - started)
+        self.logger.info(f"✅ {table.upper()} table processed successfully")
+        return True
+
+    def tables_to_rebuild(self, tables: List[str]) -> List[str]:
+        """
+        Tables that --resume still has to process.
+
+        A table is skipped when the manifest records it complete with the same input
+        fingerprint and its row count still matches, and none of its requested
+        prerequisites is being rebuilt.
+        """
+        stale = set()
+        for table in tables:
+            entry = self.manifest.entry(table)
+            if not self.manifest.is_complete(table, self._table_fingerprint(table)):
+                stale.add(table)
+            elif entry.get('row_count') is not None and entry['row_count'] != self._count_rows(table):
+                self.logger.info(f"🔄 {table} row count changed since it was completed")
+                stale.add(table)
+
+        # Anything downstream of a rebuilt table is rebuilt too
+        for table in list(stale):
+            stale.update(dep for dep in dependents(TABLE_DEPENDENCIES, table) if dep in tables)
+
+        for table in tables:
+            if table not in stale:
+                self.logger.info(f"⏭️ {table} is complete and unchanged, skipping")
+
+        return [table for table in tables if table in stale]
+
+    def _table_fingerprint(self, table: str) -> str:
+        """Hash of everything a table's contents depend on besides its prerequisites"""
+        data_path = self.extractor.data_path
+        return fingerprint({
+            'table': table,
+            'sources': {name: file_fingerprint(data_path / name) for name in TABLE_SOURCES.get(table, [])},
+            'target': f"{self.db_config.host}:{self.db_config.port}/{self.db_config.database}/"
+                      f"{self.db_config.schema_cdm}",
+            'schema_vocab': self.db_config.schema_vocab,
+            'test_mode': self.test_mode
+        })
+
+    def _count_rows(self, table: str) -> Optional[int]:
+        """Current row count of the OMOP table a pipeline step writes to"""
+        target = 'person' if table == 'update_person' else table
+        try:
+            with self.db_manager.engine.connect() as conn:
+                return conn.execute(text(f"SELECT COUNT(*) FROM {self.db_config.schema_cdm}.{target}")).scalar()
+        except Exception as e:
+            self.logger.warning(f"⚠️ Could not count {target} rows: {e}")
+            return None
+
     def _setup_and_validate(self) -> bool:
         self.logger.info("1️⃣ Setting up connections and validating data...")
 
@@ -122,6 +284,61 @@ class SyntheaToOMOPPipeline:
 
         return True
 
+    def _stream_transform_load(self, table: str, transform: Callable[[pd.DataFrame, int], pd.DataFrame],
+                               load: Callable[[pd.DataFrame], bool], columns: Optional[List[str]] = None,
+                               rows_numbered: Optional[Callable[[], int]] = None,
+                               target: Optional[str] = None) -> int:
+        """
+        Run extract -> transform -> load one source chunk at a time, with the three
+        stages overlapped on their own threads (see StageRunner): chunk n+1 is
+        transformed while chunk n is loaded, and bounded queues keep memory flat.
+
+        Args:
+            table: Synthea source table to stream
+            transform: Called as transform(chunk, row_offset), returns OMOP rows
+            load: Loads one transformed chunk, returns False on failure
+            columns: Source columns to read (default: all)
+            rows_numbered: Rows the last transform call numbered, used to advance
+                           row_offset so row-based IDs match a whole-table run
+            target: OMOP table the chunks are loaded into; its row count is logged
+                    once the stream ends (chunk loads are called with report_count=False)
+
+        Returns:
+            Number of OMOP rows loaded
+        """
+        row_offset = 0
+        loaded = 0
+        chunks_read = 0
+
+        # Transform runs on one thread in chunk order, so chunk numbers and row_offset advance as before
+        def transform_chunk(chunk):
+            nonlocal row_offset, chunks_read
+            i = chunks_read
+            chunks_read += 1
+            self.logger.info(f"📥 {table} chunk {i+1}: {len(chunk)} rows")
+            omop_chunk = transform(chunk, row_offset)
+            if rows_numbered is not None:
+                row_offset += rows_numbered()
+            return None if omop_chunk.empty else (i, omop_chunk)
+
+        def load_chunk(numbered_chunk):
+            nonlocal loaded
+            i, omop_chunk = numbered_chunk
+            if not load(omop_chunk):
+                raise RuntimeError(f"Loading {table} chunk {i+1} failed")
+            loaded += len(omop_chunk)
+
+        # The reader generator itself goes to the runner, which closes it if a stage fails
+        StageRunner(logger=self.logger).run(
+            self.extractor.iter_chunks(table, self.chunk_size, columns=columns),
+            [('transform', transform_chunk), ('load', load_chunk)]
+        )
+
+        self.logger.info(f"✅ Streamed {loaded} OMOP rows from {table}")
+        if target is not None:
+            self.logger.info(f"📊 Total rows in {target}: {self._count_rows(target)}")
+        return loaded
+
     def _process_person_table(self) -> bool:
         try:
             self.clear_person_table()
@@ -142,7 +359,7 @@ class SyntheaToOMOPPipeline:
             self._show_sample_patient(patients_df)
 
             self.logger.info("🔄 Transforming to OMOP Person format...")
-            transformer = PersonTransformer(self.db_manager)
+            transformer = PersonTransformer(self.db_manager, context=self.context)
             omop_persons = transformer.transform(patients_df)
 
             if omop_persons.empty:
@@ -155,12 +372,14 @@ class SyntheaToOMOPPipeline:
             self._show_sample_person_omop(omop_persons)
 
             self.logger.info("💾 Loading to database...")
-            loader = PersonLoader(self.db_manager)
+            loader = PersonLoader(self.db_manager, load_mode=self.load_mode)
 
             if not loader.load_persons(omop_persons, batch_size=self.batch_size):
                 self.logger.error("❌ Database loading failed")
                 return False
 
+            self.context.record_persons(omop_persons['person_source_value'])
+
             self.stats['persons_loaded'] = len(omop_persons)
             loader.verify_data()
             return True
@@ -200,11 +419,13 @@ class SyntheaToOMOPPipeline:
                 self.logger.info(f"✅ Transformed to {len(omop_locations)} unique locations")
 
                 from src.loaders.location_loader import LocationLoader
-                loader = LocationLoader(self.db_manager)
+                loader = LocationLoader(self.db_manager, load_mode=self.load_mode)
 
                 if not loader.load_locations(omop_locations, batch_size=self.batch_size):
                     return False
 
+                self.context.record_locations(omop_locations)
+
                 loader.verify_data()
                 return True
 
@@ -237,11 +458,13 @@ class SyntheaToOMOPPipeline:
             self.logger.info(f"✅ Transformed to {len(omop_care_sites)} unique care sites")
 
             from src.loaders.care_site_loader import CareSiteLoader
-            loader = CareSiteLoader(self.db_manager)
+            loader = CareSiteLoader(self.db_manager, load_mode=self.load_mode)
 
             if not loader.load_care_sites(omop_care_sites, batch_size=self.batch_size):
                 return False
 
+            self.context.record_care_sites(omop_care_sites['care_site_id'])
+
             loader.verify_data()
             return True
 
@@ -273,11 +496,13 @@ class SyntheaToOMOPPipeline:
             self.logger.info(f"✅ Transformed to {len(omop_providers)} OMOP providers")
 
             from src.loaders.provider_loader import ProviderLoader
-            loader = ProviderLoader(self.db_manager)
+            loader = ProviderLoader(self.db_manager, load_mode=self.load_mode)
 
             if not loader.load_providers(omop_providers, batch_size=self.batch_size):
                 return False
 
+            self.context.record_providers(omop_providers['provider_id'])
+
             loader.verify_data()
             return True
 
@@ -300,7 +525,7 @@ class SyntheaToOMOPPipeline:
                 self.logger.info(f"✅ Extracted {len(encounters_df)} encounters")
 
                 from src.transformers.visit_occurrence_transformer import VisitOccurrenceTransformer
-                transformer = VisitOccurrenceTransformer()
+                transformer = VisitOccurrenceTransformer(context=self.context)
                 omop_visits = transformer.transform(encounters_df)
 
                 if omop_visits.empty:
@@ -310,11 +535,14 @@ class SyntheaToOMOPPipeline:
                 self.logger.info(f"✅ Transformed to {len(omop_visits)} visit occurrences")
 
                 from src.loaders.visit_occurrence_loader import VisitOccurrenceLoader
-                loader = VisitOccurrenceLoader(self.db_manager)
+                loader = VisitOccurrenceLoader(self.db_manager, load_mode=self.load_mode,
+                                               load_workers=self.load_workers)
 
                 if not loader.load_visit_occurrences(omop_visits, batch_size=100):  # Smaller batch size
                     return False
 
+                self.context.record_visits(omop_visits)
+
                 loader.verify_data()
                 return True
 
@@ -329,7 +557,7 @@ class SyntheaToOMOPPipeline:
             self.logger.info("🔄 Updating person assignments from visit data...")
             
             from src.updaters.person_assignment_updater import PersonAssignmentUpdater
-            updater = PersonAssignmentUpdater(self.db_manager)
+            updater = PersonAssignmentUpdater(self.db_manager, slices=self.assignment_slices)
             
             if not updater.update_assignments():
                 self.logger.error("❌ Failed to update person assignments")
@@ -346,6 +574,26 @@ class SyntheaToOMOPPipeline:
         """Process condition_occurrence table from condition data"""
         try:
             self.clear_condition_occurrence_table()
+
+            if self.chunk_size:
+                from src.transformers.condition_occurrence_transformer import ConditionOccurrenceTransformer
+                from src.loaders.condition_occurrence_loader import ConditionOccurrenceLoader
+                transformer = ConditionOccurrenceTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context)
+                loader = ConditionOccurrenceLoader(self.db_manager, load_mode=self.load_mode)
+
+                loaded = self._stream_transform_load(
+                    'conditions',
+                    lambda chunk, row_offset: transformer.transform(chunk),
+                    lambda omop: loader.load_condition_occurrences(omop, batch_size=100, report_count=False),
+                    target='condition_occurrence'
+                )
+                if loaded == 0:
+                    self.logger.error("❌ No condition occurrences after transformation")
+                    return False
+
+                loader.verify_data()
+                return True
+
             self.logger.info("📥 Extracting condition data...")
             conditions_df = self.extractor.get_conditions()
 
@@ -356,7 +604,7 @@ class SyntheaToOMOPPipeline:
             self.logger.info(f"✅ Extracted {len(conditions_df)} conditions")
 
             from src.transformers.condition_occurrence_transformer import ConditionOccurrenceTransformer
-            transformer = ConditionOccurrenceTransformer(self.db_manager)
+            transformer = ConditionOccurrenceTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context)
             omop_conditions = transformer.transform(conditions_df)
 
             if omop_conditions.empty:
@@ -366,7 +614,7 @@ class SyntheaToOMOPPipeline:
             self.logger.info(f"✅ Transformed to {len(omop_conditions)} condition occurrences")
 
             from src.loaders.condition_occurrence_loader import ConditionOccurrenceLoader
-            loader = ConditionOccurrenceLoader(self.db_manager)
+            loader = ConditionOccurrenceLoader(self.db_manager, load_mode=self.load_mode)
 
             if not loader.load_condition_occurrences(omop_conditions, batch_size=100):
                 return False
@@ -383,52 +631,37 @@ class SyntheaToOMOPPipeline:
         try:
             self.clear_observation_table()
             
-            all_observations = []
+            if self.chunk_size:
+                return self._stream_observation_table()
             
-            # Process observation source data
+            # Observation source data
             self.logger.info("📥 Extracting observation data...")
             observations_df = self.extractor.get_observations()
+            self.logger.info(f"✅ Extracted {len(observations_df)} observation records")
             
-            if not observations_df.empty:
-                self.logger.info(f"✅ Extracted {len(observations_df)} observation records")
-                
-                from src.transformers.observation_transformer import ObservationTransformer
-                transformer = ObservationTransformer(self.db_manager)
-                
-                omop_observations = transformer.transform_observations(observations_df)
-                if not omop_observations.empty:
-                    all_observations.append(omop_observations)
-                    self.logger.info(f"✅ Transformed {len(omop_observations)} observation records")
-            
-            # Process excluded condition data (records that should be observations)
+            # Excluded condition data (records that should be observations)
             self.logger.info("📥 Extracting excluded condition data for observations...")
             conditions_df = self.extractor.get_conditions()
+            excluded_conditions = self._get_excluded_conditions(conditions_df) if not conditions_df.empty else pd.DataFrame()
+            if not excluded_conditions.empty:
+                self.logger.info(f"✅ Found {len(excluded_conditions)} excluded conditions to process as observations")
             
-            if not conditions_df.empty:
-                # Get conditions that were excluded from condition_occurrence
-                excluded_conditions = self._get_excluded_conditions(conditions_df)
-                
-                if not excluded_conditions.empty:
-                    self.logger.info(f"✅ Found {len(excluded_conditions)} excluded conditions to process as observations")
-                    
-                    transformer = ObservationTransformer(self.db_manager)
-                    omop_excluded_obs = transformer.transform_excluded_conditions(excluded_conditions)
-                    
-                    if not omop_excluded_obs.empty:
-                        all_observations.append(omop_excluded_obs)
-                        self.logger.info(f"✅ Transformed {len(omop_excluded_obs)} excluded conditions to observations")
-            
-            # Combine all observation data
-            if not all_observations:
+            # Both sources as one typed frame for a single bulk load
+            from src.transformers.observation_transformer import ObservationTransformer
+            transformer = ObservationTransformer(self.db_manager, vocabulary=self.vocabulary,
+                                                 context=self.context, debug=self.debug)
+            combined_observations = transformer.transform(observations_df, excluded_conditions)
+            
+            if combined_observations.empty:
                 self.logger.error("❌ No observation data to process")
                 return False
             
-            combined_observations = pd.concat(all_observations, ignore_index=True)
             self.logger.info(f"✅ Combined total: {len(combined_observations)} observation records")
             
             # Load to database
             from src.loaders.observation_loader import ObservationLoader
-            loader = ObservationLoader(self.db_manager)
+            loader = ObservationLoader(self.db_manager, load_mode=self.load_mode,
+                                       load_workers=self.load_workers)
 
             if not loader.load_observations(combined_observations, batch_size=50):
                 return False
@@ -441,33 +674,50 @@ class SyntheaToOMOPPipeline:
             self.stats['errors'].append(f"Observation: {str(e)}")
             return False
         
+    def _stream_observation_table(self) -> bool:
+        """Chunked variant of _process_observation_table"""
+        from src.transformers.observation_transformer import ObservationTransformer
+        from src.loaders.observation_loader import ObservationLoader
+        transformer = ObservationTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context,
+                                             debug=self.debug)
+        loader = ObservationLoader(self.db_manager, load_mode=self.load_mode,
+                                   load_workers=self.load_workers)
+        load = lambda omop: loader.load_observations(omop, batch_size=50, report_count=False)
+
+        loaded = self._stream_transform_load(
+            'observations',
+            transformer.transform_observations,
+            load,
+            rows_numbered=lambda: transformer.rows_numbered,
+            target='observation'
+        )
+
+        # Conditions that belong in the Observation domain
+        loaded += self._stream_transform_load(
+            'conditions',
+            lambda chunk, row_offset: transformer.transform_excluded_conditions(self._get_excluded_conditions(chunk))
+            if not chunk.empty else pd.DataFrame(),
+            load,
+            target='observation'
+        )
+
+        if loaded == 0:
+            self.logger.error("❌ No observation data to process")
+            return False
+
+        loader.verify_data()
+        return True
+
     def _get_excluded_conditions(self, conditions_df: pd.DataFrame) -> pd.DataFrame:
         """Get condition records that were excluded from condition_occurrence (should be observations)"""
         try:
             if not self.db_manager:
                 return pd.DataFrame()
             
-            # Get unique SNOMED codes from conditions
-            unique_codes = conditions_df['CODE'].unique()
-            code_list = "', '".join(unique_codes.astype(str))
-            
-            # Find codes that are NOT in Condition domain (should be observations)
-            excluded_codes_query = f"""
-            SELECT DISTINCT 
-                c.concept_code,
-                c.concept_id,
-                c.concept_name,
-                c.domain_id,
-                c.vocabulary_id
-            FROM {self.db_manager.config.schema_cdm}.concept c
-            WHERE c.concept_code IN ('{code_list}')
-              AND c.vocabulary_id = 'SNOMED'
-              AND c.domain_id != 'Condition'
-              AND c.domain_id = 'Observation'
-              AND c.invalid_reason IS NULL
-            """
-            
-            excluded_codes = self.db_manager.execute_query(excluded_codes_query)
+            # Find SNOMED codes that are in the Observation domain instead of Condition
+            excluded_codes = self.vocabulary.valid_codes(
+                conditions_df['CODE'], domain='Observation', vocabularies=['SNOMED']
+            )
             
             if excluded_codes.empty:
                 self.logger.info("ℹ️ No condition codes found that should be observations")
@@ -507,7 +757,7 @@ class SyntheaToOMOPPipeline:
             self.logger.info(f"✅ Calculated {len(observation_periods)} observation periods")
 
             from src.loaders.observation_period_loader import ObservationPeriodLoader
-            loader = ObservationPeriodLoader(self.db_manager)
+            loader = ObservationPeriodLoader(self.db_manager, load_mode=self.load_mode)
 
             if not loader.load_observation_periods(observation_periods, batch_size=500):
                 return False
@@ -525,46 +775,62 @@ class SyntheaToOMOPPipeline:
         try:
             self.clear_procedure_occurrence_table()
             
-            all_procedures = []
+            if self.chunk_size:
+                from src.transformers.procedure_occurrence_transformer import ProcedureOccurrenceTransformer
+                from src.loaders.procedure_occurrence_loader import ProcedureOccurrenceLoader
+                loader = ProcedureOccurrenceLoader(self.db_manager, load_mode=self.load_mode)
+                load = lambda omop: loader.load_procedure_occurrences(omop, batch_size=100, report_count=False)
+                
+                transformer = ProcedureOccurrenceTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context,
+                                                             debug=self.debug)
+                loaded = self._stream_transform_load(
+                    'procedures', transformer.transform_procedures, load,
+                    rows_numbered=lambda: transformer.rows_numbered,
+                    target='procedure_occurrence'
+                )
+                
+                obs_transformer = ProcedureOccurrenceTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context,
+                                                                 debug=self.debug)
+                loaded += self._stream_transform_load(
+                    'observations', obs_transformer.transform_observation_procedures, load,
+                    rows_numbered=lambda: obs_transformer.rows_numbered,
+                    target='procedure_occurrence'
+                )
+                
+                if loaded == 0:
+                    self.logger.error("❌ No procedure data to process")
+                    return False
+                
+                loader.verify_data()
+                return True
             
-            # Process procedure source data
+            # Procedure source data and observation data for procedures (CATEGORY='procedure')
             self.logger.info("📥 Extracting procedure data...")
             procedures_df = self.extractor.get_procedures()
+            self.logger.info(f"✅ Extracted {len(procedures_df)} procedure records")
             
-            if not procedures_df.empty:
-                self.logger.info(f"✅ Extracted {len(procedures_df)} procedure records")
-                
-                from src.transformers.procedure_occurrence_transformer import ProcedureOccurrenceTransformer
-                transformer = ProcedureOccurrenceTransformer(self.db_manager)
-                
-                omop_procedures = transformer.transform_procedures(procedures_df)
-                if not omop_procedures.empty:
-                    all_procedures.append(omop_procedures)
-                    self.logger.info(f"✅ Transformed {len(omop_procedures)} procedure records")
-            
-            # Process observation data for procedures (CATEGORY='procedure')
             self.logger.info("📥 Extracting observation data for procedures...")
             observations_df = self.extractor.get_observations()
             
-            if not observations_df.empty:
-                transformer = ProcedureOccurrenceTransformer(self.db_manager)
-                omop_obs_procedures = transformer.transform_observation_procedures(observations_df)
-                
-                if not omop_obs_procedures.empty:
-                    all_procedures.append(omop_obs_procedures)
-                    self.logger.info(f"✅ Transformed {len(omop_obs_procedures)} observation procedures")
+            if procedures_df.empty and observations_df.empty:
+                self.logger.error("❌ No procedure data to process")
+                return False
             
-            # Combine all procedure data
-            if not all_procedures:
+            # Both sources in one pass: one domain filter, concept preload and visit join
+            from src.transformers.procedure_occurrence_transformer import ProcedureOccurrenceTransformer
+            transformer = ProcedureOccurrenceTransformer(self.db_manager, vocabulary=self.vocabulary,
+                                                         context=self.context, debug=self.debug)
+            combined_procedures = transformer.transform(procedures_df, observations_df)
+            
+            if combined_procedures.empty:
                 self.logger.error("❌ No procedure data to process")
                 return False
             
-            combined_procedures = pd.concat(all_procedures, ignore_index=True)
             self.logger.info(f"✅ Combined total: {len(combined_procedures)} procedure occurrence records")
             
             # Load to database
             from src.loaders.procedure_occurrence_loader import ProcedureOccurrenceLoader
-            loader = ProcedureOccurrenceLoader(self.db_manager)
+            loader = ProcedureOccurrenceLoader(self.db_manager, load_mode=self.load_mode)
 
             if not loader.load_procedure_occurrences(combined_procedures, batch_size=100):
                 return False
@@ -592,7 +858,15 @@ class SyntheaToOMOPPipeline:
             
             # Extract observation data (needed for death certificates)
             self.logger.info("📥 Extracting observation data for death certificates...")
-            observations_df = self.extractor.get_observations()
+            from src.transformers.death_transformer import DeathTransformer
+            transformer = DeathTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context)
+            
+            # Only the death certificate rows are needed; the filter is pushed down to the staged Parquet scan
+            observations_df = self.extractor.read_table(
+                'observations',
+                columns=['PATIENT', 'CODE', 'VALUE'],
+                filters=[('CODE', '=', transformer.death_certificate_code)]
+            )
             
             if observations_df.empty:
                 self.logger.warning("⚠️ No observation data found - will process deaths without certificate info")
@@ -601,9 +875,6 @@ class SyntheaToOMOPPipeline:
             self.logger.info(f"✅ Extracted {len(patients_df)} patients and {len(observations_df)} observations")
             
             # Transform death data
-            from src.transformers.death_transformer import DeathTransformer
-            transformer = DeathTransformer(self.db_manager)
-            
             omop_deaths = transformer.transform(patients_df, observations_df)
             
             if omop_deaths.empty:
@@ -614,7 +885,7 @@ class SyntheaToOMOPPipeline:
             
             # Load to database
             from src.loaders.death_loader import DeathLoader
-            loader = DeathLoader(self.db_manager)
+            loader = DeathLoader(self.db_manager, load_mode=self.load_mode)
             
             if not loader.load_deaths(omop_deaths, batch_size=500):
                 return False
@@ -633,6 +904,33 @@ class SyntheaToOMOPPipeline:
         try:
             self.clear_drug_exposure_table()
             
+            if self.chunk_size:
+                from src.transformers.drug_exposure_transformer import DrugExposureTransformer
+                from src.loaders.drug_exposure_loader import DrugExposureLoader
+                loader = DrugExposureLoader(self.db_manager, load_mode=self.load_mode,
+                                            load_workers=self.load_workers)
+                load = lambda omop: loader.load_drug_exposures(omop, batch_size=150, report_count=False)
+                
+                transformer = DrugExposureTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context,
+                                                      debug=self.debug)
+                loaded = self._stream_transform_load(
+                    'medications', transformer.transform_medications, load,
+                    rows_numbered=lambda: transformer.rows_numbered,
+                    target='drug_exposure'
+                )
+                loaded += self._stream_transform_load(
+                    'immunizations', transformer.transform_immunizations, load,
+                    rows_numbered=lambda: transformer.rows_numbered,
+                    target='drug_exposure'
+                )
+                
+                if loaded == 0:
+                    self.logger.error("❌ No drug exposure data to process")
+                    return False
+                
+                loader.verify_data()
+                return True
+            
             all_drug_exposures = []
             
             # Process medication source data
@@ -643,7 +941,8 @@ class SyntheaToOMOPPipeline:
                 self.logger.info(f"✅ Extracted {len(medications_df)} medication records")
                 
                 from src.transformers.drug_exposure_transformer import DrugExposureTransformer
-                transformer = DrugExposureTransformer(self.db_manager)
+                transformer = DrugExposureTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context,
+                                                      debug=self.debug)
                 
                 omop_medications = transformer.transform_medications(medications_df)
                 if not omop_medications.empty:
@@ -657,7 +956,8 @@ class SyntheaToOMOPPipeline:
             if not immunizations_df.empty:
                 self.logger.info(f"✅ Extracted {len(immunizations_df)} immunization records")
                 
-                transformer = DrugExposureTransformer(self.db_manager)
+                transformer = DrugExposureTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context,
+                                                      debug=self.debug)
                 omop_immunizations = transformer.transform_immunizations(immunizations_df)
                 
                 if not omop_immunizations.empty:
@@ -674,7 +974,8 @@ class SyntheaToOMOPPipeline:
             
             # Load to database
             from src.loaders.drug_exposure_loader import DrugExposureLoader
-            loader = DrugExposureLoader(self.db_manager)
+            loader = DrugExposureLoader(self.db_manager, load_mode=self.load_mode,
+                                        load_workers=self.load_workers)
             
             if not loader.load_drug_exposures(combined_drug_exposures, batch_size=150):
                 return False
@@ -692,6 +993,27 @@ class SyntheaToOMOPPipeline:
         try:
             self.clear_measurement_table()
             
+            if self.chunk_size:
+                from src.transformers.measurement_transformer import MeasurementTransformer
+                from src.loaders.measurement_loader import MeasurementLoader
+                transformer = MeasurementTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context,
+                                                     debug=self.debug)
+                loader = MeasurementLoader(self.db_manager, load_mode=self.load_mode,
+                                           load_workers=self.load_workers)
+                
+                loaded = self._stream_transform_load(
+                    'observations', transformer.transform,
+                    lambda omop: loader.load_measurements(omop, batch_size=200, report_count=False),
+                    rows_numbered=lambda: transformer.rows_numbered,
+                    target='measurement'
+                )
+                if loaded == 0:
+                    self.logger.error("❌ No measurement records after transformation")
+                    return False
+                
+                loader.verify_data()
+                return True
+            
             # Extract observation data for measurements
             self.logger.info("📥 Extracting observation data for measurements...")
             observations_df = self.extractor.get_observations()
@@ -704,7 +1026,8 @@ class SyntheaToOMOPPipeline:
             
             # Transform to measurement data
             from src.transformers.measurement_transformer import MeasurementTransformer
-            transformer = MeasurementTransformer(self.db_manager)
+            transformer = MeasurementTransformer(self.db_manager, vocabulary=self.vocabulary, context=self.context,
+                                                 debug=self.debug)
             
             omop_measurements = transformer.transform(observations_df)
             
@@ -716,7 +1039,8 @@ class SyntheaToOMOPPipeline:
             
             # Load to database
             from src.loaders.measurement_loader import MeasurementLoader
-            loader = MeasurementLoader(self.db_manager)
+            loader = MeasurementLoader(self.db_manager, load_mode=self.load_mode,
+                                       load_workers=self.load_workers)
             
             if not loader.load_measurements(omop_measurements, batch_size=200):
                 return False
@@ -737,6 +1061,13 @@ class SyntheaToOMOPPipeline:
 
             from src.transformers.condition_era_transformer import ConditionEraTransformer
             transformer = ConditionEraTransformer(self.db_manager)
+
+            if self.era_mode == ERA_MODE_DATABASE:
+                transformer.build_in_database()
+                from src.loaders.condition_era_loader import ConditionEraLoader
+                ConditionEraLoader(self.db_manager, load_mode=self.load_mode).verify_data()
+                return True
+
             condition_eras = transformer.transform()
 
             if condition_eras.empty:
@@ -746,7 +1077,7 @@ class SyntheaToOMOPPipeline:
             self.logger.info(f"✅ Generated {len(condition_eras)} condition eras")
 
             from src.loaders.condition_era_loader import ConditionEraLoader
-            loader = ConditionEraLoader(self.db_manager)
+            loader = ConditionEraLoader(self.db_manager, load_mode=self.load_mode)
 
             if not loader.load_condition_eras(condition_eras, batch_size=500):
                 return False
@@ -766,7 +1097,14 @@ class SyntheaToOMOPPipeline:
             self.logger.info("🔄 Building drug eras from drug_exposure...")
 
             from src.transformers.drug_era_transformer import DrugEraTransformer
-            transformer = DrugEraTransformer(self.db_manager)
+            transformer = DrugEraTransformer(self.db_manager, vocabulary=self.vocabulary)
+
+            if self.era_mode == ERA_MODE_DATABASE:
+                transformer.build_in_database()
+                from src.loaders.drug_era_loader import DrugEraLoader
+                DrugEraLoader(self.db_manager, load_mode=self.load_mode).verify_data()
+                return True
+
             drug_eras = transformer.transform()
 
             if drug_eras.empty:
@@ -776,7 +1114,7 @@ class SyntheaToOMOPPipeline:
             self.logger.info(f"✅ Generated {len(drug_eras)} drug eras")
 
             from src.loaders.drug_era_loader import DrugEraLoader
-            loader = DrugEraLoader(self.db_manager)
+            loader = DrugEraLoader(self.db_manager, load_mode=self.load_mode)
 
             if not loader.load_drug_eras(drug_eras, batch_size=500):
                 return False
@@ -797,6 +1135,13 @@ class SyntheaToOMOPPipeline:
 
             from src.transformers.dose_era_transformer import DoseEraTransformer
             transformer = DoseEraTransformer(self.db_manager)
+
+            if self.era_mode == ERA_MODE_DATABASE:
+                transformer.build_in_database()
+                from src.loaders.dose_era_loader import DoseEraLoader
+                DoseEraLoader(self.db_manager, load_mode=self.load_mode).verify_data()
+                return True
+
             dose_eras = transformer.transform()
 
             if dose_eras.empty:
@@ -806,7 +1151,7 @@ class SyntheaToOMOPPipeline:
             self.logger.info(f"✅ Generated {len(dose_eras)} dose eras")
 
             from src.loaders.dose_era_loader import DoseEraLoader
-            loader = DoseEraLoader(self.db_manager)
+            loader = DoseEraLoader(self.db_manager, load_mode=self.load_mode)
 
             if not loader.load_dose_eras(dose_eras, batch_size=500):
                 return False
@@ -855,165 +1200,63 @@ class SyntheaToOMOPPipeline:
         self.logger.info("\n🎉 Pipeline completed successfully!")
         self.logger.info("👉 Check your database in DataGrip to verify results")
 
-    def clear_person_table(self):
-        self.logger.info("🧹 Clearing person table...")
+    def clear_tables(self, tables: List[str], cascade: bool = False) -> bool:
+        """Empty tables with one TRUNCATE (DELETE if loaded tables outside the set depend on them)"""
+        if not tables:
+            return True
+        self.logger.info(f"🧹 Clearing {', '.join(tables)} table{'s' if len(tables) > 1 else ''}...")
         try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                conn.execute(text(f"TRUNCATE TABLE {schema}.person RESTART IDENTITY CASCADE"))
-            self.logger.info("✅ Person table cleared")
+            method = self.table_reset.reset(tables, cascade=cascade)
+            self.logger.info(f"✅ Cleared {', '.join(tables)} ({method.upper()})")
+            return True
         except Exception as e:
             self.logger.error(f"❌ Clear failed: {e}")
+            return False
+
+    def clear_person_table(self):
+        self.clear_tables(['person'], cascade=True)
 
     def clear_location_table(self):
-        self.logger.info("🧹 Clearing location table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                conn.execute(text(f"DELETE FROM {schema}.location"))
-            self.logger.info("✅ Location table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
+        self.clear_tables(['location'])
 
     def clear_care_site_table(self):
-        self.logger.info("🧹 Clearing care_site table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                conn.execute(text(f"DELETE FROM {schema}.care_site"))
-            self.logger.info("✅ Care site table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
+        self.clear_tables(['care_site'])
 
     def clear_provider_table(self):
-        self.logger.info("🧹 Clearing provider table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                conn.execute(text(f"DELETE FROM {schema}.provider"))
-            self.logger.info("✅ Provider table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
-    
+        self.clear_tables(['provider'])
+
     def clear_visit_occurrence_table(self):
-            self.logger.info("🧹 Clearing visit_occurrence table...")
-            try:
-                schema = self.db_config.schema_cdm
-                with self.db_manager.engine.begin() as conn:
-                    # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                    conn.execute(text(f"DELETE FROM {schema}.visit_occurrence"))
-                self.logger.info("✅ Visit occurrence table cleared")
-            except Exception as e:
-                self.logger.error(f"❌ Clear failed: {e}")
-    
+        self.clear_tables(['visit_occurrence'])
+
     def clear_condition_occurrence_table(self):
-            self.logger.info("🧹 Clearing condition_occurrence table...")
-            try:
-                schema = self.db_config.schema_cdm
-                with self.db_manager.engine.begin() as conn:
-                    # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                    conn.execute(text(f"DELETE FROM {schema}.condition_occurrence"))
-                self.logger.info("✅ Condition occurrence table cleared")
-            except Exception as e:
-                self.logger.error(f"❌ Clear failed: {e}")
-    
+        self.clear_tables(['condition_occurrence'])
+
     def clear_observation_table(self):
-        self.logger.info("🧹 Clearing observation table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                conn.execute(text(f"DELETE FROM {schema}.observation"))
-            self.logger.info("✅ Observation table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
-    
+        self.clear_tables(['observation'])
+
     def clear_observation_period_table(self):
-        self.logger.info("🧹 Clearing observation_period table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                conn.execute(text(f"DELETE FROM {schema}.observation_period"))
-            self.logger.info("✅ Observation period table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
-    
+        self.clear_tables(['observation_period'])
+
     def clear_procedure_occurrence_table(self):
-        self.logger.info("🧹 Clearing procedure_occurrence table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                conn.execute(text(f"DELETE FROM {schema}.procedure_occurrence"))
-            self.logger.info("✅ Procedure occurrence table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
-    
+        self.clear_tables(['procedure_occurrence'])
+
     def clear_death_table(self):
-        self.logger.info("🧹 Clearing death table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                conn.execute(text(f"DELETE FROM {schema}.death"))
-            self.logger.info("✅ Death table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
-    
+        self.clear_tables(['death'])
+
     def clear_drug_exposure_table(self):
-        self.logger.info("🧹 Clearing drug_exposure table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                conn.execute(text(f"DELETE FROM {schema}.drug_exposure"))
-            self.logger.info("✅ Drug exposure table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
+        self.clear_tables(['drug_exposure'])
+
     def clear_measurement_table(self):
-        self.logger.info("🧹 Clearing measurement table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                # Use DELETE instead of TRUNCATE to avoid foreign key issues
-                conn.execute(text(f"DELETE FROM {schema}.measurement"))
-            self.logger.info("✅ Measurement table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
+        self.clear_tables(['measurement'])
 
     def clear_condition_era_table(self):
-        self.logger.info("🧹 Clearing condition_era table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                conn.execute(text(f"DELETE FROM {schema}.condition_era"))
-            self.logger.info("✅ Condition era table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
+        self.clear_tables(['condition_era'])
 
     def clear_drug_era_table(self):
-        self.logger.info("🧹 Clearing drug_era table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                conn.execute(text(f"DELETE FROM {schema}.drug_era"))
-            self.logger.info("✅ Drug era table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
+        self.clear_tables(['drug_era'])
 
     def clear_dose_era_table(self):
-        self.logger.info("🧹 Clearing dose_era table...")
-        try:
-            schema = self.db_config.schema_cdm
-            with self.db_manager.engine.begin() as conn:
-                conn.execute(text(f"DELETE FROM {schema}.dose_era"))
-            self.logger.info("✅ Dose era table cleared")
-        except Exception as e:
-            self.logger.error(f"❌ Clear failed: {e}")
+        self.clear_tables(['dose_era'])
 
 def main():
     parser = argparse.ArgumentParser(description='Synthea to OMOP ETL Pipeline')
@@ -1022,6 +1265,35 @@ def main():
     parser.add_argument('--all', action='store_true', help='Run complete pipeline with all tables')
     parser.add_argument('--tables', nargs='+', default=['person'], help='Tables to process (default: person)')
     parser.add_argument('--batch-size', type=int, default=500, help='Batch size for processing (default: 500)')
+    parser.add_argument('--load-mode', choices=LOAD_MODES, default=LOAD_MODE_COPY,
+                        help='How loaders write rows: COPY FROM STDIN or batched to_sql INSERTs (default: copy)')
+    parser.add_argument('--no-vocab-snapshot', action='store_true',
+                        help='Query vocabulary tables directly instead of the local vocabulary snapshot')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Stream large source tables through transform/load in chunks of this many rows')
+    parser.add_argument('--no-staging-cache', action='store_true',
+                        help='Read Synthea CSVs directly instead of the Parquet staging cache')
+    parser.add_argument('--max-workers', type=int, default=1,
+                        help='Process up to this many independent tables in parallel (default: 1)')
+    parser.add_argument('--on-failure', choices=FAILURE_POLICIES, default=FAIL_FAST,
+                        help='After a table fails, stop scheduling (fail-fast) or keep running '
+                             'tables that do not depend on it (continue)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip tables the run manifest records as complete with unchanged inputs')
+    parser.add_argument('--era-mode', choices=ERA_MODES, default=ERA_MODE_PYTHON,
+                        help='Build era tables in Python or with INSERT ... SELECT inside PostgreSQL '
+                             '(default: python)')
+    parser.add_argument('--debug', action='store_true',
+                        help='Print every vocabulary code matched while transforming')
+    parser.add_argument('--assignment-slices', type=int, default=1,
+                        help='Update person provider/care site assignments in N person_id ranges, '
+                             'one transaction each (default: 1)')
+    parser.add_argument('--rebuild-indexes', action='store_true',
+                        help='Drop indexes and constraints of the processed tables before loading, '
+                             'then rebuild them in parallel and ANALYZE')
+    parser.add_argument('--load-workers', type=int, default=1,
+                        help='Connections used to COPY large visit, observation, drug exposure and '
+                             'measurement loads in parallel slices (default: 1)')
 
     args = parser.parse_args()
 
@@ -1053,39 +1325,31 @@ def main():
     else:
         tables_to_process = args.tables
 
-    pipeline = SyntheaToOMOPPipeline(test_mode=args.test, batch_size=args.batch_size)
-
-    # Clear tables if requested
+    pipeline = SyntheaToOMOPPipeline(test_mode=args.test, batch_size=args.batch_size,
+                                      load_mode=args.load_mode,
+                                      use_vocab_snapshot=not args.no_vocab_snapshot,
+                                      chunk_size=args.chunk_size,
+                                      use_staging=not args.no_staging_cache,
+                                      max_workers=args.max_workers,
+                                      on_failure=args.on_failure,
+                                      era_mode=args.era_mode,
+                                      debug=args.debug,
+                                      assignment_slices=args.assignment_slices,
+                                      rebuild_indexes=args.rebuild_indexes,
+                                      load_workers=args.load_workers)
+
+    # Only tables that are incomplete or whose inputs changed are cleared and rebuilt
+    if args.resume:
+        tables_to_process = pipeline.tables_to_rebuild(tables_to_process)
+        if not tables_to_process:
+            print("\nAll requested tables are complete and unchanged, nothing to do")
+            return
+        print(f"Resuming with tables: {tables_to_process}")
+
+    # Clear tables if requested: every selected table in one reset, ordered by foreign key
     if args.clear:
-        if args.all:
-            # Clear order respects FK constraints: child tables first, then parent tables
-            # Era tables are derived and have no dependents, so clear them first
-            clear_order = [
-                'dose_era',         # Derived table, no dependents
-                'drug_era',         # Derived table, no dependents
-                'condition_era',    # Derived table, no dependents
-                'measurement',
-                'drug_exposure',
-                'death',
-                'procedure_occurrence',
-                'observation_period',
-                'observation',
-                'condition_occurrence',
-                'visit_occurrence',
-                'person',           # person references location, provider, care_site
-                'provider',         # provider references location, care_site
-                'care_site',        # care_site references location
-                'location'
-            ]
-            print("Clearing all tables in dependency order...")
-            for table in clear_order:
-                if hasattr(pipeline, f'clear_{table}_table'):
-                    getattr(pipeline, f'clear_{table}_table')()
-        else:
-            print("Clearing specified tables...")
-            for table in tables_to_process:
-                if hasattr(pipeline, f'clear_{table}_table'):
-                    getattr(pipeline, f'clear_{table}_table')()
+        print("Clearing selected tables...")
+        pipeline.clear_tables([table for table in tables_to_process if hasattr(pipeline, f'clear_{table}_table')])
 
     success = pipeline.run_pipeline(tables_to_process=tables_to_process)
 
@@ -4,6 +4,7 @@ from sqlalchemy.orm import sessionmaker
 import pandas as pd
 from typing import Generator, Dict, Any, List, Optional
 from config.database import DatabaseConfig
+from src.database.index_manager import IndexManager, DEFAULT_INDEX_WORKERS, DEFAULT_MAINTENANCE_WORK_MEM
 
 class DatabaseManager:
     """Handles database connections and operations"""
@@ -31,6 +32,20 @@ class DatabaseManager:
         finally:
             session.close()
     
+    @contextmanager
+    def load_session(self, tables: List[str], workers: int = DEFAULT_INDEX_WORKERS,
+                     maintenance_work_mem: str = DEFAULT_MAINTENANCE_WORK_MEM):
+        """
+        Bulk-load window for CDM tables: their indexes and constraints are dropped on
+        entry and rebuilt in parallel, followed by ANALYZE, on exit (also after an error)
+        """
+        manager = IndexManager(self, workers=workers, maintenance_work_mem=maintenance_work_mem)
+        manager.drop(tables)
+        try:
+            yield manager
+        finally:
+            manager.restore()
+    
     def execute_query(self, query: str, params: Dict[str, Any] = None) -> pd.DataFrame:
         """Execute a query and return results as DataFrame"""
         with self.engine.connect() as conn:
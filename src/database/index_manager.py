@@ -0,0 +1,165 @@
+# src/database/index_manager.py
+"""
+Index Manager
+
+Loading rows into a table with its primary key, unique constraints, foreign keys
+and indexes in place makes every row pay for index maintenance and constraint
+checks. For a full rebuild it is cheaper to drop them, load, and build each index
+once over the finished table. The index manager records the definitions of every
+index and constraint on the target tables (and the foreign keys pointing at them),
+drops them, and afterwards recreates them on parallel connections with a larger
+maintenance_work_mem: keys and indexes first, then the foreign keys that need
+them. It finishes with ANALYZE and reports the time spent in each phase.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import text
+
+DEFAULT_INDEX_WORKERS = 4
+DEFAULT_MAINTENANCE_WORK_MEM = '1GB'
+
+# Primary key, unique and foreign key constraints on the tables, plus foreign keys
+# in the schema that reference them
+CONSTRAINT_QUERY = """
+SELECT con.conname AS name, tbl.relname AS table_name, con.contype AS kind,
+       pg_get_constraintdef(con.oid) AS definition
+FROM pg_constraint con
+JOIN pg_class tbl ON tbl.oid = con.conrelid
+JOIN pg_namespace ns ON ns.oid = tbl.relnamespace
+LEFT JOIN pg_class ref ON ref.oid = con.confrelid
+WHERE ns.nspname = %(schema)s
+  AND con.contype IN ('p', 'u', 'f')
+  AND (tbl.relname::text = ANY(%(tables)s)
+       OR (con.contype = 'f' AND ref.relnamespace = ns.oid AND ref.relname::text = ANY(%(tables)s)))
+"""
+
+# Indexes on the tables that do not back a primary key, unique or exclusion constraint
+INDEX_QUERY = """
+SELECT idx.relname AS name, tbl.relname AS table_name, pg_get_indexdef(ix.indexrelid) AS definition
+FROM pg_index ix
+JOIN pg_class idx ON idx.oid = ix.indexrelid
+JOIN pg_class tbl ON tbl.oid = ix.indrelid
+JOIN pg_namespace ns ON ns.oid = tbl.relnamespace
+WHERE ns.nspname = %(schema)s
+  AND tbl.relname::text = ANY(%(tables)s)
+  AND NOT EXISTS (
+      SELECT 1 FROM pg_constraint con
+      WHERE con.conindid = ix.indexrelid AND con.contype IN ('p', 'u', 'x')
+  )
+"""
+
+
+class IndexManager:
+    """Drop indexes and constraints of CDM tables for a bulk load and rebuild them afterwards"""
+
+    def __init__(self, db_manager, workers: int = DEFAULT_INDEX_WORKERS,
+                 maintenance_work_mem: str = DEFAULT_MAINTENANCE_WORK_MEM):
+        """
+        Initialize index manager.
+
+        Args:
+            db_manager: Database connection manager
+            workers: Connections used to build indexes and constraints in parallel
+            maintenance_work_mem: maintenance_work_mem for each rebuild statement
+        """
+        self.db_manager = db_manager
+        self.schema = db_manager.config.schema_cdm
+        self.workers = max(1, workers)
+        self.maintenance_work_mem = maintenance_work_mem
+        self.tables: List[str] = []
+        # Dropped objects as (name, table, CREATE / ADD CONSTRAINT statement)
+        self.keys: List[Tuple[str, str, str]] = []
+        self.foreign_keys: List[Tuple[str, str, str]] = []
+        self.timings: Dict[str, float] = {}
+        self._loading_since = None
+
+    def drop(self, tables: Iterable[str]) -> None:
+        """Record and drop the indexes and constraints of the tables"""
+        started = time.perf_counter()
+        self.tables = list(dict.fromkeys(tables))
+        params = {'schema': self.schema, 'tables': self.tables}
+
+        try:
+            constraints = self.db_manager.execute_query(CONSTRAINT_QUERY, params)
+            indexes = self.db_manager.execute_query(INDEX_QUERY, params)
+        except Exception as e:
+            print(f"⚠️ Could not read indexes and constraints, loading with them in place: {e}")
+            self._loading_since = time.perf_counter()
+            return
+
+        foreign = constraints[constraints['kind'] == 'f']
+        keys = constraints[constraints['kind'] != 'f']
+
+        # Foreign keys go first, the keys they reference can only be dropped after them
+        for name, table, definition in zip(foreign['name'], foreign['table_name'], foreign['definition']):
+            if self._execute(f'ALTER TABLE {self.schema}.{table} DROP CONSTRAINT "{name}"'):
+                self.foreign_keys.append(
+                    (name, table, f'ALTER TABLE {self.schema}.{table} ADD CONSTRAINT "{name}" {definition}')
+                )
+        for name, table, definition in zip(keys['name'], keys['table_name'], keys['definition']):
+            if self._execute(f'ALTER TABLE {self.schema}.{table} DROP CONSTRAINT "{name}"'):
+                self.keys.append(
+                    (name, table, f'ALTER TABLE {self.schema}.{table} ADD CONSTRAINT "{name}" {definition}')
+                )
+        for name, table, definition in zip(indexes['name'], indexes['table_name'], indexes['definition']):
+            if self._execute(f'DROP INDEX {self.schema}."{name}"'):
+                self.keys.append((name, table, definition))
+
+        self.timings['drop'] = time.perf_counter() - started
+        print(f"🔧 Dropped {len(self.keys)} indexes/keys and {len(self.foreign_keys)} foreign keys "
+              f"on {len(self.tables)} tables for loading")
+        self._loading_since = time.perf_counter()
+
+    def restore(self) -> Dict[str, float]:
+        """
+        Recreate everything drop() removed, ANALYZE the tables and report phase timings.
+
+        Returns:
+            Seconds spent per phase (drop, load, indexes, foreign keys, analyze)
+        """
+        if self._loading_since is not None:
+            self.timings['load'] = time.perf_counter() - self._loading_since
+            self._loading_since = None
+
+        started = time.perf_counter()
+        failed = self._run_parallel([statement for _, _, statement in self.keys])
+        self.timings['indexes'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        failed += self._run_parallel([statement for _, _, statement in self.foreign_keys])
+        self.timings['foreign keys'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        self._run_parallel([f"ANALYZE {self.schema}.{table}" for table in self.tables], tune=False)
+        self.timings['analyze'] = time.perf_counter() - started
+
+        if failed:
+            print(f"⚠️ {len(failed)} indexes/constraints could not be recreated (see errors above)")
+        print("⏱️ Load session timings:")
+        for phase, seconds in self.timings.items():
+            print(f"   {phase}: {seconds:.1f}s")
+
+        self.keys, self.foreign_keys = [], []
+        return self.timings
+
+    def _execute(self, statement: str, tune: bool = False) -> bool:
+        """Run one statement in its own transaction; False (with a warning) if it fails"""
+        try:
+            with self.db_manager.engine.begin() as conn:
+                if tune:
+                    conn.execute(text(f"SET LOCAL maintenance_work_mem = '{self.maintenance_work_mem}'"))
+                conn.execute(text(statement))
+            return True
+        except Exception as e:
+            print(f"⚠️ {statement[:120]} failed: {e}")
+            return False
+
+    def _run_parallel(self, statements: List[str], tune: bool = True) -> List[str]:
+        """Run statements on up to self.workers connections; returns the ones that failed"""
+        if not statements:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(statements))) as executor:
+            succeeded = list(executor.map(lambda statement: self._execute(statement, tune), statements))
+        return [statement for statement, ok in zip(statements, succeeded) if not ok]
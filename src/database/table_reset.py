@@ -0,0 +1,158 @@
+# src/database/table_reset.py
+"""
+Table Reset
+
+Clearing a CDM table with DELETE visits and rewrites every row and leaves the heap
+full of dead tuples until the next VACUUM. TRUNCATE drops the table's storage at
+once, but PostgreSQL only allows it when every table holding a foreign key to it is
+truncated in the same statement. The reset manager reads the foreign key graph of
+the CDM schema, adds the empty tables that reference the requested ones and
+truncates the whole set in one statement. Only when a referencing table outside
+the set still holds rows (TRUNCATE would wipe it too) does it fall back to DELETE,
+child tables first.
+"""
+
+from typing import Dict, Iterable, List, Set
+from sqlalchemy import text
+from src.database.connection import DatabaseManager
+
+# Foreign keys between the CDM tables this ETL loads (child -> parents), used when
+# the catalog cannot be read
+CDM_FOREIGN_KEYS = {
+    'care_site': ['location'],
+    'provider': ['care_site'],
+    'person': ['location', 'provider', 'care_site'],
+    'visit_occurrence': ['person', 'provider', 'care_site'],
+    'condition_occurrence': ['person', 'visit_occurrence', 'provider'],
+    'observation': ['person', 'visit_occurrence', 'provider'],
+    'observation_period': ['person'],
+    'procedure_occurrence': ['person', 'visit_occurrence', 'provider'],
+    'death': ['person'],
+    'drug_exposure': ['person', 'visit_occurrence', 'provider'],
+    'measurement': ['person', 'visit_occurrence', 'provider'],
+    'condition_era': ['person'],
+    'drug_era': ['person'],
+    'dose_era': ['person']
+}
+
+# Every foreign key pointing into the schema, including ones from other schemas
+FOREIGN_KEY_QUERY = """
+SELECT DISTINCT
+    child_ns.nspname || '.' || child.relname AS child_table,
+    parent_ns.nspname || '.' || parent.relname AS parent_table
+FROM pg_constraint con
+JOIN pg_class child ON child.oid = con.conrelid
+JOIN pg_namespace child_ns ON child_ns.oid = child.relnamespace
+JOIN pg_class parent ON parent.oid = con.confrelid
+JOIN pg_namespace parent_ns ON parent_ns.oid = parent.relnamespace
+WHERE con.contype = 'f'
+  AND parent_ns.nspname = %(schema)s
+"""
+
+
+class TableResetManager:
+    """Empty CDM tables with one TRUNCATE, or DELETE when other loaded data depends on them"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        """
+        Initialize table reset manager.
+
+        Args:
+            db_manager: Database connection manager
+        """
+        self.db_manager = db_manager
+        self.schema = db_manager.config.schema_cdm
+        self._children = None
+
+    def reset(self, tables: Iterable[str], cascade: bool = False) -> str:
+        """
+        Empty the given tables.
+
+        Args:
+            tables: CDM table names (unqualified)
+            cascade: TRUNCATE ... CASCADE, also emptying every table that references them
+
+        Returns:
+            'truncate' or 'delete', the statement the tables were emptied with
+        """
+        targets = [self._qualified(table) for table in dict.fromkeys(tables)]
+        if not targets:
+            return 'truncate'
+
+        with self.db_manager.engine.begin() as conn:
+            if cascade:
+                conn.execute(text(f"TRUNCATE TABLE {', '.join(targets)} RESTART IDENTITY CASCADE"))
+                return 'truncate'
+
+            # Tables TRUNCATE would have to take along; harmless while they are empty
+            dependents = self._dependents(targets) - set(targets)
+            loaded = sorted(
+                table for table in dependents
+                if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {table})")).scalar()
+            )
+
+            if not loaded:
+                truncated = targets + sorted(dependents)
+                conn.execute(text(f"TRUNCATE TABLE {', '.join(truncated)} RESTART IDENTITY"))
+                if dependents:
+                    print(f"   Also truncated empty dependent tables: {', '.join(sorted(dependents))}")
+                return 'truncate'
+
+            print(f"⚠️ {', '.join(loaded)} still hold rows referencing "
+                  f"{', '.join(targets)}, clearing with DELETE instead of TRUNCATE")
+            for table in self._children_first(targets):
+                conn.execute(text(f"DELETE FROM {table}"))
+            return 'delete'
+
+    def foreign_keys(self) -> Dict[str, Set[str]]:
+        """Qualified parent table -> qualified tables with a foreign key to it (read once)"""
+        if self._children is None:
+            children: Dict[str, Set[str]] = {}
+            try:
+                result = self.db_manager.execute_query(FOREIGN_KEY_QUERY, {'schema': self.schema})
+                edges = zip(result['child_table'], result['parent_table'])
+            except Exception as e:
+                print(f"⚠️ Could not read foreign keys, using the CDM defaults: {e}")
+                edges = [
+                    (self._qualified(child), self._qualified(parent))
+                    for child, parents in CDM_FOREIGN_KEYS.items() for parent in parents
+                ]
+            for child, parent in edges:
+                if child != parent:  # e.g. preceding_visit_occurrence_id
+                    children.setdefault(parent, set()).add(child)
+            self._children = children
+        return self._children
+
+    def _qualified(self, table: str) -> str:
+        return table if '.' in table else f"{self.schema}.{table}"
+
+    def _dependents(self, tables: List[str]) -> Set[str]:
+        """Tables referencing the given ones, directly or through other references"""
+        children = self.foreign_keys()
+        found = set(tables)
+        pending = list(tables)
+        while pending:
+            for child in children.get(pending.pop(), ()):
+                if child not in found:
+                    found.add(child)
+                    pending.append(child)
+        return found
+
+    def _children_first(self, tables: List[str]) -> List[str]:
+        """The given tables ordered so each comes after the tables referencing it"""
+        children = self.foreign_keys()
+        ordered: List[str] = []
+        visited: Set[str] = set()
+
+        def visit(table: str) -> None:
+            if table in visited:
+                return
+            visited.add(table)
+            for child in sorted(children.get(table, ())):
+                if child in tables:
+                    visit(child)
+            ordered.append(table)
+
+        for table in tables:
+            visit(table)
+        return ordered
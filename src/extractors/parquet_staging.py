@@ -0,0 +1,276 @@
+# src/extractors/parquet_staging.py
+"""
+Parquet Staging Cache
+
+Each Synthea CSV is parsed once and written as a typed Parquet file in a staging
+directory alongside the CSVs. The Parquet file records the size and mtime of the
+CSV it was built from, so regenerating the Synthea output rebuilds it on the next
+read. Conversion streams the CSV in row-group sized chunks, so staging a large
+file never holds it in memory. Reads go through pyarrow.dataset, which only
+decodes the requested columns and skips row groups that cannot match a filter.
+"""
+
+import json
+import os
+import threading
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from src.extractors.synthea_schema import read_header, schema_dtypes
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - staging is optional
+    pa = None
+    ds = None
+    pq = None
+
+# Bump when the staged layout or the CSV parsing options change
+STAGING_FORMAT_VERSION = 3
+
+DEFAULT_STAGING_DIRNAME = ".parquet_staging"
+
+# Schema metadata key holding the source fingerprint
+SOURCE_METADATA_KEY = b"synthea_source"
+
+# Rows per Parquet row group; also the granularity of filter pruning
+ROW_GROUP_ROWS = 100000
+
+# A filter is either a pyarrow.dataset expression or DNF tuples,
+# e.g. [('CODE', '=', '69453-9')] or [('CODE', 'in', ['8302-2', '29463-7'])]
+Filters = Union["ds.Expression", List[Tuple], List[List[Tuple]], None]
+
+
+class ParquetStagingCache:
+    """Convert Synthea CSVs to Parquet once and serve projected, filtered reads"""
+
+    def __init__(self, data_path: Union[str, Path], staging_dir: Optional[str] = None):
+        """
+        Initialize staging cache.
+
+        Args:
+            data_path: Directory holding the Synthea CSV files
+            staging_dir: Where staged Parquet files live
+                         (default: SYNTHEA_STAGING_DIR or <data_path>/.parquet_staging)
+        """
+        self.data_path = Path(data_path)
+        self.staging_dir = Path(staging_dir or os.getenv("SYNTHEA_STAGING_DIR")
+                                or self.data_path / DEFAULT_STAGING_DIRNAME)
+        # One lock per staged file, so different files can be staged concurrently
+        self._lock = threading.Lock()
+        self._target_locks: Dict[Path, threading.Lock] = {}
+
+    @staticmethod
+    def available() -> bool:
+        """True when pyarrow is installed"""
+        return pa is not None
+
+    def read(self, filename: str, columns: Optional[Sequence[str]] = None,
+             filters: Filters = None) -> pd.DataFrame:
+        """
+        Read a staged table, converting the CSV first if needed.
+
+        Args:
+            filename: CSV file name ('observations.csv')
+            columns: Only read these columns (missing ones are ignored)
+            filters: Row filter pushed down to the Parquet scan
+
+        Returns:
+            DataFrame with a fresh RangeIndex
+        """
+        dataset = self._dataset(filename)
+        table = dataset.to_table(columns=self._existing_columns(dataset, columns),
+                                 filter=self._expression(filters))
+        return table.to_pandas()
+
+    def iter_batches(self, filename: str, chunksize: int, columns: Optional[Sequence[str]] = None,
+                     filters: Filters = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream a staged table as DataFrames of exactly chunksize rows (the last may be shorter).
+
+        The index continues across chunks.
+        """
+        dataset = self._dataset(filename)
+        scanner = dataset.scanner(columns=self._existing_columns(dataset, columns),
+                                  filter=self._expression(filters), batch_size=chunksize)
+
+        pending = []
+        pending_rows = 0
+        start = 0
+        for batch in scanner.to_batches():
+            if batch.num_rows == 0:
+                continue
+            pending.append(batch)
+            pending_rows += batch.num_rows
+
+            while pending_rows >= chunksize:
+                table = pa.Table.from_batches(pending)
+                chunk = table.slice(0, chunksize)
+                rest = table.slice(chunksize)
+                pending = rest.to_batches()
+                pending_rows = rest.num_rows
+
+                yield self._to_frame(chunk, start)
+                start += chunksize
+
+        if pending_rows:
+            yield self._to_frame(pa.Table.from_batches(pending), start)
+
+    def count_rows(self, filename: str) -> int:
+        """Row count from the Parquet footer"""
+        return pq.ParquetFile(self.stage(filename)).metadata.num_rows
+
+    def is_staged(self, filename: str) -> bool:
+        """True when an up-to-date Parquet file exists for the CSV"""
+        target = self.staging_dir / f"{Path(filename).stem}.parquet"
+        return self._staged_fingerprint(target) == self._fingerprint(self.data_path / filename)
+
+    def stage(self, filename: str) -> Path:
+        """
+        Return the staged Parquet path for a CSV, (re)building it when the CSV changed.
+
+        Raises:
+            FileNotFoundError: If the CSV does not exist
+        """
+        source = self.data_path / filename
+        fingerprint = self._fingerprint(source)
+        target = self.staging_dir / f"{Path(filename).stem}.parquet"
+
+        with self._lock:
+            target_lock = self._target_locks.setdefault(target, threading.Lock())
+
+        with target_lock:
+            if self._staged_fingerprint(target) != fingerprint:
+                self._convert(source, target, fingerprint)
+
+        return target
+
+    # ------------------------------------------------------------------
+    # Conversion
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _fingerprint(source: Path) -> dict:
+        stat = source.stat()
+        return {
+            "format": STAGING_FORMAT_VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns
+        }
+
+    @staticmethod
+    def _staged_fingerprint(target: Path) -> Optional[dict]:
+        try:
+            metadata = pq.read_schema(target).metadata or {}
+            return json.loads(metadata[SOURCE_METADATA_KEY])
+        except (OSError, KeyError, ValueError, pa.ArrowInvalid):
+            return None
+
+    def _convert(self, source: Path, target: Path, fingerprint: dict) -> None:
+        """
+        Parse the CSV with its declared schema and write it as Parquet, one row
+        group of ROW_GROUP_ROWS rows at a time, so the whole file is never in memory
+        """
+        print(f"🔄 Staging {source.name} as Parquet...")
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+        # Declared dtypes (categoricals become Parquet dictionary columns); the rest
+        # get the type a whole-file parse would infer, so every chunk has one schema
+        header = read_header(source)
+        dtype = schema_dtypes(source.name, header)
+        dtype.update(self._infer_dtypes(source, [col for col in header if col not in dtype]))
+
+        tmp_target = target.with_name(f"{target.name}.tmp-{os.getpid()}")
+        writer = None
+        rows = 0
+        try:
+            with pd.read_csv(source, dtype=dtype, chunksize=ROW_GROUP_ROWS) as reader:
+                for chunk in reader:
+                    if writer is None:
+                        schema = self._staged_schema(chunk, fingerprint)
+                        writer = pq.ParquetWriter(tmp_target, schema)
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False),
+                                       row_group_size=ROW_GROUP_ROWS)
+                    rows += len(chunk)
+
+            if writer is None:  # header only
+                empty = pd.read_csv(source, dtype=dtype, nrows=0)
+                pq.write_table(pa.Table.from_pandas(empty, schema=self._staged_schema(empty, fingerprint),
+                                                    preserve_index=False), tmp_target)
+            else:
+                writer.close()
+                writer = None
+            os.replace(tmp_target, target)
+        except Exception:
+            if writer is not None:
+                writer.close()
+            tmp_target.unlink(missing_ok=True)
+            raise
+
+        print(f"✅ Staged {rows} rows of {source.name} to {target}")
+
+    @staticmethod
+    def _infer_dtypes(source: Path, columns: List[str]) -> Dict[str, object]:
+        """
+        Dtype a whole-file read_csv would give each column, found chunk by chunk:
+        any text makes a column str, otherwise mixed ints and floats make it float64
+        """
+        if not columns:
+            return {}
+
+        seen: Dict[str, set] = {col: set() for col in columns}
+        with pd.read_csv(source, usecols=columns, chunksize=ROW_GROUP_ROWS, low_memory=False) as reader:
+            for chunk in reader:
+                for col in columns:
+                    seen[col].add(chunk[col].dtype.kind)
+
+        inferred = {}
+        for col, kinds in seen.items():
+            if kinds <= {"i"}:
+                inferred[col] = "int64"
+            elif kinds <= {"i", "f"}:
+                inferred[col] = "float64"
+            elif kinds == {"b"}:
+                inferred[col] = "bool"
+            else:
+                inferred[col] = str
+        return inferred
+
+    @staticmethod
+    def _staged_schema(chunk: pd.DataFrame, fingerprint: dict):
+        """Arrow schema of the staged file: int32 dictionary indexes, source fingerprint metadata"""
+        schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+        for i, field in enumerate(schema):
+            if pa.types.is_dictionary(field.type):
+                schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), field.type.value_type)))
+        metadata = dict(schema.metadata or {})
+        metadata[SOURCE_METADATA_KEY] = json.dumps(fingerprint).encode("utf-8")
+        return schema.with_metadata(metadata)
+
+    # ------------------------------------------------------------------
+    # Reading helpers
+    # ------------------------------------------------------------------
+
+    def _dataset(self, filename: str):
+        return ds.dataset(self.stage(filename), format="parquet")
+
+    @staticmethod
+    def _existing_columns(dataset, columns: Optional[Sequence[str]]) -> Optional[List[str]]:
+        if columns is None:
+            return None
+        names = set(dataset.schema.names)
+        return [col for col in columns if col in names]
+
+    @staticmethod
+    def _expression(filters: Filters):
+        if filters is None or isinstance(filters, ds.Expression):
+            return filters
+        return pq.filters_to_expression(filters)
+
+    @staticmethod
+    def _to_frame(table, start: int) -> pd.DataFrame:
+        df = table.to_pandas()
+        df.index = pd.RangeIndex(start, start + len(df))
+        return df
@@ -1,15 +1,42 @@
 import pandas as pd
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional
 import os
+import threading
+from src.extractors.parquet_staging import ParquetStagingCache, Filters
+from src.extractors.synthea_schema import schema_dtypes, validate_header
+
+# Every CSV a Synthea CSV export can produce
+CSV_FILES: List[str] = [
+    'patients.csv', 'encounters.csv', 'conditions.csv', 
+    'procedures.csv', 'medications.csv', 'observations.csv',
+    'immunizations.csv', 'careplans.csv', 'providers.csv',
+    'organizations.csv', 'allergies.csv', 'devices.csv',
+    'imaging_studies.csv', 'claims.csv', 'claims_transactions.csv',
+    'payers.csv', 'payer_transitions.csv', 'supplies.csv'
+]
+
+DEFAULT_CHUNK_ROWS = 100000
 
 class SyntheaExtractor:
     """Extracts data from Synthea CSV files"""
     
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, use_staging: bool = True, staging_dir: Optional[str] = None):
         self.data_path = Path(data_path)
         self._validate_path()
         self._cache = {}
+        self._headers = {}
+        # Tables may be processed from several threads; each file is loaded once
+        self._lock = threading.Lock()
+        self._file_locks: Dict[str, threading.Lock] = {}
+        
+        # Parquet staging cache; CSVs are read directly when pyarrow is unavailable
+        self.staging = None
+        if use_staging:
+            if ParquetStagingCache.available():
+                self.staging = ParquetStagingCache(self.data_path, staging_dir)
+            else:
+                print("⚠️ pyarrow not installed, reading Synthea CSVs directly")
     
     def _validate_path(self):
         """Validate that the Synthea data path exists"""
@@ -98,24 +125,185 @@ class SyntheaExtractor:
             print(f"Warning: {filename} not found in {self.data_path}")
             return pd.DataFrame()
         
-        df = pd.read_csv(file_path)
-        self._cache[filename] = df
-        return df
+        with self._file_lock(filename):
+            # Another thread may have loaded it while we waited
+            if filename in self._cache:
+                return self._cache[filename]
+            
+            self._validate_columns(filename)
+            df = self._read_staged(filename)
+            if df is None:
+                df = self._read_csv(filename)
+            self._cache[filename] = df
+            return df
+    
+    def _file_lock(self, filename: str) -> threading.Lock:
+        with self._lock:
+            return self._file_locks.setdefault(filename, threading.Lock())
+    
+    def read_table(self, table: str, columns: Optional[List[str]] = None,
+                   filters: Filters = None) -> pd.DataFrame:
+        """
+        Read part of a Synthea table without caching it.
+        
+        Args:
+            table: Table name ('observations') or file name ('observations.csv')
+            columns: Only read these columns (default: all)
+            filters: Row filter, e.g. [('CODE', '=', '69453-9')]; pushed down to
+                     the Parquet scan when staging is enabled
+            
+        Returns:
+            DataFrame with the matching rows
+        """
+        filename = self._filename(table)
+        file_path = self.data_path / filename
+        if filename not in self._cache and not file_path.exists():
+            print(f"Warning: {filename} not found in {self.data_path}")
+            return pd.DataFrame()
+        
+        if filename not in self._cache:
+            self._validate_columns(filename)
+            df = self._read_staged(filename, columns, filters)
+            if df is not None:
+                return df
+        
+        if filename in self._cache:
+            df = self._cache[filename]
+        else:
+            # Filter columns have to be read even when they are not returned
+            filter_columns = [col for group in self._filter_groups(filters) for col, _, _ in group]
+            df = self._read_csv(filename, list(dict.fromkeys(columns + filter_columns)) if columns is not None else None)
+        if filters is not None:
+            df = df[self._filter_mask(df, filters)]
+        if columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+        return df.reset_index(drop=True)
+    
+    def _read_staged(self, filename: str, columns: Optional[List[str]] = None,
+                     filters: Filters = None) -> Optional[pd.DataFrame]:
+        """Read through the Parquet staging cache, or None to fall back to the CSV"""
+        if self.staging is None:
+            return None
+        try:
+            return self.staging.read(filename, columns=columns, filters=filters)
+        except Exception as e:
+            print(f"⚠️ Parquet staging failed for {filename}, reading CSV: {e}")
+            return None
+    
+    @staticmethod
+    def _filter_groups(filters: Filters) -> List[List[tuple]]:
+        """Normalize DNF filter tuples to a list of AND groups"""
+        if not filters:
+            return []
+        return filters if isinstance(filters[0], list) else [filters]
+    
+    @staticmethod
+    def _filter_mask(df: pd.DataFrame, filters: Filters) -> pd.Series:
+        """Evaluate DNF filter tuples in pandas (used when staging is off)"""
+        ops = {
+            '=': lambda s, v: s == v, '==': lambda s, v: s == v, '!=': lambda s, v: s != v,
+            '<': lambda s, v: s < v, '<=': lambda s, v: s <= v,
+            '>': lambda s, v: s > v, '>=': lambda s, v: s >= v,
+            'in': lambda s, v: s.isin(v), 'not in': lambda s, v: ~s.isin(v)
+        }
+        mask = pd.Series(False, index=df.index)
+        for group in SyntheaExtractor._filter_groups(filters):
+            group_mask = pd.Series(True, index=df.index)
+            for column, op, value in group:
+                group_mask &= ops[op](df[column], value)
+            mask |= group_mask
+        return mask
+    
+    def iter_chunks(self, table: str, chunksize: int = DEFAULT_CHUNK_ROWS,
+                    columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream a Synthea CSV in chunks without caching it.
+        
+        Args:
+            table: Table name ('observations') or file name ('observations.csv')
+            chunksize: Rows per chunk
+            columns: Only read these columns (default: all)
+            
+        Yields:
+            DataFrame chunks; the index continues across chunks, so it is the
+            row number within the whole file
+        """
+        filename = self._filename(table)
+        
+        # Serve from the cache when the table is already in memory
+        if filename in self._cache:
+            df = self._cache[filename]
+            if columns is not None:
+                df = df[[col for col in columns if col in df.columns]]
+            for start in range(0, len(df), chunksize):
+                yield df.iloc[start:start + chunksize]
+            return
+        
+        file_path = self.data_path / filename
+        if not file_path.exists():
+            print(f"Warning: {filename} not found in {self.data_path}")
+            return
+        
+        self._validate_columns(filename)
+        
+        if self.staging is not None:
+            try:
+                batches = self.staging.iter_batches(filename, chunksize, columns=columns)
+                first = next(batches, None)
+            except Exception as e:
+                print(f"⚠️ Parquet staging failed for {filename}, reading CSV: {e}")
+            else:
+                if first is not None:
+                    yield first
+                    yield from batches
+                return
+        
+        with self._read_csv(filename, columns, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk
+    
+    def count_rows(self, table: str) -> int:
+        """Count data rows of a CSV by streaming its first column"""
+        filename = self._filename(table)
+        if filename in self._cache:
+            return len(self._cache[filename])
+        
+        file_path = self.data_path / filename
+        if not file_path.exists():
+            return 0
+        
+        # Only use the Parquet footer when already staged; counting never triggers a conversion
+        if self.staging is not None and self.staging.is_staged(filename):
+            return self.staging.count_rows(filename)
+        
+        with pd.read_csv(file_path, chunksize=DEFAULT_CHUNK_ROWS, usecols=[0]) as reader:
+            return sum(len(chunk) for chunk in reader)
+    
+    def release(self, table: str) -> None:
+        """Drop a fully loaded table from the cache"""
+        self._cache.pop(self._filename(table), None)
+    
+    def _filename(self, table: str) -> str:
+        return table if table.endswith('.csv') else f"{table}.csv"
+    
+    def _validate_columns(self, filename: str) -> List[str]:
+        """Check the CSV header against the declared schema once; returns the header"""
+        if filename not in self._headers:
+            self._headers[filename] = validate_header(self.data_path / filename)
+        return self._headers[filename]
+    
+    def _read_csv(self, filename: str, columns: Optional[List[str]] = None, **kwargs):
+        """pd.read_csv with the declared dtypes, reading only requested columns present in the header"""
+        header = self._validate_columns(filename)
+        usecols = [col for col in columns if col in header] if columns is not None else None
+        dtype = schema_dtypes(filename, usecols if usecols is not None else header)
+        return pd.read_csv(self.data_path / filename, usecols=usecols, dtype=dtype or None, **kwargs)
     
     def get_data_summary(self) -> Dict[str, int]:
-        """Get summary of available data"""
+        """Get summary of available data (row counts are streamed, nothing is cached)"""
         summary = {}
-        csv_files = [
-            'patients.csv', 'encounters.csv', 'conditions.csv', 
-            'procedures.csv', 'medications.csv', 'observations.csv',
-            'immunizations.csv', 'careplans.csv', 'providers.csv',
-            'organizations.csv', 'allergies.csv', 'devices.csv',
-            'imaging_studies.csv', 'claims.csv', 'claims_transactions.csv',
-            'payers.csv', 'payer_transitions.csv', 'supplies.csv'
-        ]
-        
-        for file in csv_files:
-            df = self._load_csv(file)
-            summary[file.replace('.csv', '')] = len(df)
+        
+        for file in CSV_FILES:
+            summary[file.replace('.csv', '')] = self.count_rows(file)
         
         return summary
\ No newline at end of file
@@ -0,0 +1,146 @@
+# src/extractors/synthea_schema.py
+"""
+Synthea CSV Schemas
+
+Declared column types for the Synthea CSV files the pipeline reads. Repeated
+low-cardinality text (codes, descriptions, units, classes, demographics) is stored
+as pandas categoricals and UUID columns as Arrow-backed strings instead of one
+Python object per cell. Date and datetime columns are kept as their raw text:
+deterministic IDs embed the source text, and transformers parse it with
+src.utils.date_parser, which parses each distinct value only once.
+
+Columns not listed keep pandas' type inference, so numeric values embedded in
+ID keys (ZIP, VALUE, ...) are unchanged.
+"""
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+def _arrow_string_dtype():
+    """Arrow-backed string dtype that keeps NaN as its missing value"""
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except TypeError:  # pandas < 2.3
+        return "string[pyarrow_numpy]"
+
+
+UUID = _arrow_string_dtype()
+TEXT = UUID
+CATEGORY = "category"
+
+# Shared column layout of the event tables (conditions, medications, procedures, ...)
+_EVENT_DTYPES = {
+    "PATIENT": UUID,
+    "ENCOUNTER": UUID,
+    "PAYER": UUID,
+    "CODE": CATEGORY,
+    "DESCRIPTION": CATEGORY,
+    "SYSTEM": CATEGORY,
+    "REASONDESCRIPTION": CATEGORY
+}
+
+SYNTHEA_SCHEMAS: Dict[str, Dict[str, object]] = {
+    "patients.csv": {
+        "required": ["Id", "BIRTHDATE", "GENDER"],
+        "dtypes": {
+            "Id": UUID,
+            "BIRTHDATE": TEXT,
+            "DEATHDATE": TEXT,
+            "MARITAL": CATEGORY,
+            "RACE": CATEGORY,
+            "ETHNICITY": CATEGORY,
+            "GENDER": CATEGORY,
+            "STATE": CATEGORY,
+            "COUNTY": CATEGORY
+        }
+    },
+    "encounters.csv": {
+        "required": ["Id", "START", "STOP", "PATIENT", "ENCOUNTERCLASS"],
+        "dtypes": {
+            "Id": UUID,
+            "START": TEXT,
+            "STOP": TEXT,
+            "PATIENT": UUID,
+            "ORGANIZATION": UUID,
+            "PROVIDER": UUID,
+            "PAYER": UUID,
+            "ENCOUNTERCLASS": CATEGORY,
+            "CODE": CATEGORY,
+            "DESCRIPTION": CATEGORY,
+            "REASONDESCRIPTION": CATEGORY
+        }
+    },
+    "conditions.csv": {
+        "required": ["START", "PATIENT", "CODE", "DESCRIPTION"],
+        "dtypes": {**_EVENT_DTYPES, "START": TEXT, "STOP": TEXT}
+    },
+    "observations.csv": {
+        "required": ["DATE", "PATIENT", "CODE", "DESCRIPTION"],
+        "dtypes": {**_EVENT_DTYPES, "DATE": TEXT, "CATEGORY": CATEGORY, "UNITS": CATEGORY, "TYPE": CATEGORY}
+    },
+    "medications.csv": {
+        "required": ["START", "PATIENT", "CODE", "DESCRIPTION"],
+        "dtypes": {**_EVENT_DTYPES, "START": TEXT, "STOP": TEXT}
+    },
+    "procedures.csv": {
+        "required": ["START", "PATIENT", "CODE", "DESCRIPTION"],
+        "dtypes": {**_EVENT_DTYPES, "START": TEXT, "STOP": TEXT}
+    },
+    "immunizations.csv": {
+        "required": ["DATE", "PATIENT", "CODE", "DESCRIPTION"],
+        "dtypes": {**_EVENT_DTYPES, "DATE": TEXT}
+    },
+    "careplans.csv": {
+        "required": ["PATIENT", "CODE"],
+        "dtypes": {**_EVENT_DTYPES, "Id": UUID, "START": TEXT, "STOP": TEXT}
+    },
+    "allergies.csv": {
+        "required": ["PATIENT", "CODE"],
+        "dtypes": {**_EVENT_DTYPES, "START": TEXT, "STOP": TEXT, "TYPE": CATEGORY, "CATEGORY": CATEGORY}
+    },
+    "providers.csv": {
+        "required": ["Id"],
+        "dtypes": {"Id": UUID, "ORGANIZATION": UUID}
+    },
+    "organizations.csv": {
+        "required": ["Id"],
+        "dtypes": {"Id": UUID}
+    }
+}
+
+
+def schema_dtypes(filename: str, columns: Iterable[str]) -> Dict[str, object]:
+    """Declared dtypes for the given columns of a Synthea file"""
+    declared = SYNTHEA_SCHEMAS.get(filename, {}).get("dtypes", {})
+    return {col: declared[col] for col in columns if col in declared}
+
+
+def missing_required_columns(filename: str, columns: Iterable[str]) -> List[str]:
+    """Required columns of a Synthea file that are absent from columns"""
+    present = set(columns)
+    return [col for col in SYNTHEA_SCHEMAS.get(filename, {}).get("required", []) if col not in present]
+
+
+def read_header(file_path: Path) -> List[str]:
+    """Column names of a CSV without reading any rows"""
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+
+def validate_header(file_path: Path) -> List[str]:
+    """
+    Check a Synthea CSV's header against its declared required columns.
+
+    Returns:
+        The header column names
+
+    Raises:
+        ValueError: If required columns are missing
+    """
+    header = read_header(file_path)
+    missing = missing_required_columns(file_path.name, header)
+    if missing:
+        raise ValueError(f"{file_path.name} is missing required columns: {missing}")
+    return header
@@ -0,0 +1,241 @@
+# src/loaders/bulk_loader.py
+"""
+Bulk Loader
+
+Shared loading engine used by every OMOP loader. Streams aligned DataFrames
+into PostgreSQL with COPY ... FROM STDIN over a raw psycopg2 connection and
+keeps pandas.to_sql as a fallback mode.
+
+With several workers, large frames are split into slices that are copied
+concurrently over separate pooled connections into an unlogged staging table.
+One INSERT ... SELECT then moves the rows into the target table, so the load
+still commits as a single unit.
+"""
+
+import io
+import math
+import uuid
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from sqlalchemy import text
+from src.database.connection import DatabaseManager
+
+LOAD_MODE_COPY = "copy"
+LOAD_MODE_TO_SQL = "to_sql"
+LOAD_MODES = (LOAD_MODE_COPY, LOAD_MODE_TO_SQL)
+
+# Marker written for missing values in the CSV stream (matches the COPY NULL option)
+COPY_NULL = "\\N"
+
+INTEGER_TYPES = {"smallint", "integer", "bigint"}
+
+# Smallest frame split across load workers (smaller frames are copied on one connection)
+PARALLEL_COPY_MIN_ROWS = 50000
+
+
+class BulkLoader:
+    """Load DataFrames into a CDM table via COPY (default) or pandas.to_sql"""
+
+    def __init__(self, db_manager: DatabaseManager, mode: str = LOAD_MODE_COPY,
+                 copy_batch_rows: int = 100000, workers: int = 1):
+        """
+        Initialize bulk loader.
+
+        Args:
+            db_manager: Database connection manager
+            mode: 'copy' to stream with COPY FROM STDIN, 'to_sql' for batched INSERTs
+            copy_batch_rows: Rows serialized per COPY statement (all run in one transaction)
+            workers: Connections copying slices of a large frame concurrently (copy mode only)
+        """
+        if mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode '{mode}' (expected one of {LOAD_MODES})")
+
+        self.db_manager = db_manager
+        self.mode = mode
+        self.copy_batch_rows = copy_batch_rows
+        self.workers = max(1, workers)
+        self.schema = db_manager.config.schema_cdm
+        self._column_types: Dict[str, Dict[str, str]] = {}
+
+    def load(self, df: pd.DataFrame, table_name: str, batch_size: Optional[int] = None,
+             chunksize: Optional[int] = None, retry_rows: Optional[int] = None,
+             retry_chunksize: int = 1) -> int:
+        """
+        Load an aligned DataFrame into schema_cdm.table_name.
+
+        The DataFrame's column order (taken from the loader's OMOP_*_COLUMNS list)
+        drives the column list of the COPY / INSERT statements.
+
+        Args:
+            df: Aligned DataFrame to load
+            table_name: Target CDM table
+            batch_size: Rows per to_sql batch (to_sql mode only)
+            chunksize: Rows per INSERT statement (to_sql mode only, default whole batch)
+            retry_rows: Rows per retry slice when a to_sql batch fails (None = no retry)
+            retry_chunksize: Rows per INSERT statement while retrying
+
+        Returns:
+            Number of rows sent to the database
+        """
+        if df is None or df.empty:
+            return 0
+
+        if self.mode == LOAD_MODE_COPY:
+            return self._copy(df, table_name)
+
+        return self._to_sql(df, table_name, batch_size, chunksize, retry_rows, retry_chunksize)
+
+    def _copy(self, df: pd.DataFrame, table_name: str) -> int:
+        """Stream the DataFrame with COPY ... FROM STDIN in a single transaction"""
+        df = self._prepare_for_copy(df, table_name)
+
+        if self.workers > 1 and len(df) >= PARALLEL_COPY_MIN_ROWS:
+            return self._parallel_copy(df, table_name)
+
+        return self._copy_into(df, f"{self.schema}.{table_name}")
+
+    def _parallel_copy(self, df: pd.DataFrame, table_name: str) -> int:
+        """
+        COPY slices of the DataFrame concurrently into a staging table, then move
+        them into the target with one INSERT ... SELECT. The target sees all rows
+        or none; the staging table is dropped either way.
+        """
+        target = f"{self.schema}.{table_name}"
+        staging = f"{self.schema}.{table_name}_load_{uuid.uuid4().hex[:8]}"
+        column_list = ", ".join(df.columns)
+
+        bounds = np.linspace(0, len(df), self.workers + 1).astype(int)
+        slices = [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+        print(f"   🔀 Copying {len(df)} rows in {len(slices)} parallel slices via {staging}")
+
+        with self.db_manager.engine.begin() as conn:
+            conn.execute(text(f"CREATE UNLOGGED TABLE {staging} (LIKE {target} INCLUDING DEFAULTS)"))
+        try:
+            with ThreadPoolExecutor(max_workers=len(slices)) as executor:
+                # list() re-raises the first slice failure
+                list(executor.map(lambda part: self._copy_into(part, staging), slices))
+
+            with self.db_manager.engine.begin() as conn:
+                conn.execute(text(
+                    f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {staging}"
+                ))
+        finally:
+            with self.db_manager.engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+
+        return len(df)
+
+    def _copy_into(self, df: pd.DataFrame, target: str) -> int:
+        """COPY a prepared DataFrame into target in batches, committed together"""
+        column_list = ", ".join(df.columns)
+        copy_sql = (
+            f"COPY {target} ({column_list}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+        )
+
+        total = len(df)
+        num_batches = math.ceil(total / self.copy_batch_rows)
+
+        raw_conn = self.db_manager.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            try:
+                for i, start in enumerate(range(0, total, self.copy_batch_rows)):
+                    chunk = df.iloc[start:start + self.copy_batch_rows]
+                    buffer = io.StringIO()
+                    chunk.to_csv(buffer, header=False, index=False, na_rep=COPY_NULL)
+                    buffer.seek(0)
+                    cursor.copy_expert(copy_sql, buffer)
+                    print(f"   ✅ COPY batch {i+1}/{num_batches} streamed ({len(chunk)} rows).")
+            finally:
+                cursor.close()
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+        return total
+
+    def _prepare_for_copy(self, df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+        """Make CSV text acceptable to PostgreSQL's typed input functions"""
+        column_types = self._get_column_types(table_name)
+        df = df.copy()
+
+        for col in df.columns:
+            # Integer columns that picked up NaN are float in pandas and would
+            # be written as "123.0", which integer input rejects
+            if column_types.get(col) in INTEGER_TYPES and pd.api.types.is_float_dtype(df[col]):
+                df[col] = df[col].astype("Int64")
+
+        return df
+
+    def _get_column_types(self, table_name: str) -> Dict[str, str]:
+        """Get (and cache) column data types of the target table"""
+        if table_name in self._column_types:
+            return self._column_types[table_name]
+
+        query = text("""
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = :schema AND table_name = :table
+        """)
+        try:
+            with self.db_manager.engine.connect() as conn:
+                rows = conn.execute(query, {"schema": self.schema, "table": table_name}).all()
+            column_types = {row[0]: row[1] for row in rows}
+        except Exception as e:
+            print(f"⚠️ Could not read column types for {table_name}: {e}")
+            column_types = {}
+
+        self._column_types[table_name] = column_types
+        return column_types
+
+    def _to_sql(self, df: pd.DataFrame, table_name: str, batch_size: Optional[int],
+                chunksize: Optional[int], retry_rows: Optional[int], retry_chunksize: int) -> int:
+        """Fallback mode: batched multi-row INSERTs through pandas.to_sql"""
+        total = len(df)
+        if not batch_size or batch_size <= 0 or batch_size > total:
+            batch_size = total
+        num_batches = math.ceil(total / batch_size)
+
+        start = 0
+        for i in range(num_batches):
+            end = min(start + batch_size, total)
+            chunk = df.iloc[start:end]
+
+            try:
+                self._insert_chunk(chunk, table_name, chunksize or len(chunk))
+                print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
+            except Exception as e:
+                if retry_rows is None:
+                    raise
+
+                print(f"   ❌ Batch {i+1}/{num_batches} failed: {str(e)[:200]}...")
+                # Try smaller chunks if batch fails
+                if len(chunk) > 1:
+                    print(f"   🔄 Retrying batch {i+1} with smaller chunks...")
+                    for j in range(0, len(chunk), retry_rows):
+                        self._insert_chunk(chunk.iloc[j:j + retry_rows], table_name, retry_chunksize)
+                    print(f"   ✅ Batch {i+1} completed with smaller chunks")
+                else:
+                    print(f"   ❌ Single row failed, skipping...")
+
+            start = end
+
+        return total
+
+    def _insert_chunk(self, chunk: pd.DataFrame, table_name: str, chunksize: int) -> None:
+        """Insert one chunk with pandas.to_sql using the engine directly"""
+        chunk.to_sql(
+            name=table_name,
+            con=self.db_manager.engine,
+            schema=self.schema,
+            if_exists="append",
+            index=False,
+            method="multi",        # build batched INSERTs
+            chunksize=chunksize
+        )
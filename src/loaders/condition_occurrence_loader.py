@@ -1,8 +1,8 @@
-import math
 import pandas as pd
 from typing import Optional, List
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
 
 OMOP_CONDITION_OCCURRENCE_COLUMNS: List[str] = [
     "condition_occurrence_id",
@@ -24,10 +24,11 @@ OMOP_CONDITION_OCCURRENCE_COLUMNS: List[str] = [
 ]
 
 class ConditionOccurrenceLoader:
-    """Loader for OMOP CDM condition_occurrence table using pandas.to_sql"""
+    """Loader for OMOP CDM condition_occurrence table via the shared COPY bulk loader"""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode)
 
     def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         # keep only columns that exist in OMOP condition_occurrence
@@ -40,7 +41,8 @@ class ConditionOccurrenceLoader:
         aligned = aligned.replace({pd.NaT: None})
         return aligned
 
-    def load_condition_occurrences(self, condition_occurrences_df: pd.DataFrame, batch_size: Optional[int] = None) -> bool:
+    def load_condition_occurrences(self, condition_occurrences_df: pd.DataFrame, batch_size: Optional[int] = None,
+                                   report_count: bool = True) -> bool:
         if condition_occurrences_df is None or condition_occurrences_df.empty:
             print("❌ No data to load")
             return False
@@ -52,58 +54,23 @@ class ConditionOccurrenceLoader:
             # Use smaller batch size for condition_occurrence due to many columns
             if not batch_size or batch_size <= 0 or batch_size > total:
                 batch_size = min(100, total)  # Smaller default batch size
-            num_batches = math.ceil(total / batch_size)
 
-            print(f"🚀 Loading {total} condition occurrences via to_sql "
+            print(f"🚀 Loading {total} condition occurrences via {self.bulk_loader.mode} "
                   f"(schema={self.db_manager.config.schema_cdm}, table=condition_occurrence, "
-                  f"batches={num_batches}, batch_size={batch_size})...")
-
-            start = 0
-            for i in range(num_batches):
-                end = min(start + batch_size, total)
-                chunk = df.iloc[start:end]
-
-                try:
-                    # Use engine directly with pandas.to_sql
-                    chunk.to_sql(
-                        name="condition_occurrence",
-                        con=self.db_manager.engine,
-                        schema=self.db_manager.config.schema_cdm,
-                        if_exists="append",
-                        index=False,
-                        method="multi",        # build batched INSERTs
-                        chunksize=50          # Smaller chunk size for complex inserts
-                    )
-                    print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
-                except Exception as e:
-                    print(f"   ❌ Batch {i+1}/{num_batches} failed: {str(e)[:200]}...")
-                    # Try smaller chunks if batch fails
-                    if len(chunk) > 1:
-                        print(f"   🔄 Retrying batch {i+1} with smaller chunks...")
-                        for j in range(0, len(chunk), 10):  # 10 rows at a time
-                            mini_chunk = chunk.iloc[j:j+10]
-                            mini_chunk.to_sql(
-                                name="condition_occurrence",
-                                con=self.db_manager.engine,
-                                schema=self.db_manager.config.schema_cdm,
-                                if_exists="append",
-                                index=False,
-                                method="multi",
-                                chunksize=1
-                            )
-                        print(f"   ✅ Batch {i+1} completed with smaller chunks")
-                    else:
-                        print(f"   ❌ Single row failed, skipping...")
-                        
-                start = end
-
-            print("✅ All data loaded successfully!")
-
-            # Post-load count
-            count_sql = text(f"SELECT COUNT(*) AS count FROM {self.db_manager.config.schema_cdm}.condition_occurrence")
-            with self.db_manager.engine.connect() as conn:
-                res = conn.execute(count_sql).mappings().first()
-            print(f"📊 Total condition occurrences in database: {int(res['count'])}")
+                  f"batch_size={batch_size})...")
+
+            self.bulk_loader.load(df, "condition_occurrence", batch_size=batch_size,
+                                  chunksize=50, retry_rows=10, retry_chunksize=1)
+
+            # Streamed chunks leave the banner and table count to the end of the stream
+            if report_count:
+                print("✅ All data loaded successfully!")
+
+                # Post-load count
+                count_sql = text(f"SELECT COUNT(*) AS count FROM {self.db_manager.config.schema_cdm}.condition_occurrence")
+                with self.db_manager.engine.connect() as conn:
+                    res = conn.execute(count_sql).mappings().first()
+                print(f"📊 Total condition occurrences in database: {int(res['count'])}")
             return True
 
         except Exception as e:
@@ -1,8 +1,8 @@
-import math
 import pandas as pd
 from typing import Optional, List
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
 
 OMOP_DEATH_COLUMNS: List[str] = [
     "person_id",
@@ -15,10 +15,11 @@ OMOP_DEATH_COLUMNS: List[str] = [
 ]
 
 class DeathLoader:
-    """Loader for OMOP CDM death table using pandas.to_sql"""
+    """Loader for OMOP CDM death table via the shared COPY bulk loader"""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode)
 
     def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         # Keep only columns that exist in OMOP death table
@@ -43,50 +44,13 @@ class DeathLoader:
             # Use appropriate batch size for deaths (simple table)
             if not batch_size or batch_size <= 0 or batch_size > total:
                 batch_size = min(500, total)  # Standard batch size
-            num_batches = math.ceil(total / batch_size)
 
-            print(f"🚀 Loading {total} death records via to_sql "
+            print(f"🚀 Loading {total} death records via {self.bulk_loader.mode} "
                   f"(schema={self.db_manager.config.schema_cdm}, table=death, "
-                  f"batches={num_batches}, batch_size={batch_size})...")
-
-            start = 0
-            for i in range(num_batches):
-                end = min(start + batch_size, total)
-                chunk = df.iloc[start:end]
-
-                try:
-                    # Use engine directly with pandas.to_sql
-                    chunk.to_sql(
-                        name="death",
-                        con=self.db_manager.engine,
-                        schema=self.db_manager.config.schema_cdm,
-                        if_exists="append",
-                        index=False,
-                        method="multi",        # Build batched INSERTs
-                        chunksize=100         # Good chunk size for death records
-                    )
-                    print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
-                except Exception as e:
-                    print(f"   ❌ Batch {i+1}/{num_batches} failed: {str(e)[:200]}...")
-                    # Try smaller chunks if batch fails
-                    if len(chunk) > 1:
-                        print(f"   🔄 Retrying batch {i+1} with smaller chunks...")
-                        for j in range(0, len(chunk), 50):  # 50 rows at a time
-                            mini_chunk = chunk.iloc[j:j+50]
-                            mini_chunk.to_sql(
-                                name="death",
-                                con=self.db_manager.engine,
-                                schema=self.db_manager.config.schema_cdm,
-                                if_exists="append",
-                                index=False,
-                                method="multi",
-                                chunksize=25
-                            )
-                        print(f"   ✅ Batch {i+1} completed with smaller chunks")
-                    else:
-                        print(f"   ❌ Single row failed, skipping...")
-                        
-                start = end
+                  f"batch_size={batch_size})...")
+
+            self.bulk_loader.load(df, "death", batch_size=batch_size,
+                                  chunksize=100, retry_rows=50, retry_chunksize=25)
 
             print("✅ All data loaded successfully!")
 
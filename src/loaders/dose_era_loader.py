@@ -5,11 +5,11 @@ Dose Era Loader
 Loads dose_era records into the OMOP CDM database.
 """
 
-import math
 import pandas as pd
 from typing import Optional, List
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
 
 
 OMOP_DOSE_ERA_COLUMNS: List[str] = [
@@ -26,8 +26,9 @@ OMOP_DOSE_ERA_COLUMNS: List[str] = [
 class DoseEraLoader:
     """Loader for OMOP CDM dose_era table."""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode)
         self.schema = db_manager.config.schema_cdm
 
     def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -61,28 +62,12 @@ class DoseEraLoader:
             total = len(df)
             if not batch_size or batch_size <= 0 or batch_size > total:
                 batch_size = total
-            num_batches = math.ceil(total / batch_size)
 
-            print(f"🚀 Loading {total} dose eras via to_sql "
+            print(f"🚀 Loading {total} dose eras via {self.bulk_loader.mode} "
                   f"(schema={self.schema}, table=dose_era, "
-                  f"batches={num_batches}, batch_size={batch_size})...")
-
-            start = 0
-            for i in range(num_batches):
-                end = min(start + batch_size, total)
-                chunk = df.iloc[start:end]
-
-                chunk.to_sql(
-                    name="dose_era",
-                    con=self.db_manager.engine,
-                    schema=self.schema,
-                    if_exists="append",
-                    index=False,
-                    method="multi",
-                    chunksize=len(chunk)
-                )
-                print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
-                start = end
+                  f"batch_size={batch_size})...")
+
+            self.bulk_loader.load(df, "dose_era", batch_size=batch_size)
 
             print("✅ All dose era data loaded successfully!")
 
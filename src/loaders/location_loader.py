@@ -1,10 +1,10 @@
 # src/loaders/location_loader.py
 
-import math
 import pandas as pd
 from typing import Optional, List
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
 
 OMOP_LOCATION_COLUMNS: List[str] = [
     "location_id",
@@ -19,10 +19,11 @@ OMOP_LOCATION_COLUMNS: List[str] = [
 ]
 
 class LocationLoader:
-    """Loader for OMOP CDM location table using pandas.to_sql (robust, no param-shape issues)."""
+    """Loader for OMOP CDM location table via the shared COPY bulk loader."""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode)
 
     def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         # keep only columns that exist in OMOP location
@@ -46,29 +47,12 @@ class LocationLoader:
             total = len(df)
             if not batch_size or batch_size <= 0 or batch_size > total:
                 batch_size = total
-            num_batches = math.ceil(total / batch_size)
 
-            print(f"🚀 Loading {total} locations via to_sql "
+            print(f"🚀 Loading {total} locations via {self.bulk_loader.mode} "
                   f"(schema={self.db_manager.config.schema_cdm}, table=location, "
-                  f"batches={num_batches}, batch_size={batch_size})...")
+                  f"batch_size={batch_size})...")
 
-            start = 0
-            for i in range(num_batches):
-                end = min(start + batch_size, total)
-                chunk = df.iloc[start:end]
-
-                # IMPORTANT: use engine directly; do NOT go through bulk_insert here
-                chunk.to_sql(
-                    name="location",
-                    con=self.db_manager.engine,
-                    schema=self.db_manager.config.schema_cdm,
-                    if_exists="append",
-                    index=False,
-                    method="multi",        # build batched INSERTs
-                    chunksize=len(chunk)   # one SQL per chunk
-                )
-                print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
-                start = end
+            self.bulk_loader.load(df, "location", batch_size=batch_size)
 
             print("✅ All data loaded successfully!")
 
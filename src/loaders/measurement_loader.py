@@ -1,8 +1,8 @@
-import math
 import pandas as pd
 from typing import Optional, List
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
 
 OMOP_MEASUREMENT_COLUMNS: List[str] = [
     "measurement_id",
@@ -31,10 +31,11 @@ OMOP_MEASUREMENT_COLUMNS: List[str] = [
 ]
 
 class MeasurementLoader:
-    """Loader for OMOP CDM measurement table using pandas.to_sql"""
+    """Loader for OMOP CDM measurement table via the shared COPY bulk loader"""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY, load_workers: int = 1):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode, workers=load_workers)
 
     def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         # Keep only columns that exist in OMOP measurement table
@@ -47,7 +48,8 @@ class MeasurementLoader:
         aligned = aligned.replace({pd.NaT: None})
         return aligned
 
-    def load_measurements(self, measurements_df: pd.DataFrame, batch_size: Optional[int] = None) -> bool:
+    def load_measurements(self, measurements_df: pd.DataFrame, batch_size: Optional[int] = None,
+                          report_count: bool = True) -> bool:
         if measurements_df is None or measurements_df.empty:
             print("❌ No data to load")
             return False
@@ -59,58 +61,23 @@ class MeasurementLoader:
             # Use appropriate batch size for measurements
             if not batch_size or batch_size <= 0 or batch_size > total:
                 batch_size = min(200, total)  # Good batch size for measurements
-            num_batches = math.ceil(total / batch_size)
 
-            print(f"🚀 Loading {total} measurements via to_sql "
+            print(f"🚀 Loading {total} measurements via {self.bulk_loader.mode} "
                   f"(schema={self.db_manager.config.schema_cdm}, table=measurement, "
-                  f"batches={num_batches}, batch_size={batch_size})...")
+                  f"batch_size={batch_size})...")
 
-            start = 0
-            for i in range(num_batches):
-                end = min(start + batch_size, total)
-                chunk = df.iloc[start:end]
+            self.bulk_loader.load(df, "measurement", batch_size=batch_size,
+                                  chunksize=75, retry_rows=25, retry_chunksize=10)
 
-                try:
-                    # Use engine directly with pandas.to_sql
-                    chunk.to_sql(
-                        name="measurement",
-                        con=self.db_manager.engine,
-                        schema=self.db_manager.config.schema_cdm,
-                        if_exists="append",
-                        index=False,
-                        method="multi",        # Build batched INSERTs
-                        chunksize=75          # Good chunk size for measurements
-                    )
-                    print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
-                except Exception as e:
-                    print(f"   ❌ Batch {i+1}/{num_batches} failed: {str(e)[:200]}...")
-                    # Try smaller chunks if batch fails
-                    if len(chunk) > 1:
-                        print(f"   🔄 Retrying batch {i+1} with smaller chunks...")
-                        for j in range(0, len(chunk), 25):  # 25 rows at a time
-                            mini_chunk = chunk.iloc[j:j+25]
-                            mini_chunk.to_sql(
-                                name="measurement",
-                                con=self.db_manager.engine,
-                                schema=self.db_manager.config.schema_cdm,
-                                if_exists="append",
-                                index=False,
-                                method="multi",
-                                chunksize=10
-                            )
-                        print(f"   ✅ Batch {i+1} completed with smaller chunks")
-                    else:
-                        print(f"   ❌ Single row failed, skipping...")
-                        
-                start = end
+            # Streamed chunks leave the banner and table count to the end of the stream
+            if report_count:
+                print("✅ All data loaded successfully!")
 
-            print("✅ All data loaded successfully!")
-
-            # Post-load count
-            count_sql = text(f"SELECT COUNT(*) AS count FROM {self.db_manager.config.schema_cdm}.measurement")
-            with self.db_manager.engine.connect() as conn:
-                res = conn.execute(count_sql).mappings().first()
-            print(f"📊 Total measurements in database: {int(res['count'])}")
+                # Post-load count
+                count_sql = text(f"SELECT COUNT(*) AS count FROM {self.db_manager.config.schema_cdm}.measurement")
+                with self.db_manager.engine.connect() as conn:
+                    res = conn.execute(count_sql).mappings().first()
+                print(f"📊 Total measurements in database: {int(res['count'])}")
             return True
 
         except Exception as e:
@@ -1,8 +1,8 @@
-import math
 import pandas as pd
 from typing import Optional, List
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
 
 OMOP_OBSERVATION_COLUMNS: List[str] = [
     "observation_id",
@@ -29,10 +29,11 @@ OMOP_OBSERVATION_COLUMNS: List[str] = [
 ]
 
 class ObservationLoader:
-    """Loader for OMOP CDM observation table using pandas.to_sql"""
+    """Loader for OMOP CDM observation table via the shared COPY bulk loader"""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY, load_workers: int = 1):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode, workers=load_workers)
 
     def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         # keep only columns that exist in OMOP observation
@@ -45,7 +46,8 @@ class ObservationLoader:
         aligned = aligned.replace({pd.NaT: None})
         return aligned
 
-    def load_observations(self, observations_df: pd.DataFrame, batch_size: Optional[int] = None) -> bool:
+    def load_observations(self, observations_df: pd.DataFrame, batch_size: Optional[int] = None,
+                          report_count: bool = True) -> bool:
         if observations_df is None or observations_df.empty:
             print("❌ No data to load")
             return False
@@ -57,58 +59,23 @@ class ObservationLoader:
             # Use smaller batch size for observations due to many columns
             if not batch_size or batch_size <= 0 or batch_size > total:
                 batch_size = min(50, total)  # Smaller default batch size
-            num_batches = math.ceil(total / batch_size)
 
-            print(f"🚀 Loading {total} observations via to_sql "
+            print(f"🚀 Loading {total} observations via {self.bulk_loader.mode} "
                   f"(schema={self.db_manager.config.schema_cdm}, table=observation, "
-                  f"batches={num_batches}, batch_size={batch_size})...")
+                  f"batch_size={batch_size})...")
 
-            start = 0
-            for i in range(num_batches):
-                end = min(start + batch_size, total)
-                chunk = df.iloc[start:end]
+            self.bulk_loader.load(df, "observation", batch_size=batch_size,
+                                  chunksize=25, retry_rows=5, retry_chunksize=1)
 
-                try:
-                    # Use engine directly with pandas.to_sql
-                    chunk.to_sql(
-                        name="observation",
-                        con=self.db_manager.engine,
-                        schema=self.db_manager.config.schema_cdm,
-                        if_exists="append",
-                        index=False,
-                        method="multi",        # build batched INSERTs
-                        chunksize=25          # Even smaller chunk size for complex inserts
-                    )
-                    print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
-                except Exception as e:
-                    print(f"   ❌ Batch {i+1}/{num_batches} failed: {str(e)[:200]}...")
-                    # Try smaller chunks if batch fails
-                    if len(chunk) > 1:
-                        print(f"   🔄 Retrying batch {i+1} with smaller chunks...")
-                        for j in range(0, len(chunk), 5):  # 5 rows at a time
-                            mini_chunk = chunk.iloc[j:j+5]
-                            mini_chunk.to_sql(
-                                name="observation",
-                                con=self.db_manager.engine,
-                                schema=self.db_manager.config.schema_cdm,
-                                if_exists="append",
-                                index=False,
-                                method="multi",
-                                chunksize=1
-                            )
-                        print(f"   ✅ Batch {i+1} completed with smaller chunks")
-                    else:
-                        print(f"   ❌ Single row failed, skipping...")
-                        
-                start = end
+            # Streamed chunks leave the banner and table count to the end of the stream
+            if report_count:
+                print("✅ All data loaded successfully!")
 
-            print("✅ All data loaded successfully!")
-
-            # Post-load count
-            count_sql = text(f"SELECT COUNT(*) AS count FROM {self.db_manager.config.schema_cdm}.observation")
-            with self.db_manager.engine.connect() as conn:
-                res = conn.execute(count_sql).mappings().first()
-            print(f"📊 Total observations in database: {int(res['count'])}")
+                # Post-load count
+                count_sql = text(f"SELECT COUNT(*) AS count FROM {self.db_manager.config.schema_cdm}.observation")
+                with self.db_manager.engine.connect() as conn:
+                    res = conn.execute(count_sql).mappings().first()
+                print(f"📊 Total observations in database: {int(res['count'])}")
             return True
 
         except Exception as e:
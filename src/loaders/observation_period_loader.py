@@ -1,8 +1,8 @@
-import math
 import pandas as pd
 from typing import Optional, List
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
 
 OMOP_OBSERVATION_PERIOD_COLUMNS: List[str] = [
     "observation_period_id",
@@ -13,10 +13,11 @@ OMOP_OBSERVATION_PERIOD_COLUMNS: List[str] = [
 ]
 
 class ObservationPeriodLoader:
-    """Loader for OMOP CDM observation_period table using pandas.to_sql"""
+    """Loader for OMOP CDM observation_period table via the shared COPY bulk loader"""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode)
 
     def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         # keep only columns that exist in OMOP observation_period
@@ -41,34 +42,12 @@ class ObservationPeriodLoader:
             # Observation periods are typically small dataset, use reasonable batch size
             if not batch_size or batch_size <= 0 or batch_size > total:
                 batch_size = min(500, total)
-            num_batches = math.ceil(total / batch_size)
 
-            print(f"🚀 Loading {total} observation periods via to_sql "
+            print(f"🚀 Loading {total} observation periods via {self.bulk_loader.mode} "
                   f"(schema={self.db_manager.config.schema_cdm}, table=observation_period, "
-                  f"batches={num_batches}, batch_size={batch_size})...")
+                  f"batch_size={batch_size})...")
 
-            start = 0
-            for i in range(num_batches):
-                end = min(start + batch_size, total)
-                chunk = df.iloc[start:end]
-
-                try:
-                    # Use engine directly with pandas.to_sql
-                    chunk.to_sql(
-                        name="observation_period",
-                        con=self.db_manager.engine,
-                        schema=self.db_manager.config.schema_cdm,
-                        if_exists="append",
-                        index=False,
-                        method="multi",
-                        chunksize=len(chunk)
-                    )
-                    print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
-                except Exception as e:
-                    print(f"   ❌ Batch {i+1}/{num_batches} failed: {str(e)[:200]}...")
-                    return False
-                        
-                start = end
+            self.bulk_loader.load(df, "observation_period", batch_size=batch_size)
 
             print("✅ All data loaded successfully!")
 
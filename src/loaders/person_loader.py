@@ -1,8 +1,8 @@
-import math
 import pandas as pd
 from typing import Optional, List
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
 
 OMOP_PERSON_COLUMNS: List[str] = [
     "person_id",
@@ -26,10 +26,11 @@ OMOP_PERSON_COLUMNS: List[str] = [
 ]
 
 class PersonLoader:
-    """Loader for OMOP CDM person table using pandas.to_sql (robust, no param-shape issues)."""
+    """Loader for OMOP CDM person table via the shared COPY bulk loader."""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode)
 
     def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         # keep only columns that exist in OMOP person
@@ -53,29 +54,12 @@ class PersonLoader:
             total = len(df)
             if not batch_size or batch_size <= 0 or batch_size > total:
                 batch_size = total
-            num_batches = math.ceil(total / batch_size)
 
-            print(f"🚀 Loading {total} persons via to_sql "
+            print(f"🚀 Loading {total} persons via {self.bulk_loader.mode} "
                   f"(schema={self.db_manager.config.schema_cdm}, table=person, "
-                  f"batches={num_batches}, batch_size={batch_size})...")
+                  f"batch_size={batch_size})...")
 
-            start = 0
-            for i in range(num_batches):
-                end = min(start + batch_size, total)
-                chunk = df.iloc[start:end]
-
-                # IMPORTANT: use engine directly; do NOT go through bulk_insert here
-                chunk.to_sql(
-                    name="person",
-                    con=self.db_manager.engine,
-                    schema=self.db_manager.config.schema_cdm,
-                    if_exists="append",
-                    index=False,
-                    method="multi",        # build batched INSERTs
-                    chunksize=len(chunk)   # one SQL per chunk
-                )
-                print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
-                start = end
+            self.bulk_loader.load(df, "person", batch_size=batch_size)
 
             print("✅ All data loaded successfully!")
 
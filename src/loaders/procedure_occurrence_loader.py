@@ -1,8 +1,8 @@
-import math
 import pandas as pd
 from typing import Optional, List
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
 
 OMOP_PROCEDURE_OCCURRENCE_COLUMNS: List[str] = [
     "procedure_occurrence_id",
@@ -24,10 +24,11 @@ OMOP_PROCEDURE_OCCURRENCE_COLUMNS: List[str] = [
 ]
 
 class ProcedureOccurrenceLoader:
-    """Loader for OMOP CDM procedure_occurrence table using pandas.to_sql"""
+    """Loader for OMOP CDM procedure_occurrence table via the shared COPY bulk loader"""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode)
 
     def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         # keep only columns that exist in OMOP procedure_occurrence
@@ -40,7 +41,8 @@ class ProcedureOccurrenceLoader:
         aligned = aligned.replace({pd.NaT: None})
         return aligned
 
-    def load_procedure_occurrences(self, procedures_df: pd.DataFrame, batch_size: Optional[int] = None) -> bool:
+    def load_procedure_occurrences(self, procedures_df: pd.DataFrame, batch_size: Optional[int] = None,
+                                   report_count: bool = True) -> bool:
         if procedures_df is None or procedures_df.empty:
             print("❌ No data to load")
             return False
@@ -52,58 +54,23 @@ class ProcedureOccurrenceLoader:
             # Use appropriate batch size for procedures (increased from 100)
             if not batch_size or batch_size <= 0 or batch_size > total:
                 batch_size = min(200, total)  # Increased default batch size
-            num_batches = math.ceil(total / batch_size)
 
-            print(f"🚀 Loading {total} procedure occurrences via to_sql "
+            print(f"🚀 Loading {total} procedure occurrences via {self.bulk_loader.mode} "
                   f"(schema={self.db_manager.config.schema_cdm}, table=procedure_occurrence, "
-                  f"batches={num_batches}, batch_size={batch_size})...")
+                  f"batch_size={batch_size})...")
 
-            start = 0
-            for i in range(num_batches):
-                end = min(start + batch_size, total)
-                chunk = df.iloc[start:end]
+            self.bulk_loader.load(df, "procedure_occurrence", batch_size=batch_size,
+                                  chunksize=75, retry_rows=25, retry_chunksize=10)
 
-                try:
-                    # Use engine directly with pandas.to_sql
-                    chunk.to_sql(
-                        name="procedure_occurrence",
-                        con=self.db_manager.engine,
-                        schema=self.db_manager.config.schema_cdm,
-                        if_exists="append",
-                        index=False,
-                        method="multi",        # build batched INSERTs
-                        chunksize=75          # Increased chunk size for better performance
-                    )
-                    print(f"   ✅ Batch {i+1}/{num_batches} inserted ({len(chunk)} rows).")
-                except Exception as e:
-                    print(f"   ❌ Batch {i+1}/{num_batches} failed: {str(e)[:200]}...")
-                    # Try smaller chunks if batch fails
-                    if len(chunk) > 1:
-                        print(f"   🔄 Retrying batch {i+1} with smaller chunks...")
-                        for j in range(0, len(chunk), 25):  # 25 rows at a time
-                            mini_chunk = chunk.iloc[j:j+25]
-                            mini_chunk.to_sql(
-                                name="procedure_occurrence",
-                                con=self.db_manager.engine,
-                                schema=self.db_manager.config.schema_cdm,
-                                if_exists="append",
-                                index=False,
-                                method="multi",
-                                chunksize=10
-                            )
-                        print(f"   ✅ Batch {i+1} completed with smaller chunks")
-                    else:
-                        print(f"   ❌ Single row failed, skipping...")
-                        
-                start = end
+            # Streamed chunks leave the banner and table count to the end of the stream
+            if report_count:
+                print("✅ All data loaded successfully!")
 
-            print("✅ All data loaded successfully!")
-
-            # Post-load count
-            count_sql = text(f"SELECT COUNT(*) AS count FROM {self.db_manager.config.schema_cdm}.procedure_occurrence")
-            with self.db_manager.engine.connect() as conn:
-                res = conn.execute(count_sql).mappings().first()
-            print(f"📊 Total procedure occurrences in database: {int(res['count'])}")
+                # Post-load count
+                count_sql = text(f"SELECT COUNT(*) AS count FROM {self.db_manager.config.schema_cdm}.procedure_occurrence")
+                with self.db_manager.engine.connect() as conn:
+                    res = conn.execute(count_sql).mappings().first()
+                print(f"📊 Total procedure occurrences in database: {int(res['count'])}")
             return True
 
         except Exception as e:
@@ -1,20 +1,46 @@
 # src/loaders/provider_loader.py
 
 import pandas as pd
+from typing import List
 from sqlalchemy import text
 from src.utils.logging import setup_logging
 from src.database.connection import DatabaseManager
+from src.loaders.bulk_loader import BulkLoader, LOAD_MODE_COPY
+
+OMOP_PROVIDER_COLUMNS: List[str] = [
+    "provider_id",
+    "provider_name",
+    "npi",
+    "dea",
+    "specialty_concept_id",
+    "care_site_id",
+    "year_of_birth",
+    "gender_concept_id",
+    "provider_source_value",
+    "specialty_source_value",
+    "specialty_source_concept_id",
+    "gender_source_value",
+    "gender_source_concept_id"
+]
 
 class ProviderLoader:
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, load_mode: str = LOAD_MODE_COPY):
         self.db_manager = db_manager
+        self.bulk_loader = BulkLoader(db_manager, mode=load_mode)
         self.logger = setup_logging(log_level="INFO")
         self.schema = db_manager.config.schema_cdm
 
+    def _align_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        # keep only columns that exist in OMOP provider
+        cols = [c for c in OMOP_PROVIDER_COLUMNS if c in df.columns]
+        aligned = df[cols].copy()
+        aligned = aligned.replace({pd.NaT: None})
+        return aligned
+
     def load_providers(self, df: pd.DataFrame, batch_size: int = 500) -> bool:
         try:
-            self.logger.info(f"💾 Loading {len(df)} providers to database...")
-            self.db_manager.bulk_insert(df, table_name="provider", schema=self.schema)
+            self.logger.info(f"💾 Loading {len(df)} providers to database via {self.bulk_loader.mode}...")
+            self.bulk_loader.load(self._align_columns(df), "provider", chunksize=1000)
             self.logger.info("✅ Provider data loaded successfully")
             return True
         except Exception as e:
@@ -0,0 +1,83 @@
+# src/pipeline/encounter_resolver.py
+"""
+Encounter Resolver
+
+Clinical event rows name their Synthea encounter; the OMOP rows need the matching
+visit_occurrence_id, and some also need the visit's provider or care site. The
+resolver hashes each distinct encounter once and hash-joins the IDs against the
+loaded visits from the run context, so each transform call runs one lookup
+instead of a SELECT per row or a filter per encounter.
+"""
+
+import pandas as pd
+from typing import Optional
+from src.database.connection import DatabaseManager
+from src.pipeline.run_context import RunContext, VISIT_REFERENCE_COLUMNS
+from src.utils.uuid_converter import UUIDConverter
+
+RESOLVED_COLUMNS = ['visit_occurrence_id'] + VISIT_REFERENCE_COLUMNS
+
+
+class EncounterResolver:
+    """Map encounter UUIDs to loaded visits and their provider/care site"""
+
+    def __init__(self, db_manager: Optional[DatabaseManager] = None, context: Optional[RunContext] = None):
+        """
+        Initialize encounter resolver.
+
+        Args:
+            db_manager: Database connection manager (used when no context is given)
+            context: Shared run context holding the loaded visits
+        """
+        if context is None and db_manager is not None:
+            context = RunContext(db_manager)
+        self.context = context
+
+    def resolve(self, encounters: pd.Series) -> pd.DataFrame:
+        """
+        Resolve encounter UUIDs to visits.
+
+        Args:
+            encounters: Encounter UUID per event row (may contain nulls)
+
+        Returns:
+            DataFrame aligned with encounters with visit_occurrence_id, provider_id and
+            care_site_id as nullable Int64. All three are NA when the encounter is null
+            or its visit is not in the visit_occurrence table.
+        """
+        resolved = pd.DataFrame(
+            {column: pd.array([pd.NA] * len(encounters), dtype='Int64') for column in RESOLVED_COLUMNS},
+            index=encounters.index
+        )
+        if self.context is None:
+            return resolved
+
+        codes, uniques = pd.factorize(encounters)
+        if len(uniques) == 0:
+            return resolved
+
+        try:
+            visits = self.context.visits()
+        except Exception as e:
+            print(f"⚠️ Error loading visits for encounter lookup: {e}")
+            # Non-critical - visits are optional, so leave them unresolved
+            return resolved
+
+        # One hash per distinct encounter, then a hash join against the loaded visits
+        visit_ids = UUIDConverter.visit_occurrence_ids(uniques)
+        matched = visits.reindex(visit_ids)
+        loaded = pd.Index(visit_ids).isin(visits.index)
+        visit_column = pd.array(visit_ids, dtype='Int64')
+        visit_column[~loaded] = pd.NA
+        matched.insert(0, 'visit_occurrence_id', visit_column)
+        print(f"📊 Visit mapping: {int(loaded.sum())}/{len(uniques)} encounters linked to visits")
+
+        # Back to one row per event; codes of null encounters are -1 and take NA
+        for column in RESOLVED_COLUMNS:
+            resolved[column] = matched[column].array.take(codes, allow_fill=True)
+        return resolved
+
+    def visit_occurrence_ids(self, df: pd.DataFrame, column: str = 'ENCOUNTER') -> pd.Series:
+        """Loaded visit_occurrence_id (nullable Int64) for each row of df, NA when unresolved"""
+        encounters = df.get(column, pd.Series(None, index=df.index, dtype=object))
+        return self.resolve(encounters)['visit_occurrence_id']
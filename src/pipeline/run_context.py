@@ -0,0 +1,171 @@
+# src/pipeline/run_context.py
+"""
+Run Context
+
+Reference data that child tables need from their already loaded parents: the
+persons in the person table, the provider and care site of every visit, and the
+loaded location, provider and care_site keys. The pipeline records each set as
+its parent table loads; a set whose table was not loaded in this run is fetched
+from the database the first time it is needed. Either way it is read once per
+run and shared by every transformer instead of being re-queried per table or
+per chunk.
+"""
+
+import threading
+import pandas as pd
+from typing import Callable, Dict, Iterable
+from src.database.connection import DatabaseManager
+
+LOCATION_KEY_COLUMNS = ['address_1', 'city', 'state', 'zip']
+
+# Visit attributes kept for event tables, keyed by visit_occurrence_id
+VISIT_REFERENCE_COLUMNS = ['provider_id', 'care_site_id']
+
+# Reference set each OMOP table provides
+TABLE_REFERENCES = {
+    'person': 'persons',
+    'visit_occurrence': 'visits',
+    'location': 'locations',
+    'provider': 'providers',
+    'care_site': 'care_sites'
+}
+
+
+def location_keys(locations_df: pd.DataFrame) -> pd.DataFrame:
+    """location_id with its address key as text, one row per key"""
+    locations = locations_df[['location_id'] + LOCATION_KEY_COLUMNS].copy()
+    for column in LOCATION_KEY_COLUMNS:
+        locations[column] = locations[column].astype(object).map(str)
+    return locations.drop_duplicates(subset=LOCATION_KEY_COLUMNS).reset_index(drop=True)
+
+
+class RunContext:
+    """Thread-safe, lazily filled reference sets shared across a pipeline run"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        """
+        Initialize run context.
+
+        Args:
+            db_manager: Database connection manager used for sets not recorded in this run
+        """
+        self.db_manager = db_manager
+        self.schema = db_manager.config.schema_cdm
+        self._lock = threading.Lock()
+        self._references: Dict[str, object] = {}
+        self._fetchers: Dict[str, Callable[[], object]] = {
+            'persons': self._fetch_persons,
+            'visits': self._fetch_visits,
+            'locations': self._fetch_locations,
+            'providers': lambda: self._fetch_ids('provider_id', 'provider'),
+            'care_sites': lambda: self._fetch_ids('care_site_id', 'care_site')
+        }
+
+    # ------------------------------------------------------------------
+    # Accessors
+    # ------------------------------------------------------------------
+
+    def existing_patients(self) -> frozenset:
+        """Synthea patient UUIDs (person_source_value) present in the person table"""
+        return self._get('persons')
+
+    def filter_existing_patients(self, df: pd.DataFrame, column: str = 'PATIENT') -> pd.DataFrame:
+        """Rows of df whose patient is in the person table (all rows if the lookup fails)"""
+        # Nothing to filter, e.g. the column-less frame a domain filter returns
+        if df.empty or column not in df.columns:
+            return df
+        try:
+            existing = self.existing_patients()
+        except Exception as e:
+            print(f"⚠️ Error filtering patients: {e}")
+            return df
+        if not existing:
+            print("⚠️ No persons found in database")
+            return pd.DataFrame()
+        return df[df[column].isin(existing)]
+
+    def visits(self) -> pd.DataFrame:
+        """provider_id and care_site_id (nullable Int64) indexed by visit_occurrence_id for every loaded visit"""
+        return self._get('visits')
+
+    def visit_providers(self) -> pd.Series:
+        """provider_id (nullable Int64) indexed by visit_occurrence_id for every loaded visit"""
+        return self.visits()['provider_id']
+
+    def locations(self) -> pd.DataFrame:
+        """location_id and its address key (address_1, city, state, zip as text)"""
+        return self._get('locations')
+
+    def provider_ids(self) -> frozenset:
+        return self._get('providers')
+
+    def care_site_ids(self) -> frozenset:
+        return self._get('care_sites')
+
+    # ------------------------------------------------------------------
+    # Recording loaded tables
+    # ------------------------------------------------------------------
+
+    def record_persons(self, person_source_values: Iterable) -> None:
+        self._set('persons', frozenset(pd.Series(person_source_values).dropna().astype(str)))
+
+    def record_visits(self, visits_df: pd.DataFrame) -> None:
+        self._set('visits', self._visit_map(visits_df))
+
+    def record_locations(self, locations_df: pd.DataFrame) -> None:
+        self._set('locations', location_keys(locations_df))
+
+    def record_providers(self, provider_ids: Iterable) -> None:
+        self._set('providers', frozenset(pd.Series(provider_ids).dropna().astype('int64')))
+
+    def record_care_sites(self, care_site_ids: Iterable) -> None:
+        self._set('care_sites', frozenset(pd.Series(care_site_ids).dropna().astype('int64')))
+
+    def invalidate(self, table: str) -> None:
+        """Forget the set a table provides (it was cleared or is being rebuilt)"""
+        reference = TABLE_REFERENCES.get(table)
+        if reference:
+            with self._lock:
+                self._references.pop(reference, None)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _get(self, name: str):
+        """Recorded or fetched set; fetch errors propagate and nothing is cached"""
+        with self._lock:
+            if name not in self._references:
+                self._references[name] = self._fetchers[name]()
+            return self._references[name]
+
+    def _set(self, name: str, value) -> None:
+        with self._lock:
+            self._references[name] = value
+
+    def _fetch_persons(self) -> frozenset:
+        result = self.db_manager.execute_query(f"SELECT DISTINCT person_source_value FROM {self.schema}.person")
+        return frozenset(result['person_source_value'].dropna().astype(str))
+
+    def _fetch_visits(self) -> pd.DataFrame:
+        return self._visit_map(self.db_manager.execute_query(
+            f"SELECT visit_occurrence_id, provider_id, care_site_id FROM {self.schema}.visit_occurrence"
+        ))
+
+    def _fetch_locations(self) -> pd.DataFrame:
+        return location_keys(self.db_manager.execute_query(
+            f"SELECT location_id, address_1, city, state, zip FROM {self.schema}.location"
+        ))
+
+    def _fetch_ids(self, id_column: str, table: str) -> frozenset:
+        result = self.db_manager.execute_query(f"SELECT {id_column} FROM {self.schema}.{table}")
+        return frozenset(result[id_column].dropna().astype('int64'))
+
+    @staticmethod
+    def _visit_map(visits_df: pd.DataFrame) -> pd.DataFrame:
+        visits = visits_df.drop_duplicates(subset=['visit_occurrence_id'])
+        no_values = pd.Series(None, index=visits.index, dtype=object)
+        return pd.DataFrame(
+            {column: pd.array(visits.get(column, no_values), dtype='Int64') for column in VISIT_REFERENCE_COLUMNS},
+            index=pd.Index(visits['visit_occurrence_id'].astype('int64'), name='visit_occurrence_id')
+        )
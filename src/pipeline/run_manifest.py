@@ -0,0 +1,113 @@
+# src/pipeline/run_manifest.py
+"""
+Run Manifest
+
+Local JSON record of which OMOP tables a pipeline run finished, with their row
+counts and a fingerprint of the inputs they were built from. `--resume` uses it to
+skip tables that are complete and whose inputs have not changed since.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+DEFAULT_MANIFEST_PATH = ".pipeline_manifest.json"
+
+# Bump when the fingerprint inputs change meaning
+MANIFEST_FORMAT_VERSION = 1
+
+
+def file_fingerprint(path: Path) -> Optional[Dict[str, int]]:
+    """Size and mtime of an input file, None if it does not exist"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def fingerprint(inputs: Dict[str, object]) -> str:
+    """Stable hash of a table's inputs (source file stats, settings, ...)"""
+    payload = json.dumps({"format": MANIFEST_FORMAT_VERSION, "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RunManifest:
+    """Thread-safe, atomically saved table completion records"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize run manifest.
+
+        Args:
+            path: Manifest file (default: PIPELINE_MANIFEST or .pipeline_manifest.json)
+        """
+        self.path = Path(path or os.getenv("PIPELINE_MANIFEST", DEFAULT_MANIFEST_PATH))
+        self._lock = threading.Lock()
+        self._tables: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if data.get("format") != MANIFEST_FORMAT_VERSION:
+            return {}
+        return data.get("tables", {})
+
+    def entry(self, table: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._tables.get(table)
+            return dict(entry) if entry else None
+
+    def is_complete(self, table: str, table_fingerprint: str) -> bool:
+        """True when the table finished with the same input fingerprint"""
+        entry = self.entry(table)
+        return bool(entry and entry.get("status") == "complete" and entry.get("fingerprint") == table_fingerprint)
+
+    def mark_started(self, table: str) -> None:
+        self._update(table, {"status": "running", "started_at": datetime.now().isoformat()})
+
+    def mark_complete(self, table: str, table_fingerprint: str, row_count: Optional[int],
+                      duration_seconds: Optional[float] = None) -> None:
+        self._update(table, {
+            "status": "complete",
+            "fingerprint": table_fingerprint,
+            "row_count": row_count,
+            "duration_seconds": round(duration_seconds, 3) if duration_seconds is not None else None,
+            "completed_at": datetime.now().isoformat()
+        })
+
+    def mark_failed(self, table: str) -> None:
+        self._update(table, {"status": "failed", "failed_at": datetime.now().isoformat()})
+
+    def invalidate(self, tables: Iterable[str]) -> None:
+        """Forget completion of tables whose data is about to be replaced"""
+        with self._lock:
+            changed = False
+            for table in tables:
+                if table in self._tables:
+                    del self._tables[table]
+                    changed = True
+            if changed:
+                self._save()
+
+    def _update(self, table: str, entry: dict) -> None:
+        with self._lock:
+            self._tables[table] = entry
+            self._save()
+
+    def _save(self) -> None:
+        """Write to a temporary file and swap it in, so a crash never leaves a torn manifest"""
+        if self.path.parent != Path(""):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+        with open(tmp_path, "w") as f:
+            json.dump({"format": MANIFEST_FORMAT_VERSION, "tables": self._tables}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
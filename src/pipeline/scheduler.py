@@ -0,0 +1,154 @@
+# src/pipeline/scheduler.py
+"""
+Table Scheduler
+
+Runs pipeline tables as a dependency graph: each table starts as soon as the
+tables it depends on have finished, on a bounded thread pool. Every table's
+database work goes through the shared SQLAlchemy pool, so concurrent tables use
+separate connections.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Sequence
+from src.utils.logging import setup_logging
+
+# Failure policies
+FAIL_FAST = "fail-fast"   # stop scheduling new tables after the first failure
+CONTINUE = "continue"     # keep running tables that do not depend on a failed one
+FAILURE_POLICIES: List[str] = [FAIL_FAST, CONTINUE]
+
+# Table outcomes
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"       # a prerequisite failed
+CANCELLED = "cancelled"   # never started because of fail-fast
+
+
+def dependents(dependencies: Dict[str, Sequence[str]], table: str) -> List[str]:
+    """Tables that depend on table, directly or transitively"""
+    found = []
+    frontier = [table]
+    while frontier:
+        current = frontier.pop()
+        for candidate, deps in dependencies.items():
+            if current in deps and candidate not in found:
+                found.append(candidate)
+                frontier.append(candidate)
+    return found
+
+
+class TableScheduler:
+    """Dependency-aware, bounded-concurrency runner for pipeline tables"""
+
+    def __init__(self, dependencies: Dict[str, Sequence[str]], max_workers: int = 1,
+                 on_failure: str = FAIL_FAST, logger=None):
+        """
+        Initialize table scheduler.
+
+        Args:
+            dependencies: Table -> tables that must finish before it starts
+            max_workers: Maximum number of tables processed at the same time
+            on_failure: FAIL_FAST or CONTINUE
+            logger: Logger to report progress to (default: pipeline logger)
+        """
+        if on_failure not in FAILURE_POLICIES:
+            raise ValueError(f"Unknown failure policy '{on_failure}', expected one of {FAILURE_POLICIES}")
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        self.dependencies = dependencies
+        self.max_workers = max_workers
+        self.on_failure = on_failure
+        self.logger = logger or setup_logging(log_level="INFO")
+        self.durations: Dict[str, float] = {}
+
+    def plan(self, tables: Sequence[str]) -> Dict[str, List[str]]:
+        """
+        Prerequisites of each requested table, restricted to the requested tables.
+
+        A prerequisite that is not requested is assumed to be loaded already.
+
+        Raises:
+            ValueError: If the requested tables contain a dependency cycle
+        """
+        selected = list(dict.fromkeys(tables))
+        graph = {
+            table: [dep for dep in self.dependencies.get(table, []) if dep in selected and dep != table]
+            for table in selected
+        }
+
+        # Kahn's algorithm, only to reject cycles up front
+        remaining = {table: set(deps) for table, deps in graph.items()}
+        while remaining:
+            ready = [table for table, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle between tables: {sorted(remaining)}")
+            for table in ready:
+                del remaining[table]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+        return graph
+
+    def run(self, tables: Sequence[str], run_table: Callable[[str], bool]) -> Dict[str, str]:
+        """
+        Process tables in dependency order.
+
+        Args:
+            tables: Tables to process; with one worker they run in this order
+            run_table: Processes one table, returns True on success
+
+        Returns:
+            Table -> SUCCEEDED / FAILED / SKIPPED / CANCELLED
+        """
+        graph = self.plan(tables)
+        order = list(graph)
+        status: Dict[str, str] = {}
+        running = {}
+        stop = False
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="table") as executor:
+            while True:
+                if not stop:
+                    for table in order:
+                        if len(running) >= self.max_workers:
+                            break
+                        if table in status or table in running.values():
+                            continue
+                        if all(status.get(dep) == SUCCEEDED for dep in graph[table]):
+                            running[executor.submit(self._timed, run_table, table)] = table
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    table = running.pop(future)
+                    try:
+                        success = future.result()
+                    except Exception as e:
+                        self.logger.error(f"❌ {table} raised: {e}")
+                        success = False
+
+                    if success:
+                        status[table] = SUCCEEDED
+                        continue
+
+                    status[table] = FAILED
+                    if self.on_failure == FAIL_FAST:
+                        stop = True
+                    else:
+                        for dependent in dependents(graph, table):
+                            if dependent not in status:
+                                status[dependent] = SKIPPED
+                                self.logger.warning(f"⏭️ Skipping {dependent}: depends on failed {table}")
+
+        return {table: status.get(table, CANCELLED) for table in order}
+
+    def _timed(self, run_table: Callable[[str], bool], table: str) -> bool:
+        started = time.perf_counter()
+        try:
+            return run_table(table)
+        finally:
+            self.durations[table] = time.perf_counter() - started
@@ -0,0 +1,169 @@
+# src/pipeline/stage_runner.py
+"""
+Stage Runner
+
+Streams items (source chunks) through a chain of stages, such as extract ->
+transform -> load, with every stage on its own thread. Neighbouring stages are
+connected by bounded queues: while one chunk is being loaded the next is being
+transformed and the one after that read, and a stage that falls behind blocks
+the stages feeding it, so at most queue_size chunks wait between two stages.
+Items reach each stage in source order. The first error stops every stage and
+is raised in the caller.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Chunks waiting between two stages
+DEFAULT_QUEUE_SIZE = 2
+
+# Seconds a blocked stage waits before checking whether another stage failed
+POLL_SECONDS = 0.5
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class StageRunner:
+    """Run a source and a chain of stages concurrently over bounded queues"""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE, logger=None):
+        """
+        Initialize stage runner.
+
+        Args:
+            queue_size: Maximum items waiting between two stages
+            logger: Logger to report stage timings to (default: print)
+        """
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+
+        self.queue_size = queue_size
+        self.logger = logger
+        # Seconds each stage spent working (not waiting on its queues)
+        self.durations: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def run(self, source: Iterable, stages: List[Tuple[str, Callable]], source_name: str = "extract") -> int:
+        """
+        Feed every item of source through the stages.
+
+        Args:
+            source: Iterable producing the items (read on its own thread); a generator
+                    is closed when the run stops early, so pass it unwrapped
+            stages: (name, function) pairs; each function takes an item and returns the
+                    item for the next stage, or None to drop it
+            source_name: Name the source is timed under
+
+        Returns:
+            Number of items the last stage processed
+        """
+        self.durations = {source_name: 0.0, **{name: 0.0 for name, _ in stages}}
+        self._failed.clear()
+        self._error = None
+        completed = [0]
+        started = time.perf_counter()
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        threads = [threading.Thread(target=self._produce, args=(source_name, source, queues[0]),
+                                    name=f"stage-{source_name}", daemon=True)]
+        for i, (name, function) in enumerate(stages):
+            outbox = queues[i + 1] if i + 1 < len(stages) else None
+            threads.append(threading.Thread(
+                target=self._work, args=(name, function, queues[i], outbox, completed),
+                name=f"stage-{name}", daemon=True
+            ))
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+        elapsed = time.perf_counter() - started
+        timings = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.durations.items())
+        self._report(f"⏱️ Stages overlapped in {elapsed:.1f}s ({timings})")
+        return completed[0]
+
+    def _produce(self, name: str, source: Iterable, outbox: queue.Queue) -> None:
+        items = None
+        try:
+            items = iter(source)
+            while not self._failed.is_set():
+                started = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    self._add_duration(name, time.perf_counter() - started)
+                self._put(outbox, item)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # Let a generator source close its reader when the run stops early
+            if hasattr(items, 'close'):
+                items.close()
+            self._put(outbox, _DONE)
+
+    def _work(self, name: str, function: Callable, inbox: queue.Queue,
+              outbox: Optional[queue.Queue], completed: List[int]) -> None:
+        try:
+            while True:
+                item = self._get(inbox)
+                if item is _DONE:
+                    return
+
+                started = time.perf_counter()
+                result = function(item)
+                self._add_duration(name, time.perf_counter() - started)
+
+                if outbox is None:
+                    completed[0] += 1
+                elif result is not None:
+                    self._put(outbox, result)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            if outbox is not None:
+                self._put(outbox, _DONE)
+
+    def _put(self, outbox: queue.Queue, item) -> None:
+        """Blocking put that gives up once any stage has failed"""
+        while not self._failed.is_set():
+            try:
+                outbox.put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, inbox: queue.Queue):
+        """Blocking get that returns _DONE once any stage has failed"""
+        while not self._failed.is_set():
+            try:
+                return inbox.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._failed.set()
+
+    def _add_duration(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[name] += seconds
+
+    def _report(self, message: str) -> None:
+        if self.logger is not None:
+            self.logger.info(message)
+        else:
+            print(message)
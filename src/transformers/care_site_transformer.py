@@ -1,6 +1,6 @@
 import pandas as pd
-import hashlib
 from typing import Optional
+from src.utils.uuid_converter import UUIDConverter
 
 class CareSiteTransformer:
     """Transform provider data to extract unique care sites"""
@@ -23,6 +23,10 @@ class CareSiteTransformer:
         
         print(f"✅ Found {len(unique_orgs)} unique organizations")
         
+        # Generate all care_site_ids in one batch
+        unique_orgs = unique_orgs.copy()
+        unique_orgs["_care_site_id"] = UUIDConverter.care_site_ids(unique_orgs["ORGANIZATION"])
+        
         care_sites = []
         
         for idx, row in unique_orgs.iterrows():
@@ -47,8 +51,8 @@ class CareSiteTransformer:
         
         org_uuid = str(org_row["ORGANIZATION"])
         
-        # Generate care_site_id from organization UUID
-        care_site_id = self._uuid_to_int(org_uuid)
+        # care_site_id was generated from the organization UUID in batch
+        care_site_id = int(org_row["_care_site_id"])
         
         # Create OMOP care_site record
         return {
@@ -58,13 +62,4 @@ class CareSiteTransformer:
             'location_id': None,  # Could be set if you have org location data
             'care_site_source_value': org_uuid,
             'place_of_service_source_value': None
-        }
-    
-    def _uuid_to_int(self, uuid_str: str) -> int:
-        """Convert UUID string to deterministic 32-bit signed integer"""
-        # Use first 4 bytes of MD5 hash to create 32-bit integer
-        hash_bytes = hashlib.md5(str(uuid_str).encode()).digest()[:4]
-        # Convert to signed 32-bit integer to avoid database issues
-        unsigned_int = int.from_bytes(hash_bytes, byteorder='big', signed=False)
-        # Convert to signed 32-bit range (0 to 2^31-1)
-        return unsigned_int % 2147483647 + 1
\ No newline at end of file
+        }
\ No newline at end of file
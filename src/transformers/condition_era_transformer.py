@@ -7,9 +7,10 @@ Groups consecutive conditions of the same type into eras using a persistence win
 """
 
 import pandas as pd
-import hashlib
-from datetime import timedelta
+from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.utils.era_engine import collapse_eras, era_sql
+from src.utils.uuid_converter import UUIDConverter
 
 
 class ConditionEraTransformer:
@@ -56,6 +57,49 @@ class ConditionEraTransformer:
 
         return eras
 
+    def build_in_database(self) -> int:
+        """
+        Build condition eras with INSERT ... SELECT inside PostgreSQL.
+
+        Same eras and era IDs as transform(), without moving condition_occurrence
+        rows out of the database.
+
+        Returns:
+            Number of condition eras inserted
+        """
+        print(f"🔄 Building condition eras in the database (gap={self.gap_days} days)...")
+
+        source = f"""
+        SELECT person_id, condition_concept_id, condition_start_date, condition_end_date
+        FROM {self.schema}.condition_occurrence
+        WHERE condition_concept_id != 0
+        """
+        eras = era_sql(source, ['person_id', 'condition_concept_id'],
+                       'condition_start_date', 'condition_end_date', self.gap_days)
+        era_key = (
+            "'condition_era_' || person_id::text || '_' || condition_concept_id::text || '_' || "
+            "to_char(era_start_date, 'YYYY-MM-DD')"
+        )
+        query = f"""
+        INSERT INTO {self.schema}.condition_era (
+            condition_era_id, person_id, condition_concept_id,
+            condition_era_start_date, condition_era_end_date, condition_occurrence_count
+        )
+        SELECT
+            {UUIDConverter.generic_id_sql(era_key)},
+            person_id,
+            condition_concept_id,
+            era_start_date,
+            era_end_date,
+            record_count
+        FROM ({eras}) eras
+        """
+        with self.db_manager.engine.begin() as conn:
+            inserted = conn.execute(text(query)).rowcount
+
+        print(f"✅ Inserted {inserted} condition eras")
+        return inserted
+
     def _get_condition_occurrences(self) -> pd.DataFrame:
         """Get condition occurrence data from database."""
         query = f"""
@@ -80,75 +124,24 @@ class ConditionEraTransformer:
            they belong to the same era
         3. Calculate era start (min start_date), era end (max end_date),
            and occurrence count
-        """
-        eras = []
-
-        # Group by person and condition concept
-        grouped = conditions_df.groupby(['person_id', 'condition_concept_id'])
 
-        for (person_id, concept_id), group in grouped:
-            # Sort by start date
-            group = group.sort_values('condition_start_date').reset_index(drop=True)
-
-            # Handle null end dates - use start date as end date
-            group['condition_end_date'] = group.apply(
-                lambda row: row['condition_end_date'] if pd.notna(row['condition_end_date'])
-                else row['condition_start_date'],
-                axis=1
-            )
-
-            # Build eras for this person/concept combination
-            era_start = group.iloc[0]['condition_start_date']
-            era_end = group.iloc[0]['condition_end_date']
-            occurrence_count = 1
-
-            for i in range(1, len(group)):
-                current_start = group.iloc[i]['condition_start_date']
-                current_end = group.iloc[i]['condition_end_date']
-
-                # Calculate gap between previous era end and current start
-                gap = (current_start - era_end).days if pd.notna(era_end) and pd.notna(current_start) else 0
-
-                if gap <= self.gap_days:
-                    # Extend current era
-                    era_end = max(era_end, current_end) if pd.notna(current_end) else era_end
-                    occurrence_count += 1
-                else:
-                    # Save current era and start new one
-                    eras.append({
-                        'person_id': person_id,
-                        'condition_concept_id': concept_id,
-                        'condition_era_start_date': era_start,
-                        'condition_era_end_date': era_end,
-                        'condition_occurrence_count': occurrence_count
-                    })
-
-                    # Start new era
-                    era_start = current_start
-                    era_end = current_end
-                    occurrence_count = 1
-
-            # Don't forget the last era
-            eras.append({
-                'person_id': person_id,
-                'condition_concept_id': concept_id,
-                'condition_era_start_date': era_start,
-                'condition_era_end_date': era_end,
-                'condition_occurrence_count': occurrence_count
-            })
-
-        # Create DataFrame
-        eras_df = pd.DataFrame(eras)
+        Null end dates are replaced by the start date.
+        """
+        eras_df = collapse_eras(
+            conditions_df, ['person_id', 'condition_concept_id'],
+            'condition_start_date', 'condition_end_date', self.gap_days
+        ).rename(columns={
+            'era_start_date': 'condition_era_start_date',
+            'era_end_date': 'condition_era_end_date',
+            'record_count': 'condition_occurrence_count'
+        })
 
         if not eras_df.empty:
             # Generate unique era IDs
-            eras_df['condition_era_id'] = eras_df.apply(
-                lambda row: self._generate_era_id(
-                    row['person_id'],
-                    row['condition_concept_id'],
-                    row['condition_era_start_date']
-                ),
-                axis=1
+            eras_df['condition_era_id'] = UUIDConverter.generic_ids(
+                'condition_era_' + eras_df['person_id'].map(str) + '_' +
+                eras_df['condition_concept_id'].map(str) + '_' +
+                eras_df['condition_era_start_date'].map(str)
             )
 
             # Reorder columns
@@ -162,9 +155,3 @@ class ConditionEraTransformer:
             ]]
 
         return eras_df
-
-    def _generate_era_id(self, person_id: int, concept_id: int, start_date) -> int:
-        """Generate unique era ID from components."""
-        key = f"condition_era_{person_id}_{concept_id}_{start_date}"
-        hash_bytes = hashlib.md5(key.encode()).digest()[:4]
-        return int.from_bytes(hash_bytes, byteorder='big', signed=False) % 2147483647 + 1
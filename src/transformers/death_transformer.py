@@ -2,12 +2,19 @@ import pandas as pd
 from datetime import datetime
 from typing import Optional, Dict
 from src.utils.uuid_converter import UUIDConverter
+from src.vocabulary.vocabulary_service import VocabularyService
+from src.pipeline.run_context import RunContext
+from src.utils.date_parser import parse_dmy_datetime
 
 class DeathTransformer:
     """Transform death data from patient and observation sources to OMOP death format"""
     
-    def __init__(self, db_manager=None):
+    def __init__(self, db_manager=None, vocabulary: Optional[VocabularyService] = None,
+                 context: Optional[RunContext] = None):
         self.db_manager = db_manager
+        self.vocabulary = vocabulary or (VocabularyService(db_manager) if db_manager else None)
+        # Person and visit sets shared across the run (queried here when absent)
+        self.context = context
         self.death_certificate_code = "69453-9"  # Cause of Death [US Standard Certificate of Death]
         
         # Cache for concept lookups
@@ -40,6 +47,10 @@ class DeathTransformer:
         if self.db_manager:
             self._preload_concept_mappings(enriched_deaths)
         
+        # Convert patient_id to OMOP person_id in one batch
+        enriched_deaths = enriched_deaths.copy()
+        enriched_deaths['_person_id'] = UUIDConverter.person_ids(enriched_deaths['patient_id'])
+        
         death_records = []
         total_records = len(enriched_deaths)
         
@@ -139,33 +150,20 @@ class DeathTransformer:
     
     def _preload_concept_mappings(self, deaths_df: pd.DataFrame) -> None:
         """Pre-load death type concept mapping and cause concept lookups"""
-        if not self.db_manager:
+        if not self.vocabulary:
             return
         
         try:
             print("🔄 Pre-loading death type concept mapping...")
             
             # Map death certificate code to death_type_concept_id - search in Observation domain, not Type Concept
-            death_type_query = f"""
-            SELECT 
-                c.concept_id,
-                c.concept_name,
-                c.vocabulary_id,
-                c.standard_concept
-            FROM {self.db_manager.config.schema_cdm}.concept c
-            WHERE c.concept_code = %(code)s
-              AND c.vocabulary_id = 'LOINC'
-              AND c.domain_id = 'Observation'
-              AND c.standard_concept = 'S'
-              AND c.invalid_reason IS NULL
-            LIMIT 1
-            """
-            
-            result = self.db_manager.execute_query(death_type_query, {'code': self.death_certificate_code})
+            mapping = self.vocabulary.concept_mapping(
+                [self.death_certificate_code], domain='Observation', vocabularies=['LOINC'], standard_only=True
+            )
             
-            if not result.empty:
-                concept_id = int(result.iloc[0]['concept_id'])
-                concept_name = result.iloc[0]['concept_name']
+            if not mapping.empty:
+                concept_id = int(mapping.iloc[0]['source_concept_id'])
+                concept_name = mapping.iloc[0]['concept_name']
                 self._death_type_concept_cache[self.death_certificate_code] = concept_id
                 print(f"✅ Mapped death certificate code {self.death_certificate_code} to concept {concept_id} ({concept_name})")
             else:
@@ -205,49 +203,13 @@ class DeathTransformer:
             for i, pattern in enumerate(search_patterns):
                 print(f"   Searching for '{pattern}' (attempt {i+1})")
                 
-                # Search for concepts by name similarity
-                search_query = f"""
-                SELECT 
-                    c.concept_id,
-                    c.concept_name,
-                    c.vocabulary_id,
-                    c.standard_concept,
-                    CASE 
-                        WHEN LOWER(c.concept_name) = LOWER(%(exact_term)s) THEN 1
-                        WHEN LOWER(c.concept_name) LIKE LOWER(%(starts_with)s) THEN 2
-                        WHEN LOWER(c.concept_name) LIKE LOWER(%(contains)s) THEN 3
-                        ELSE 4
-                    END as match_priority
-                FROM {self.db_manager.config.schema_cdm}.concept c
-                WHERE (
-                    LOWER(c.concept_name) ILIKE LOWER(%(search_term)s)
-                    OR LOWER(c.concept_name) ILIKE LOWER(%(starts_with)s)
-                )
-                  AND c.domain_id = 'Condition'
-                  AND c.standard_concept = 'S'
-                  AND c.invalid_reason IS NULL
-                ORDER BY 
-                    match_priority,
-                    LENGTH(c.concept_name)
-                LIMIT 1
-                """
-                
-                # Create search parameters
-                search_term = f"%{pattern}%"
-                starts_with = f"{pattern}%"
-                contains = f"%{pattern}%"
+                # Search for concepts by name similarity (cached per pattern by the service)
+                match = self.vocabulary.search_concept_by_name(pattern, 'Condition')
                 
-                result = self.db_manager.execute_query(search_query, {
-                    'search_term': search_term,
-                    'exact_term': pattern,
-                    'starts_with': starts_with,
-                    'contains': contains
-                })
-                
-                if not result.empty:
-                    concept_id = int(result.iloc[0]['concept_id'])
-                    concept_name = result.iloc[0]['concept_name']
-                    match_priority = result.iloc[0]['match_priority']
+                if match is not None:
+                    concept_id = int(match['concept_id'])
+                    concept_name = match['concept_name']
+                    match_priority = int(match['match_priority'])
                     match_type = ['exact', 'starts with', 'contains', 'fuzzy'][match_priority - 1]
                     print(f"   ✅ Cause '{cause_value}' → {concept_id} ({concept_name}) [{match_type} match]")
                     return concept_id
@@ -267,8 +229,8 @@ class DeathTransformer:
         if not death_datetime:
             return None
         
-        # Convert patient_id to OMOP person_id
-        person_id = UUIDConverter.person_id(death['patient_id'])
+        # OMOP person_id was hashed in batch by transform()
+        person_id = int(death['_person_id'])
         
         # Get death type concept ID (from death certificate code)
         death_type_concept_id = 0
@@ -295,6 +257,9 @@ class DeathTransformer:
     
     def _filter_existing_patients(self, df: pd.DataFrame) -> pd.DataFrame:
         """Filter to only include patients that exist in person table"""
+        if self.context is not None:
+            return self.context.filter_existing_patients(df, 'patient_id')
+        
         try:
             query = f"SELECT DISTINCT person_source_value FROM {self.db_manager.config.schema_cdm}.person"
             existing_persons = self.db_manager.execute_query(query)
@@ -314,18 +279,7 @@ class DeathTransformer:
     
     def _parse_datetime_patient_format(self, date_str: str) -> Optional[datetime]:
         """Parse death date from patient data (likely DD/MM/YYYY format)"""
-        if pd.isna(date_str):
-            return None
-        
-        try:
-            # Try DD/MM/YYYY format first
-            return pd.to_datetime(date_str, format='%d/%m/%Y').to_pydatetime()
-        except:
-            try:
-                # Fallback to auto-parsing
-                return pd.to_datetime(date_str).to_pydatetime()
-            except:
-                return None
+        return parse_dmy_datetime(date_str)
     
     def _fix_data_types(self, df: pd.DataFrame) -> pd.DataFrame:
         """Fix data types for database compatibility"""
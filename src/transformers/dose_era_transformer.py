@@ -7,9 +7,10 @@ Groups consecutive drug exposures with the same drug and dose into eras.
 """
 
 import pandas as pd
-import hashlib
-from datetime import timedelta
+from sqlalchemy import text
 from src.database.connection import DatabaseManager
+from src.utils.era_engine import collapse_eras, era_sql
+from src.utils.uuid_converter import UUIDConverter, ID_MODULUS
 
 
 class DoseEraTransformer:
@@ -56,6 +57,77 @@ class DoseEraTransformer:
 
         return eras
 
+    def build_in_database(self) -> int:
+        """
+        Build dose eras with INSERT ... SELECT inside PostgreSQL.
+
+        Era IDs match transform(), including the era row index in the key and the
+        sequential fallback when the hashes collide. Requires PostgreSQL 12+, whose
+        float8 text output matches Python's str() of a float.
+
+        Returns:
+            Number of dose eras inserted
+        """
+        print(f"🔄 Building dose eras in the database (gap={self.gap_days} days)...")
+
+        source = f"""
+        SELECT
+            person_id,
+            drug_concept_id,
+            drug_exposure_start_date,
+            drug_exposure_end_date,
+            quantity::float8 AS dose_value,
+            0 AS unit_concept_id
+        FROM {self.schema}.drug_exposure
+        WHERE drug_concept_id != 0
+          AND quantity IS NOT NULL
+          AND quantity > 0
+        """
+        eras = era_sql(source, ['person_id', 'drug_concept_id', 'dose_value', 'unit_concept_id'],
+                       'drug_exposure_start_date', 'drug_exposure_end_date', self.gap_days,
+                       missing_end_days=1)
+        # str() of a float: integral values keep a trailing '.0'
+        dose_text = (
+            "CASE WHEN dose_value = trunc(dose_value) AND abs(dose_value) < 1e16 "
+            "THEN trunc(dose_value)::bigint::text || '.0' ELSE dose_value::text END"
+        )
+        era_key = (
+            "'dose_era_' || person_id::text || '_' || drug_concept_id::text || '_' || "
+            f"{dose_text} || '_' || unit_concept_id::text || '_' || "
+            "to_char(era_start_date, 'YYYY-MM-DD') || '_' || era_index::text"
+        )
+        query = f"""
+        WITH hashed AS (
+            SELECT
+                eras.*,
+                {UUIDConverter.generic_id_sql(era_key, nbytes=8)} AS hashed_id
+            FROM ({eras}) eras
+        ),
+        collisions AS (
+            SELECT EXISTS (
+                SELECT 1 FROM hashed GROUP BY hashed_id HAVING COUNT(*) > 1
+            ) AS any_collision
+        )
+        INSERT INTO {self.schema}.dose_era (
+            dose_era_id, person_id, drug_concept_id, unit_concept_id,
+            dose_value, dose_era_start_date, dose_era_end_date
+        )
+        SELECT
+            CASE WHEN collisions.any_collision THEN era_index + 1 ELSE hashed_id END,
+            person_id,
+            drug_concept_id,
+            unit_concept_id,
+            dose_value,
+            era_start_date,
+            era_end_date
+        FROM hashed CROSS JOIN collisions
+        """
+        with self.db_manager.engine.begin() as conn:
+            inserted = conn.execute(text(query)).rowcount
+
+        print(f"✅ Inserted {inserted} dose eras")
+        return inserted
+
     def _get_drug_exposures_with_dose(self) -> pd.DataFrame:
         """Get drug exposure data with dose information from database."""
         # Get drug exposures that have dose information
@@ -82,85 +154,35 @@ class DoseEraTransformer:
         Build dose eras from drug exposures.
 
         Groups consecutive exposures with the same drug AND dose into eras.
+        Null end dates are replaced by the start date + 1 day.
         """
-        eras = []
-
         # Fill null unit_concept_id with 0
         exposures_df['unit_concept_id'] = exposures_df['unit_concept_id'].fillna(0).astype(int)
 
         # Group by person, drug concept, dose value, and unit
-        grouped = exposures_df.groupby(['person_id', 'drug_concept_id', 'dose_value', 'unit_concept_id'])
-
-        for (person_id, concept_id, dose_value, unit_concept_id), group in grouped:
-            # Sort by start date
-            group = group.sort_values('drug_exposure_start_date').reset_index(drop=True)
-
-            # Handle null end dates - use start date + 1 day as end date
-            group['drug_exposure_end_date'] = group.apply(
-                lambda row: row['drug_exposure_end_date'] if pd.notna(row['drug_exposure_end_date'])
-                else row['drug_exposure_start_date'] + timedelta(days=1),
-                axis=1
-            )
-
-            # Build eras for this person/concept/dose combination
-            era_start = group.iloc[0]['drug_exposure_start_date']
-            era_end = group.iloc[0]['drug_exposure_end_date']
-
-            for i in range(1, len(group)):
-                current_start = group.iloc[i]['drug_exposure_start_date']
-                current_end = group.iloc[i]['drug_exposure_end_date']
-
-                # Calculate gap between previous era end and current start
-                if pd.notna(era_end) and pd.notna(current_start):
-                    gap = (current_start - era_end).days
-                else:
-                    gap = 0
-
-                if gap <= self.gap_days:
-                    # Extend current era
-                    era_end = max(era_end, current_end) if pd.notna(current_end) else era_end
-                else:
-                    # Save current era and start new one
-                    eras.append({
-                        'person_id': person_id,
-                        'drug_concept_id': concept_id,
-                        'unit_concept_id': unit_concept_id,
-                        'dose_value': dose_value,
-                        'dose_era_start_date': era_start,
-                        'dose_era_end_date': era_end
-                    })
-
-                    # Start new era
-                    era_start = current_start
-                    era_end = current_end
-
-            # Don't forget the last era
-            eras.append({
-                'person_id': person_id,
-                'drug_concept_id': concept_id,
-                'unit_concept_id': unit_concept_id,
-                'dose_value': dose_value,
-                'dose_era_start_date': era_start,
-                'dose_era_end_date': era_end
-            })
-
-        # Create DataFrame
-        eras_df = pd.DataFrame(eras)
+        eras_df = collapse_eras(
+            exposures_df, ['person_id', 'drug_concept_id', 'dose_value', 'unit_concept_id'],
+            'drug_exposure_start_date', 'drug_exposure_end_date', self.gap_days,
+            missing_end_days=1
+        ).rename(columns={
+            'era_start_date': 'dose_era_start_date',
+            'era_end_date': 'dose_era_end_date'
+        })
 
         if not eras_df.empty:
             # Generate unique era IDs using row index to guarantee uniqueness
             eras_df = eras_df.reset_index(drop=True)
-            eras_df['dose_era_id'] = eras_df.apply(
-                lambda row: self._generate_era_id(
-                    row['person_id'],
-                    row['drug_concept_id'],
-                    row['dose_value'],
-                    row['dose_era_start_date'],
-                    row['unit_concept_id'],
-                    row.name  # row index for uniqueness
-                ),
-                axis=1
+            keys = (
+                'dose_era_' + eras_df['person_id'].map(str) + '_' +
+                eras_df['drug_concept_id'].map(str) + '_' +
+                eras_df['dose_value'].map(str) + '_' +
+                eras_df['unit_concept_id'].map(str) + '_' +
+                eras_df['dose_era_start_date'].map(str) + '_' +
+                eras_df.index.to_series().map(str)  # row index for uniqueness
             )
+            eras_df['dose_era_id'] = (
+                UUIDConverter.md5_prefixes(keys, 8) % ID_MODULUS + 1
+            ).astype('int64')
 
             # Verify uniqueness
             if eras_df['dose_era_id'].duplicated().any():
@@ -179,10 +201,3 @@ class DoseEraTransformer:
             ]]
 
         return eras_df
-
-    def _generate_era_id(self, person_id: int, concept_id: int, dose_value: float, start_date, unit_concept_id: int, row_idx: int) -> int:
-        """Generate unique era ID from components."""
-        # Include row index to guarantee uniqueness
-        key = f"dose_era_{person_id}_{concept_id}_{dose_value}_{unit_concept_id}_{start_date}_{row_idx}"
-        hash_bytes = hashlib.md5(key.encode()).digest()[:8]
-        return int.from_bytes(hash_bytes, byteorder='big', signed=False) % 2147483647 + 1
@@ -7,25 +7,33 @@ Groups consecutive drug exposures of the same drug (at ingredient level) into er
 """
 
 import pandas as pd
-import hashlib
-from datetime import timedelta
+from sqlalchemy import text
+from typing import Optional
 from src.database.connection import DatabaseManager
+from src.utils.era_engine import collapse_eras, era_sql
+from src.utils.uuid_converter import UUIDConverter
+from src.vocabulary.vocabulary_service import VocabularyService
 
 
 class DrugEraTransformer:
     """Transform drug_exposure data into drug_era records."""
 
-    def __init__(self, db_manager: DatabaseManager, gap_days: int = 30):
+    def __init__(self, db_manager: DatabaseManager, gap_days: int = 30,
+                 vocabulary: Optional[VocabularyService] = None):
         """
         Initialize transformer.
 
         Args:
             db_manager: Database connection manager
             gap_days: Maximum gap between exposures to be considered same era (default 30)
+            vocabulary: Shared vocabulary service used for the ingredient rollup
         """
         self.db_manager = db_manager
         self.gap_days = gap_days
+        self.vocabulary = vocabulary
         self.schema = db_manager.config.schema_cdm
+        # concept and concept_ancestor live here, as for VocabularyService
+        self.vocab_schema = db_manager.config.schema_vocab
 
     def transform(self) -> pd.DataFrame:
         """
@@ -56,8 +64,71 @@ class DrugEraTransformer:
 
         return eras
 
+    def build_in_database(self) -> int:
+        """
+        Build drug eras with INSERT ... SELECT inside PostgreSQL.
+
+        Drugs are rolled up to their ingredients with the concept_ancestor join used
+        by _get_drug_exposures; era IDs match transform().
+
+        Returns:
+            Number of drug eras inserted
+        """
+        print(f"🔄 Building drug eras in the database (gap={self.gap_days} days)...")
+
+        source = f"""
+        SELECT
+            de.person_id,
+            COALESCE(ca.ancestor_concept_id, de.drug_concept_id) AS drug_concept_id,
+            de.drug_exposure_start_date,
+            de.drug_exposure_end_date
+        FROM {self.schema}.drug_exposure de
+        LEFT JOIN {self.vocab_schema}.concept_ancestor ca
+            ON de.drug_concept_id = ca.descendant_concept_id
+            AND ca.ancestor_concept_id IN (
+                SELECT concept_id
+                FROM {self.vocab_schema}.concept
+                WHERE concept_class_id = 'Ingredient'
+                AND standard_concept = 'S'
+            )
+        WHERE de.drug_concept_id != 0
+        """
+        eras = era_sql(source, ['person_id', 'drug_concept_id'],
+                       'drug_exposure_start_date', 'drug_exposure_end_date', self.gap_days,
+                       missing_end_days=1)
+        era_key = (
+            "'drug_era_' || person_id::text || '_' || drug_concept_id::text || '_' || "
+            "to_char(era_start_date, 'YYYY-MM-DD')"
+        )
+        query = f"""
+        INSERT INTO {self.schema}.drug_era (
+            drug_era_id, person_id, drug_concept_id, drug_era_start_date,
+            drug_era_end_date, drug_exposure_count, gap_days
+        )
+        SELECT
+            {UUIDConverter.generic_id_sql(era_key)},
+            person_id,
+            drug_concept_id,
+            era_start_date,
+            era_end_date,
+            record_count,
+            gap_days
+        FROM ({eras}) eras
+        """
+        with self.db_manager.engine.begin() as conn:
+            inserted = conn.execute(text(query)).rowcount
+
+        print(f"✅ Inserted {inserted} drug eras")
+        return inserted
+
     def _get_drug_exposures(self) -> pd.DataFrame:
         """Get drug exposure data from database with ingredient-level concept mapping."""
+        if self.vocabulary is not None:
+            try:
+                return self._get_drug_exposures_with_rollup()
+            except Exception as e:
+                print(f"⚠️ Vocabulary ingredient rollup failed, falling back to SQL join: {e}")
+
         # Get drug exposures and map to ingredient level using concept_ancestor
         # This ensures we group by ingredient, not by specific drug product
         query = f"""
@@ -67,11 +138,11 @@ class DrugEraTransformer:
             de.drug_exposure_start_date,
             de.drug_exposure_end_date
         FROM {self.schema}.drug_exposure de
-        LEFT JOIN {self.schema}.concept_ancestor ca
+        LEFT JOIN {self.vocab_schema}.concept_ancestor ca
             ON de.drug_concept_id = ca.descendant_concept_id
             AND ca.ancestor_concept_id IN (
                 SELECT concept_id
-                FROM {self.schema}.concept
+                FROM {self.vocab_schema}.concept
                 WHERE concept_class_id = 'Ingredient'
                 AND standard_concept = 'S'
             )
@@ -95,6 +166,36 @@ class DrugEraTransformer:
             """
             return self.db_manager.execute_query(fallback_query)
 
+    def _get_drug_exposures_with_rollup(self) -> pd.DataFrame:
+        """Get drug exposures and map them to ingredients with the vocabulary service."""
+        query = f"""
+        SELECT
+            person_id,
+            drug_concept_id,
+            drug_exposure_start_date,
+            drug_exposure_end_date
+        FROM {self.schema}.drug_exposure
+        WHERE drug_concept_id != 0
+        """
+        exposures = self.db_manager.execute_query(query)
+        if exposures.empty:
+            return exposures
+
+        rollup = self.vocabulary.ingredient_rollup(exposures['drug_concept_id'])
+
+        # Left join keeps one row per ingredient, and the drug itself when it has none
+        exposures = exposures.merge(
+            rollup, how='left', left_on='drug_concept_id', right_on='descendant_concept_id'
+        )
+        exposures['drug_concept_id'] = (
+            exposures['ingredient_concept_id'].fillna(exposures['drug_concept_id']).astype('int64')
+        )
+        exposures = exposures.drop(columns=['descendant_concept_id', 'ingredient_concept_id'])
+
+        return exposures.sort_values(
+            ['person_id', 'drug_concept_id', 'drug_exposure_start_date'], kind='mergesort'
+        ).reset_index(drop=True)
+
     def _build_eras(self, exposures_df: pd.DataFrame) -> pd.DataFrame:
         """
         Build drug eras from drug exposures.
@@ -105,84 +206,25 @@ class DrugEraTransformer:
            they belong to the same era
         3. Calculate era start (min start_date), era end (max end_date),
            exposure count, and gap days
-        """
-        eras = []
-
-        # Group by person and drug concept
-        grouped = exposures_df.groupby(['person_id', 'drug_concept_id'])
-
-        for (person_id, concept_id), group in grouped:
-            # Sort by start date
-            group = group.sort_values('drug_exposure_start_date').reset_index(drop=True)
 
-            # Handle null end dates - use start date + 1 day as end date
-            group['drug_exposure_end_date'] = group.apply(
-                lambda row: row['drug_exposure_end_date'] if pd.notna(row['drug_exposure_end_date'])
-                else row['drug_exposure_start_date'] + timedelta(days=1),
-                axis=1
-            )
-
-            # Build eras for this person/concept combination
-            era_start = group.iloc[0]['drug_exposure_start_date']
-            era_end = group.iloc[0]['drug_exposure_end_date']
-            exposure_count = 1
-            total_gap_days = 0
-
-            for i in range(1, len(group)):
-                current_start = group.iloc[i]['drug_exposure_start_date']
-                current_end = group.iloc[i]['drug_exposure_end_date']
-
-                # Calculate gap between previous era end and current start
-                if pd.notna(era_end) and pd.notna(current_start):
-                    gap = (current_start - era_end).days
-                else:
-                    gap = 0
-
-                if gap <= self.gap_days:
-                    # Extend current era
-                    if gap > 0:
-                        total_gap_days += gap
-                    era_end = max(era_end, current_end) if pd.notna(current_end) else era_end
-                    exposure_count += 1
-                else:
-                    # Save current era and start new one
-                    eras.append({
-                        'person_id': person_id,
-                        'drug_concept_id': concept_id,
-                        'drug_era_start_date': era_start,
-                        'drug_era_end_date': era_end,
-                        'drug_exposure_count': exposure_count,
-                        'gap_days': total_gap_days
-                    })
-
-                    # Start new era
-                    era_start = current_start
-                    era_end = current_end
-                    exposure_count = 1
-                    total_gap_days = 0
-
-            # Don't forget the last era
-            eras.append({
-                'person_id': person_id,
-                'drug_concept_id': concept_id,
-                'drug_era_start_date': era_start,
-                'drug_era_end_date': era_end,
-                'drug_exposure_count': exposure_count,
-                'gap_days': total_gap_days
-            })
-
-        # Create DataFrame
-        eras_df = pd.DataFrame(eras)
+        Null end dates are replaced by the start date + 1 day.
+        """
+        eras_df = collapse_eras(
+            exposures_df, ['person_id', 'drug_concept_id'],
+            'drug_exposure_start_date', 'drug_exposure_end_date', self.gap_days,
+            missing_end_days=1
+        ).rename(columns={
+            'era_start_date': 'drug_era_start_date',
+            'era_end_date': 'drug_era_end_date',
+            'record_count': 'drug_exposure_count'
+        })
 
         if not eras_df.empty:
             # Generate unique era IDs
-            eras_df['drug_era_id'] = eras_df.apply(
-                lambda row: self._generate_era_id(
-                    row['person_id'],
-                    row['drug_concept_id'],
-                    row['drug_era_start_date']
-                ),
-                axis=1
+            eras_df['drug_era_id'] = UUIDConverter.generic_ids(
+                'drug_era_' + eras_df['person_id'].map(str) + '_' +
+                eras_df['drug_concept_id'].map(str) + '_' +
+                eras_df['drug_era_start_date'].map(str)
             )
 
             # Reorder columns to match OMOP schema
@@ -197,9 +239,3 @@ class DrugEraTransformer:
             ]]
 
         return eras_df
-
-    def _generate_era_id(self, person_id: int, concept_id: int, start_date) -> int:
-        """Generate unique era ID from components."""
-        key = f"drug_era_{person_id}_{concept_id}_{start_date}"
-        hash_bytes = hashlib.md5(key.encode()).digest()[:4]
-        return int.from_bytes(hash_bytes, byteorder='big', signed=False) % 2147483647 + 1
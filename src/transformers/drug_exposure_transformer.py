@@ -1,24 +1,57 @@
 import pandas as pd
-from datetime import datetime
 from typing import Optional, Dict
-from src.utils.uuid_converter import UUIDConverter
+from src.utils.uuid_converter import UUIDConverter, optional_key_part
+from src.vocabulary.vocabulary_service import VocabularyService
+from src.pipeline.run_context import RunContext
+from src.pipeline.encounter_resolver import EncounterResolver
+from src.utils.date_parser import parse_timestamp_series
+
+DRUG_VOCABULARIES = ['RxNorm', 'CVX', 'NDC', 'ATC']
+
+# RxNorm standard first, then RxNorm, CVX (immunizations), NDC (drug codes), ATC (classification)
+DRUG_VOCABULARY_PRIORITY = [
+    ('RxNorm', True),
+    ('RxNorm', False),
+    ('CVX', False),
+    ('NDC', False),
+    ('ATC', False)
+]
 
 class DrugExposureTransformer:
     """Transform medication and immunization data to OMOP drug_exposure format"""
     
-    def __init__(self, db_manager=None):
+    def __init__(self, db_manager=None, vocabulary: Optional[VocabularyService] = None,
+                 context: Optional[RunContext] = None, debug: bool = False):
         self.db_manager = db_manager
+        self.vocabulary = vocabulary or (VocabularyService(db_manager) if db_manager else None)
+        # Person and visit sets shared across the run (queried here when absent)
+        self.context = context
+        # Encounter -> visit_occurrence_id, one hash join per transform call
+        self.encounters = EncounterResolver(db_manager, context)
+        
+        # Print every matched code while filtering and mapping
+        self.debug = debug
         
         # Drug type concept IDs
         self.medication_drug_type_concept_id = 38000176  # EHR administration
         self.immunization_drug_type_concept_id = 38000176  # EHR administration
         
+        # Rows given a row number by the last transform call (for streamed chunks)
+        self.rows_numbered = 0
+        
         # Cache for concept lookups to avoid repeated queries
         self._concept_cache = {}
         self._source_concept_cache = {}
     
-    def transform_medications(self, medications_df: pd.DataFrame) -> pd.DataFrame:
-        """Transform medication source data to OMOP drug_exposure format"""
+    def transform_medications(self, medications_df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+        """
+        Transform medication source data to OMOP drug_exposure format
+        
+        Args:
+            medications_df: Source rows (a whole table or one streamed chunk)
+            row_offset: Rows numbered by earlier chunks, so IDs continue across chunks
+        """
+        self.rows_numbered = 0
         
         print(f"🔄 Transforming {len(medications_df)} medications to OMOP drug_exposure format...")
         
@@ -34,48 +67,63 @@ class DrugExposureTransformer:
         if self.db_manager:
             medications_df = self._filter_drug_domain(medications_df)
             print(f"✅ Filtered to {len(medications_df)} records in Drug domain")
+            if medications_df.empty:
+                return pd.DataFrame()
         
         # Filter to only include patients that exist in person table
         if self.db_manager:
             medications_df = self._filter_existing_patients(medications_df)
             print(f"✅ Filtered to {len(medications_df)} medications for existing patients")
+            if medications_df.empty:
+                return pd.DataFrame()
         
         # Pre-load concept mappings to avoid individual lookups
         if self.db_manager:
             self._preload_concept_mappings(medications_df, code_column='CODE')
         
-        drug_records = []
-        total_records = len(medications_df)
-        
-        print(f"🔄 Processing {total_records} medication records...")
-        
-        for idx, (row_idx, medication) in enumerate(medications_df.iterrows()):
-            try:
-                # Print progress every 100 records
-                if idx % 100 == 0:
-                    print(f"   Progress: {idx}/{total_records} ({idx/total_records*100:.1f}%)")
-                
-                drug_record = self._transform_medication_record(medication, row_index=idx)
-                if drug_record:
-                    drug_records.append(drug_record)
-            except Exception as e:
-                print(f"⚠️ Error with medication {idx}: {e}")
-                continue
-        
-        if not drug_records:
+        # Hash all IDs in one batch
+        medications_df = self._assign_ids(medications_df, 'START', ['ENCOUNTER', 'DISPENSES'], '_med_row_', row_offset)
+        self.rows_numbered = len(medications_df)
+        
+        print(f"🔄 Processing {len(medications_df)} medication records...")
+        
+        # Dates - ISO format; an empty STOP means the exposure ends when it starts
+        start_datetime = parse_timestamp_series(medications_df['START'])
+        stop = medications_df.get('STOP', pd.Series(None, index=medications_df.index, dtype=object))
+        end_datetime = parse_timestamp_series(stop).where(stop.notna(), start_datetime)
+        
+        # Days supply from start/end dates, when the exposure ends after it starts
+        days_supply = ((end_datetime - start_datetime) // pd.Timedelta(days=1) + 1).where(end_datetime > start_datetime)
+        
+        # Quantity from DISPENSES
+        quantity = pd.to_numeric(
+            medications_df.get('DISPENSES', pd.Series(None, index=medications_df.index, dtype=object)),
+            errors='coerce'
+        )
+        
+        result_df = self._build_drug_exposures(
+            medications_df, start_datetime, end_datetime, quantity, days_supply,
+            self.medication_drug_type_concept_id
+        )
+        if result_df.empty:
             print("❌ No valid drug exposure records created from medications")
             return pd.DataFrame()
         
-        result_df = pd.DataFrame(drug_records)
-        
         # Fix data types to ensure database compatibility
         result_df = self._fix_data_types(result_df)
         
         print(f"✅ Successfully transformed {len(result_df)} medication drug exposures")
         return result_df
     
-    def transform_immunizations(self, immunizations_df: pd.DataFrame) -> pd.DataFrame:
-        """Transform immunization source data to OMOP drug_exposure format"""
+    def transform_immunizations(self, immunizations_df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+        """
+        Transform immunization source data to OMOP drug_exposure format
+        
+        Args:
+            immunizations_df: Source rows (a whole table or one streamed chunk)
+            row_offset: Rows numbered by earlier chunks, so IDs continue across chunks
+        """
+        self.rows_numbered = 0
         
         print(f"🔄 Transforming {len(immunizations_df)} immunizations to OMOP drug_exposure format...")
         
@@ -91,40 +139,39 @@ class DrugExposureTransformer:
         if self.db_manager:
             immunizations_df = self._filter_drug_domain(immunizations_df)
             print(f"✅ Filtered to {len(immunizations_df)} immunization records in Drug domain")
+            if immunizations_df.empty:
+                return pd.DataFrame()
         
         # Filter to only include patients that exist in person table
         if self.db_manager:
             immunizations_df = self._filter_existing_patients(immunizations_df)
             print(f"✅ Filtered to {len(immunizations_df)} immunizations for existing patients")
+            if immunizations_df.empty:
+                return pd.DataFrame()
         
         # Pre-load concept mappings (CVX → RxNorm)
         if self.db_manager:
             self._preload_concept_mappings(immunizations_df, code_column='CODE')
         
-        drug_records = []
-        total_records = len(immunizations_df)
-        
-        print(f"🔄 Processing {total_records} immunization records...")
-        
-        for idx, (row_idx, immunization) in enumerate(immunizations_df.iterrows()):
-            try:
-                # Print progress every 100 records
-                if idx % 100 == 0:
-                    print(f"   Progress: {idx}/{total_records} ({idx/total_records*100:.1f}%)")
-                
-                drug_record = self._transform_immunization_record(immunization, row_index=idx)
-                if drug_record:
-                    drug_records.append(drug_record)
-            except Exception as e:
-                print(f"⚠️ Error with immunization {idx}: {e}")
-                continue
-        
-        if not drug_records:
+        # Hash all IDs in one batch
+        immunizations_df = self._assign_ids(immunizations_df, 'DATE', ['ENCOUNTER'], '_imm_row_', row_offset)
+        self.rows_numbered = len(immunizations_df)
+        
+        print(f"🔄 Processing {len(immunizations_df)} immunization records...")
+        
+        # Date - ISO format, used as both start and end
+        immun_datetime = parse_timestamp_series(immunizations_df['DATE'])
+        
+        # One dose/shot on a single day
+        result_df = self._build_drug_exposures(
+            immunizations_df, immun_datetime, immun_datetime,
+            pd.Series(1.0, index=immunizations_df.index), pd.Series(1, index=immunizations_df.index),
+            self.immunization_drug_type_concept_id
+        )
+        if result_df.empty:
             print("❌ No valid drug exposure records created from immunizations")
             return pd.DataFrame()
         
-        result_df = pd.DataFrame(drug_records)
-        
         # Fix data types to ensure database compatibility
         result_df = self._fix_data_types(result_df)
         
@@ -133,86 +180,29 @@ class DrugExposureTransformer:
     
     def _preload_concept_mappings(self, df: pd.DataFrame, code_column: str = 'CODE') -> None:
         """Pre-load all concept mappings to avoid individual lookups"""
-        if not self.db_manager:
+        if not self.vocabulary:
             return
             
         try:
             print("🔄 Pre-loading drug concept mappings with vocabulary priority...")
             
-            # Get unique codes
-            unique_codes = df[code_column].unique()
-            
-            if len(unique_codes) == 0:
+            if df[code_column].empty:
                 return
             
-            # Build query for all codes at once
-            code_list = "', '".join(str(code) for code in unique_codes)
-            
-            # Query with vocabulary priority for drug concepts
-            query = f"""
-            WITH ranked_concepts AS (
-                SELECT 
-                    c.concept_code,
-                    c.concept_id as source_concept_id,
-                    c.concept_name,
-                    c.vocabulary_id,
-                    c.standard_concept,
-                    COALESCE(cr.concept_id_2, c.concept_id) as standard_concept_id,
-                    -- Priority ranking: prefer RxNorm standard, then others
-                    CASE 
-                        WHEN c.vocabulary_id = 'RxNorm' AND c.standard_concept = 'S' THEN 1
-                        WHEN c.vocabulary_id = 'RxNorm' THEN 2
-                        WHEN c.vocabulary_id = 'CVX' THEN 3  -- Immunization codes
-                        WHEN c.vocabulary_id = 'NDC' THEN 4  -- Drug codes
-                        WHEN c.vocabulary_id = 'ATC' THEN 5  -- Drug classification
-                        ELSE 99
-                    END as vocab_priority,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY c.concept_code 
-                        ORDER BY 
-                            CASE 
-                                WHEN c.vocabulary_id = 'RxNorm' AND c.standard_concept = 'S' THEN 1
-                                WHEN c.vocabulary_id = 'RxNorm' THEN 2
-                                WHEN c.vocabulary_id = 'CVX' THEN 3
-                                WHEN c.vocabulary_id = 'NDC' THEN 4
-                                WHEN c.vocabulary_id = 'ATC' THEN 5
-                                ELSE 99 
-                            END,
-                            c.concept_id
-                    ) as rn
-                FROM {self.db_manager.config.schema_cdm}.concept c
-                LEFT JOIN {self.db_manager.config.schema_cdm}.concept_relationship cr 
-                    ON c.concept_id = cr.concept_id_1 
-                    AND cr.relationship_id = 'Maps to'
-                    AND cr.invalid_reason IS NULL
-                WHERE c.concept_code IN ('{code_list}')
-                  AND c.domain_id = 'Drug'
-                  AND c.vocabulary_id IN ('RxNorm', 'CVX', 'NDC', 'ATC')
-                  AND c.invalid_reason IS NULL
+            # Vocabulary priority for drug concepts: prefer RxNorm standard, then others
+            mapping = self.vocabulary.concept_mapping(
+                df[code_column], domain='Drug', vocabularies=DRUG_VOCABULARIES,
+                priority=DRUG_VOCABULARY_PRIORITY
             )
-            SELECT 
-                concept_code,
-                source_concept_id,
-                concept_name,
-                vocabulary_id,
-                standard_concept_id
-            FROM ranked_concepts 
-            WHERE rn = 1
-            """
             
-            result = self.db_manager.execute_query(query)
+            # Store both standard and source concept IDs
+            self._concept_cache.update(mapping['standard_concept_id'].to_dict())
+            self._source_concept_cache.update(mapping['source_concept_id'].to_dict())
             
-            # Build caches
-            for _, row in result.iterrows():
-                code = str(row['concept_code'])
-                # Store both standard and source concept IDs
-                self._concept_cache[code] = int(row['standard_concept_id'])
-                self._source_concept_cache[code] = int(row['source_concept_id'])
-                
-                # Log vocabulary used for debugging
-                vocab = row['vocabulary_id']
-                name = row['concept_name']
-                print(f"   Code {code}: {name} (from {vocab})")
+            # Log vocabulary used for debugging
+            if self.debug:
+                for code, concept_name, vocabulary_id in zip(mapping.index, mapping['concept_name'], mapping['vocabulary_id']):
+                    print(f"   Code {code}: {concept_name} (from {vocabulary_id})")
             
             print(f"✅ Pre-loaded {len(self._concept_cache)} concept mappings")
             
@@ -224,43 +214,14 @@ class DrugExposureTransformer:
         """Filter to only include codes that belong to the Drug domain"""
         try:
             print("🔍 Validating codes against OMOP vocabulary for Drug domain...")
+            print(f"📊 Checking {df['CODE'].nunique()} unique codes...")
             
-            # Get unique codes from the data
-            unique_codes = df['CODE'].unique()
-            print(f"📊 Checking {len(unique_codes)} unique codes...")
-            
-            # Process codes in smaller batches to avoid memory issues
-            batch_size = 100
-            valid_codes_set = set()
-            
-            for i in range(0, len(unique_codes), batch_size):
-                batch_codes = unique_codes[i:i+batch_size]
-                code_list = "', '".join(batch_codes.astype(str))
-                
-                domain_query = f"""
-                SELECT DISTINCT 
-                    c.concept_code,
-                    c.concept_id,
-                    c.concept_name,
-                    c.domain_id,
-                    c.vocabulary_id,
-                    c.standard_concept
-                FROM {self.db_manager.config.schema_cdm}.concept c
-                WHERE c.concept_code IN ('{code_list}')
-                  AND c.domain_id = 'Drug'
-                  AND c.vocabulary_id IN ('RxNorm', 'CVX', 'NDC', 'ATC')
-                  AND c.invalid_reason IS NULL
-                """
-                
-                batch_valid_codes = self.db_manager.execute_query(domain_query)
-                if not batch_valid_codes.empty:
-                    valid_codes_set.update(batch_valid_codes['concept_code'].astype(str))
-                    # Log found codes
-                    for _, row in batch_valid_codes.iterrows():
-                        print(f"   ✅ Found: {row['concept_code']} -> {row['concept_name']} ({row['vocabulary_id']})")
-                
-                print(f"   Processed batch {i//batch_size + 1}/{(len(unique_codes)-1)//batch_size + 1}")
+            valid_codes = self.vocabulary.valid_codes(df['CODE'], domain='Drug', vocabularies=DRUG_VOCABULARIES)
+            if self.debug:
+                for code, concept_name, vocabulary_id in zip(valid_codes['concept_code'], valid_codes['concept_name'], valid_codes['vocabulary_id']):
+                    print(f"   ✅ Found: {code} -> {concept_name} ({vocabulary_id})")
             
+            valid_codes_set = set(valid_codes['concept_code'])
             if not valid_codes_set:
                 print("⚠️ No valid drug codes found in OMOP vocabulary")
                 return pd.DataFrame()
@@ -281,147 +242,78 @@ class DrugExposureTransformer:
             print("⚠️ Proceeding without domain validation")
             return df
     
-    def _transform_medication_record(self, medication: pd.Series, row_index: int = 0) -> Optional[dict]:
-        """Transform single medication record to OMOP drug_exposure format"""
-        
-        # Parse dates - ISO format for medications
-        start_datetime = self._parse_datetime_iso_format(medication['START'])
-        end_datetime = self._parse_datetime_iso_format(medication.get('STOP')) if pd.notna(medication.get('STOP')) else start_datetime
-        
-        if not start_datetime:
-            return None
-        
-        # Generate unique drug_exposure_id
-        unique_string = f"{medication['PATIENT']}_{medication['START']}_{medication['CODE']}"
-        
-        # Add encounter if available for additional uniqueness
-        if pd.notna(medication.get('ENCOUNTER')):
-            unique_string += f"_{medication['ENCOUNTER']}"
-        
-        # Add dispenses for uniqueness (in case same drug prescribed multiple times)
-        if pd.notna(medication.get('DISPENSES')):
-            unique_string += f"_{medication['DISPENSES']}"
-        
-        # Add row index as final guarantee of uniqueness
-        unique_string += f"_med_row_{row_index}"
-        
-        drug_exposure_id = UUIDConverter.generic_id(unique_string)
-        person_id = UUIDConverter.person_id(medication['PATIENT'])
-        
-        # Look up visit_occurrence_id if encounter is provided
-        visit_occurrence_id = None
-        if pd.notna(medication.get('ENCOUNTER')) and self.db_manager:
-            visit_occurrence_id = UUIDConverter.visit_occurrence_id(medication['ENCOUNTER'])
-        
-        # Map drug concept using cache
-        drug_concept_id = self._get_cached_concept_id(medication['CODE'])
-        drug_source_concept_id = self._get_cached_source_concept_id(medication['CODE'])
-        
-        # Calculate days supply from start/end dates
-        days_supply = None
-        if start_datetime and end_datetime and end_datetime > start_datetime:
-            days_supply = (end_datetime - start_datetime).days + 1
-        
-        # Get quantity from DISPENSES
-        quantity = None
-        if pd.notna(medication.get('DISPENSES')):
-            try:
-                quantity = float(medication['DISPENSES'])
-            except:
-                quantity = None
-        
-        return {
-            'drug_exposure_id': drug_exposure_id,
-            'person_id': person_id,
-            'drug_concept_id': drug_concept_id,
-            'drug_exposure_start_date': start_datetime.date(),
+    def _assign_ids(self, df: pd.DataFrame, date_column: str, optional_columns: list, row_tag: str,
+                    row_offset: int = 0) -> pd.DataFrame:
+        """
+        Batch-generate drug_exposure_id, person_id and visit_occurrence_id.
+        
+        The key is patient_date_code, then each optional column when present, then
+        row_tag plus the row position (continuing from row_offset) as final
+        guarantee of uniqueness.
+        """
+        df = df.copy()
+        
+        unique_strings = (
+            df['PATIENT'].astype(str) + '_' +
+            df[date_column].astype(str) + '_' +
+            df['CODE'].astype(str)
+        )
+        for column in optional_columns:
+            unique_strings = unique_strings + optional_key_part(df, column)
+        unique_strings = unique_strings + row_tag + pd.Series(range(row_offset, row_offset + len(df)), index=df.index).astype(str)
+        
+        df['_drug_exposure_id'] = UUIDConverter.generic_ids(unique_strings)
+        df['_person_id'] = UUIDConverter.person_ids(df['PATIENT'])
+        df['_visit_occurrence_id'] = self.encounters.visit_occurrence_ids(df)
+        return df
+    
+    def _build_drug_exposures(self, df: pd.DataFrame, start_datetime: pd.Series, end_datetime: pd.Series,
+                              quantity: pd.Series, days_supply: pd.Series, drug_type_concept_id: int) -> pd.DataFrame:
+        """
+        Assemble drug_exposure rows from whole columns.
+        
+        Rows whose start date could not be parsed are dropped. IDs come from
+        _assign_ids and concepts from the preloaded caches (0 when unmapped).
+        """
+        valid = start_datetime.notna()
+        df = df[valid]
+        start_datetime = start_datetime[valid]
+        end_datetime = end_datetime[valid]
+        
+        codes = df['CODE'].astype(str)
+        end_date = end_datetime.dt.date
+        
+        return pd.DataFrame({
+            'drug_exposure_id': df['_drug_exposure_id'],
+            'person_id': df['_person_id'],
+            'drug_concept_id': codes.map(self._concept_cache).fillna(0).astype('int64'),
+            'drug_exposure_start_date': start_datetime.dt.date,
             'drug_exposure_start_datetime': start_datetime,
-            'drug_exposure_end_date': end_datetime.date() if end_datetime else None,
+            'drug_exposure_end_date': end_date,
             'drug_exposure_end_datetime': end_datetime,
-            'verbatim_end_date': end_datetime.date() if end_datetime else None,
-            'drug_type_concept_id': self.medication_drug_type_concept_id,
+            'verbatim_end_date': end_date,
+            'drug_type_concept_id': drug_type_concept_id,
             'stop_reason': None,  # Not available in source data
             'refills': None,  # Not available in source data
-            'quantity': quantity,
-            'days_supply': days_supply,
+            'quantity': quantity[valid].astype('float64'),
+            'days_supply': days_supply[valid],
             'sig': None,  # Not available in source data
             'route_concept_id': None,  # Could be derived from description if needed
             'lot_number': None,  # Not available in source data
             'provider_id': None,  # Could be derived from visit if needed
-            'visit_occurrence_id': visit_occurrence_id,
+            'visit_occurrence_id': df['_visit_occurrence_id'],
             'visit_detail_id': None,  # Not implemented yet
-            'drug_source_value': str(medication['DESCRIPTION'])[:50],
-            'drug_source_concept_id': drug_source_concept_id,
+            'drug_source_value': df['DESCRIPTION'].astype(str).str[:50],
+            'drug_source_concept_id': codes.map(self._source_concept_cache).fillna(0).astype('int64'),
             'route_source_value': None,  # Not available in source data
             'dose_unit_source_value': None  # Could be extracted from description if needed
-        }
-    
-    def _transform_immunization_record(self, immunization: pd.Series, row_index: int = 0) -> Optional[dict]:
-        """Transform single immunization record to OMOP drug_exposure format"""
-        
-        # Parse date - ISO format, use as both start and end
-        immun_datetime = self._parse_datetime_iso_format(immunization['DATE'])
-        if not immun_datetime:
-            return None
-        
-        # Generate unique drug_exposure_id
-        unique_string = f"{immunization['PATIENT']}_{immunization['DATE']}_{immunization['CODE']}"
-        
-        # Add encounter if available for additional uniqueness
-        if pd.notna(immunization.get('ENCOUNTER')):
-            unique_string += f"_{immunization['ENCOUNTER']}"
-        
-        # Add row index as final guarantee of uniqueness
-        unique_string += f"_imm_row_{row_index}"
-        
-        drug_exposure_id = UUIDConverter.generic_id(unique_string)
-        person_id = UUIDConverter.person_id(immunization['PATIENT'])
-        
-        # Look up visit_occurrence_id if encounter is provided
-        visit_occurrence_id = None
-        if pd.notna(immunization.get('ENCOUNTER')) and self.db_manager:
-            visit_occurrence_id = UUIDConverter.visit_occurrence_id(immunization['ENCOUNTER'])
-        
-        # Map drug concept using cache (CVX → RxNorm)
-        drug_concept_id = self._get_cached_concept_id(immunization['CODE'])
-        drug_source_concept_id = self._get_cached_source_concept_id(immunization['CODE'])
-        
-        return {
-            'drug_exposure_id': drug_exposure_id,
-            'person_id': person_id,
-            'drug_concept_id': drug_concept_id,
-            'drug_exposure_start_date': immun_datetime.date(),
-            'drug_exposure_start_datetime': immun_datetime,
-            'drug_exposure_end_date': immun_datetime.date(),  # Same as start for immunizations
-            'drug_exposure_end_datetime': immun_datetime,     # Same as start for immunizations
-            'verbatim_end_date': immun_datetime.date(),       # Same as start for immunizations
-            'drug_type_concept_id': self.immunization_drug_type_concept_id,
-            'stop_reason': None,
-            'refills': None,
-            'quantity': 1.0,  # Default to 1 dose/shot for immunizations
-            'days_supply': 1,  # Single day for immunizations
-            'sig': None,
-            'route_concept_id': None,  # Could be "injection" if we wanted to map it
-            'lot_number': None,
-            'provider_id': None,
-            'visit_occurrence_id': visit_occurrence_id,
-            'visit_detail_id': None,
-            'drug_source_value': str(immunization['DESCRIPTION'])[:50],
-            'drug_source_concept_id': drug_source_concept_id,
-            'route_source_value': None,
-            'dose_unit_source_value': None
-        }
-    
-    def _get_cached_concept_id(self, code: str) -> int:
-        """Get standard concept ID from cache or return 0"""
-        return self._concept_cache.get(str(code), 0)
-    
-    def _get_cached_source_concept_id(self, code: str) -> int:
-        """Get source concept ID from cache or return 0"""
-        return self._source_concept_cache.get(str(code), 0)
+        }).reset_index(drop=True)
     
     def _filter_existing_patients(self, df: pd.DataFrame) -> pd.DataFrame:
         """Filter to only include patients that exist in person table"""
+        if self.context is not None:
+            return self.context.filter_existing_patients(df, 'PATIENT')
+        
         try:
             query = f"SELECT DISTINCT person_source_value FROM {self.db_manager.config.schema_cdm}.person"
             existing_persons = self.db_manager.execute_query(query)
@@ -439,17 +331,6 @@ class DrugExposureTransformer:
             print(f"⚠️ Error filtering patients: {e}")
             return df
     
-    def _parse_datetime_iso_format(self, datetime_str: str) -> Optional[datetime]:
-        """Parse ISO datetime format"""
-        if pd.isna(datetime_str):
-            return None
-        
-        try:
-            # Handle ISO format: 2015-10-21T14:00:04Z
-            return pd.to_datetime(datetime_str).to_pydatetime()
-        except:
-            return None
-    
     def _fix_data_types(self, df: pd.DataFrame) -> pd.DataFrame:
         """Fix data types for database compatibility"""
         
@@ -1,25 +1,74 @@
+import numpy as np
 import pandas as pd
-from datetime import datetime
 from typing import Optional, Dict
 from src.utils.uuid_converter import UUIDConverter
+from src.vocabulary.vocabulary_service import VocabularyService
+from src.pipeline.run_context import RunContext
+from src.pipeline.encounter_resolver import EncounterResolver
+from src.utils.date_parser import parse_timestamp_series
+
+MEASUREMENT_VOCABULARIES = ['LOINC', 'SNOMED', 'UCUM']
+
+# Standard LOINC / SNOMED / UCUM first, then the same vocabularies' non-standard codes
+MEASUREMENT_VOCABULARY_PRIORITY = [
+    ('LOINC', True),
+    ('SNOMED', True),
+    ('UCUM', True),
+    ('LOINC', False),
+    ('SNOMED', False),
+    ('UCUM', False)
+]
+
+# Leading comparison operators of a value and their operator_concept_id (longest first)
+VALUE_OPERATORS = {
+    '>=': 4171754,
+    '<=': 4171756,
+    '>': 4172703,
+    '<': 4171755
+}
+
+# Block length of the row numbers in measurement ID keys
+MEASUREMENT_ID_BLOCK_ROWS = 10000
 
 class MeasurementTransformer:
     """Transform observation data to OMOP measurement format for lab tests and clinical measurements"""
     
-    def __init__(self, db_manager=None):
+    def __init__(self, db_manager=None, vocabulary: Optional[VocabularyService] = None,
+                 context: Optional[RunContext] = None, debug: bool = False):
         self.db_manager = db_manager
+        self.vocabulary = vocabulary or (VocabularyService(db_manager) if db_manager else None)
+        # Person and visit sets shared across the run (queried here when absent)
+        self.context = context
+        # Encounter -> visit_occurrence_id, one hash join per chunk
+        self.encounters = EncounterResolver(db_manager, context)
+        
+        # Print every matched code while filtering and mapping
+        self.debug = debug
         
         # Standard measurement_type_concept_id for EHR data
         self.measurement_type_concept_id = 32817  # EHR
         
+        # Rows given a row number by the last transform() call (for streamed chunks)
+        self.rows_numbered = 0
+        # Valid rows the last call left in its open ID block, and the row_offset that continues it
+        self._block_valid = 0
+        self._next_row_offset = 0
+        
         # Cache for concept lookups
         self._concept_cache = {}
         self._source_concept_cache = {}
         self._unit_cache = {}
         self._value_concept_cache = {}
     
-    def transform(self, observations_df: pd.DataFrame) -> pd.DataFrame:
-        """Transform observation source data to OMOP measurement format"""
+    def transform(self, observations_df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+        """
+        Transform observation source data to OMOP measurement format
+        
+        Args:
+            observations_df: Observation rows (a whole table or one streamed chunk)
+            row_offset: Rows numbered by earlier chunks, so IDs continue across chunks
+        """
+        self.rows_numbered = 0
         
         print(f"🔄 Transforming {len(observations_df)} observations to OMOP measurement format...")
         
@@ -35,275 +84,205 @@ class MeasurementTransformer:
         if self.db_manager:
             observations_df = self._filter_measurement_domain(observations_df)
             print(f"✅ Filtered to {len(observations_df)} records in Measurement domain")
+            if observations_df.empty:
+                return pd.DataFrame()
         
         # Filter to only include patients that exist in person table
         if self.db_manager:
             observations_df = self._filter_existing_patients(observations_df)
             print(f"✅ Filtered to {len(observations_df)} measurements for existing patients")
+            if observations_df.empty:
+                return pd.DataFrame()
         
         # Pre-load concept mappings to avoid individual lookups
         if self.db_manager:
             self._preload_concept_mappings(observations_df)
         
-        # Process records
-        measurement_records = []
-        total_records = len(observations_df)
+        self.rows_numbered = len(observations_df)
         
-        print(f"🔄 Processing {total_records} measurement records using vectorized operations...")
-        
-        # Process in chunks to avoid memory issues
-        chunk_size = 10000
-        for chunk_start in range(0, total_records, chunk_size):
-            chunk_end = min(chunk_start + chunk_size, total_records)
-            chunk_df = observations_df.iloc[chunk_start:chunk_end].copy()
-            
-            print(f"   Processing chunk {chunk_start//chunk_size + 1}/{(total_records-1)//chunk_size + 1} ({len(chunk_df)} records)")
-            
-            # Vectorized operations
-            chunk_records = self._transform_chunk_vectorized(chunk_df, chunk_start)
-            measurement_records.extend(chunk_records)
+        print(f"🔄 Processing {len(observations_df)} measurement records using vectorized operations...")
         
-        if not measurement_records:
+        result_df = self._build_measurements(observations_df, row_offset)
+        if result_df.empty:
             print("❌ No valid measurement records created")
             return pd.DataFrame()
         
-        result_df = pd.DataFrame(measurement_records)
-        
         # Fix data types to ensure database compatibility
         result_df = self._fix_data_types(result_df)
         
         print(f"✅ Successfully transformed {len(result_df)} measurements")
         return result_df
     
-    def _transform_chunk_vectorized(self, chunk_df: pd.DataFrame, chunk_offset: int) -> list:
-        """Vectorized transformation of a chunk of measurement records"""
-        records = []
-        
-        # Vectorized datetime parsing
-        try:
-            chunk_df['parsed_datetime'] = pd.to_datetime(chunk_df['DATE'])
-        except Exception as e:
-            print(f"⚠️ Error parsing datetime: {e}")
-            # Try alternative parsing methods
-            chunk_df['parsed_datetime'] = pd.to_datetime(chunk_df['DATE'], errors='coerce')
-        
-        # Remove rows where datetime parsing failed
-        chunk_df = chunk_df.dropna(subset=['parsed_datetime'])
-        
-        if chunk_df.empty:
+    def _build_measurements(self, df: pd.DataFrame, row_offset: int) -> pd.DataFrame:
+        """Build the measurement frame from whole columns, dropping rows whose DATE does not parse"""
+        no_values = pd.Series(None, index=df.index, dtype=object)
+        
+        # Vectorized datetime parsing (each distinct timestamp once)
+        parsed_datetime = parse_timestamp_series(df['DATE'])
+        valid = parsed_datetime.notna().to_numpy()
+        
+        # Row numbers for the IDs count valid rows from the start of each block of
+        # MEASUREMENT_ID_BLOCK_ROWS rows, the numbering measurement IDs were built with.
+        # Blocks run over the whole table: a chunk continuing the previous one starts
+        # with the valid rows that chunk left in the block they share
+        carried = self._block_valid if row_offset == self._next_row_offset else 0
+        position = row_offset + np.arange(len(df) + 1)
+        block_start = position - position % MEASUREMENT_ID_BLOCK_ROWS
+        valid_before = carried + np.concatenate(([0], np.cumsum(valid)))
+        in_chunk = block_start >= row_offset
+        block_valid_before = np.where(in_chunk, valid_before[np.where(in_chunk, block_start - row_offset, 0)], 0)
+        row_index = (block_start + valid_before - block_valid_before)[:-1]
+        self._block_valid = int(valid_before[-1] - block_valid_before[-1])
+        self._next_row_offset = row_offset + len(df)
+        
+        df = df[valid]
+        parsed_datetime = parsed_datetime[valid]
+        row_index = row_index[valid]
+        no_values = no_values[valid]
+        if df.empty:
             print("⚠️ No valid datetimes in chunk")
-            return records
-        
-        # Vectorized UUID generation
-        chunk_df['row_index'] = range(chunk_offset, chunk_offset + len(chunk_df))
-        chunk_df['unique_string'] = (
-            chunk_df['PATIENT'].astype(str) + '_' +
-            chunk_df['DATE'].astype(str) + '_' +
-            chunk_df['CODE'].astype(str) + '_' +
-            chunk_df.get('VALUE', '').fillna('').astype(str) + '_' +
-            chunk_df.get('ENCOUNTER', '').fillna('').astype(str) + '_meas_row_' +
-            chunk_df['row_index'].astype(str)
-        )
+            return pd.DataFrame()
         
-        # Vectorized concept and person ID generation
-        chunk_df['measurement_id'] = chunk_df['unique_string'].apply(UUIDConverter.generic_id)
-        chunk_df['person_id'] = chunk_df['PATIENT'].apply(UUIDConverter.person_id)
-        chunk_df['visit_occurrence_id'] = chunk_df['ENCOUNTER'].apply(
-            lambda x: UUIDConverter.visit_occurrence_id(x) if pd.notna(x) else None
+        values = df.get('VALUE', no_values)
+        units = df.get('UNITS', no_values)
+        encounters = df.get('ENCOUNTER', no_values)
+        
+        # Vectorized ID generation
+        unique_strings = (
+            df['PATIENT'].astype(str) + '_' +
+            df['DATE'].astype(str) + '_' +
+            df['CODE'].astype(str) + '_' +
+            values.fillna('').astype(str) + '_' +
+            encounters.fillna('').astype(str) + '_meas_row_' +
+            pd.Series(row_index, index=df.index).astype(str)
         )
         
-        # Vectorized concept mapping using cached values
-        chunk_df['measurement_concept_id'] = chunk_df['CODE'].apply(lambda x: self._concept_cache.get(str(x), 0))
-        chunk_df['measurement_source_concept_id'] = chunk_df['CODE'].apply(lambda x: self._source_concept_cache.get(str(x), 0))
-        
-        # Vectorized unit mapping
-        chunk_df['unit_concept_id'] = chunk_df.get('UNITS', pd.Series(dtype='object')).apply(
-            lambda x: self._unit_cache.get(str(x)) if pd.notna(x) else None
-        )
+        # Only visits that were loaded; without a database the hashed ID is kept
+        if self.db_manager:
+            visit_occurrence_ids = self.encounters.visit_occurrence_ids(df)
+        else:
+            visit_occurrence_ids = UUIDConverter.optional_ids(encounters, UUIDConverter.visit_occurrence_ids)
         
-        # Process values in batch
-        value_results = chunk_df.get('VALUE', pd.Series(dtype='object')).apply(self._process_measurement_value_fast)
-        chunk_df['value_as_number'] = value_results.apply(lambda x: x[0])
-        chunk_df['value_as_concept_id'] = value_results.apply(lambda x: x[1])
-        chunk_df['operator_concept_id'] = value_results.apply(lambda x: x[2])
-        
-        # Convert to records
-        for _, row in chunk_df.iterrows():
-            record = {
-                'measurement_id': row['measurement_id'],
-                'person_id': row['person_id'],
-                'measurement_concept_id': row['measurement_concept_id'],
-                'measurement_date': row['parsed_datetime'].date(),
-                'measurement_datetime': row['parsed_datetime'],
-                'measurement_time': row['parsed_datetime'].strftime('%H:%M:%S'),
-                'measurement_type_concept_id': self.measurement_type_concept_id,
-                'operator_concept_id': row['operator_concept_id'],
-                'value_as_number': row['value_as_number'],
-                'value_as_concept_id': row['value_as_concept_id'],
-                'unit_concept_id': row['unit_concept_id'],
-                'range_low': None,
-                'range_high': None,
-                'provider_id': None,
-                'visit_occurrence_id': row['visit_occurrence_id'],
-                'visit_detail_id': None,
-                'measurement_source_value': str(row['DESCRIPTION'])[:50],
-                'measurement_source_concept_id': row['measurement_source_concept_id'],
-                'unit_source_value': str(row.get('UNITS', ''))[:50] if pd.notna(row.get('UNITS')) else None,
-                'unit_source_concept_id': None,
-                'value_source_value': str(row.get('VALUE', ''))[:50] if pd.notna(row.get('VALUE')) else None,
-                'measurement_event_id': None,
-                'meas_event_field_concept_id': None
-            }
-            records.append(record)
-        
-        return records
+        # Vectorized concept mapping using cached values
+        codes = df['CODE'].astype(str)
+        value_columns = self._classify_values(values)
+        
+        return pd.DataFrame({
+            'measurement_id': UUIDConverter.generic_ids(unique_strings),
+            'person_id': UUIDConverter.person_ids(df['PATIENT']),
+            'measurement_concept_id': codes.map(self._concept_cache).fillna(0).astype('int64'),
+            'measurement_date': parsed_datetime.dt.date,
+            'measurement_datetime': parsed_datetime,
+            'measurement_time': parsed_datetime.dt.strftime('%H:%M:%S'),
+            'measurement_type_concept_id': self.measurement_type_concept_id,
+            'operator_concept_id': value_columns['operator_concept_id'],
+            'value_as_number': value_columns['value_as_number'],
+            'value_as_concept_id': value_columns['value_as_concept_id'],
+            'unit_concept_id': units.astype(str).map(self._unit_cache).where(units.notna()),
+            'range_low': None,
+            'range_high': None,
+            'provider_id': None,
+            'visit_occurrence_id': visit_occurrence_ids,
+            'visit_detail_id': None,
+            'measurement_source_value': df['DESCRIPTION'].astype(str).str[:50],
+            'measurement_source_concept_id': codes.map(self._source_concept_cache).fillna(0).astype('int64'),
+            'unit_source_value': units.astype(str).str[:50].where(units.notna()),
+            'unit_source_concept_id': None,
+            'value_source_value': values.astype(str).str[:50].where(values.notna()),
+            'measurement_event_id': None,
+            'meas_event_field_concept_id': None
+        }, index=df.index).reset_index(drop=True)
     
-    def _process_measurement_value_fast(self, value) -> tuple[Optional[float], Optional[int], Optional[int]]:
-        """Faster version of value processing for vectorized operations"""
-        if pd.isna(value) or value == '':
-            return None, None, None
-        
-        value_str = str(value).strip()
-        
-        # Quick operator check without complex parsing
-        operator_concept_id = None
-        clean_value = value_str
-        
-        if value_str.startswith('>='):
-            operator_concept_id = 4171754
-            clean_value = value_str[2:].strip()
-        elif value_str.startswith('<='):
-            operator_concept_id = 4171756
-            clean_value = value_str[2:].strip()
-        elif value_str.startswith('>'):
-            operator_concept_id = 4172703
-            clean_value = value_str[1:].strip()
-        elif value_str.startswith('<'):
-            operator_concept_id = 4171755
-            clean_value = value_str[1:].strip()
-        
-        # Quick numeric check
-        try:
-            numeric_value = float(clean_value)
-            return numeric_value, None, operator_concept_id
-        except (ValueError, TypeError):
-            # Non-numeric - check value concept cache
-            value_concept_id = self._value_concept_cache.get(value_str, 0)
-            return None, value_concept_id if value_concept_id > 0 else None, operator_concept_id
+    def _classify_values(self, values: pd.Series) -> pd.DataFrame:
+        """
+        value_as_number, value_as_concept_id and operator_concept_id for raw values.
+        
+        A leading >=, <=, > or < becomes the operator; the rest is numeric when it
+        parses as a number, otherwise the whole value is looked up in the value
+        concept cache. Each distinct value is classified once.
+        """
+        codes, uniques = pd.factorize(values)
+        raw = pd.Series([str(value) for value in uniques], dtype=object)
+        text = raw.str.strip()
+        
+        # Operator prefix via vectorized string ops (two-character operators first)
+        has_operator = [text.str.startswith(prefix).to_numpy(dtype=bool) for prefix in VALUE_OPERATORS]
+        operators = np.select(has_operator, list(VALUE_OPERATORS.values()), default=0)
+        prefix_length = np.select(has_operator, [len(prefix) for prefix in VALUE_OPERATORS], default=0)
+        clean = pd.Series([value[length:].strip() for value, length in zip(text, prefix_length)], dtype=object)
+        
+        number = pd.to_numeric(clean, errors='coerce')
+        parsed = number.notna()
+        # float() reads a few spellings to_numeric does not (' nan', '1_000'), keep them numeric
+        for i in np.flatnonzero(~parsed.to_numpy()):
+            try:
+                number.iloc[i] = float(clean.iloc[i])
+                parsed.iloc[i] = True
+            except (ValueError, TypeError):
+                pass
+        
+        value_concepts = text.map(self._value_concept_cache).fillna(0)
+        present = raw != ''
+        
+        classified = pd.DataFrame({
+            'value_as_number': number.where(present & parsed).astype('float64'),
+            'value_as_concept_id': pd.array(value_concepts.where(present & ~parsed & (value_concepts > 0)), dtype='Int64'),
+            'operator_concept_id': pd.array(pd.Series(operators).where(present & (operators > 0)), dtype='Int64')
+        })
+        # Trailing all-null row picked by the -1 code of missing values
+        classified.loc[len(classified)] = [np.nan, pd.NA, pd.NA]
+        classified = classified.iloc[codes]
+        classified.index = values.index
+        return classified
     
     def _preload_concept_mappings(self, df: pd.DataFrame) -> None:
         """Pre-load all concept mappings to avoid individual lookups"""
-        if not self.db_manager:
+        if not self.vocabulary:
             return
             
         try:
             print("🔄 Pre-loading concept mappings with vocabulary priority...")
             
-            # Get unique codes
-            unique_codes = df['CODE'].unique()
-            
-            if len(unique_codes) == 0:
+            if df['CODE'].empty:
                 return
             
-            # Build query for all codes at once
-            code_list = "', '".join(str(code) for code in unique_codes)
-            
-            # Query with vocabulary priority for measurements
-            query = f"""
-            WITH ranked_concepts AS (
-                SELECT 
-                    c.concept_code,
-                    c.concept_id as source_concept_id,
-                    c.concept_name,
-                    c.vocabulary_id,
-                    c.standard_concept,
-                    COALESCE(cr.concept_id_2, c.concept_id) as standard_concept_id,
-                    -- Priority ranking: prefer LOINC for measurements, then others
-                    CASE 
-                        WHEN c.vocabulary_id = 'LOINC' AND c.standard_concept = 'S' THEN 1
-                        WHEN c.vocabulary_id = 'SNOMED' AND c.standard_concept = 'S' THEN 2
-                        WHEN c.vocabulary_id = 'UCUM' AND c.standard_concept = 'S' THEN 3
-                        WHEN c.vocabulary_id = 'LOINC' THEN 4
-                        WHEN c.vocabulary_id = 'SNOMED' THEN 5
-                        WHEN c.vocabulary_id = 'UCUM' THEN 6
-                        ELSE 99
-                    END as vocab_priority,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY c.concept_code 
-                        ORDER BY 
-                            CASE 
-                                WHEN c.vocabulary_id = 'LOINC' AND c.standard_concept = 'S' THEN 1
-                                WHEN c.vocabulary_id = 'SNOMED' AND c.standard_concept = 'S' THEN 2
-                                WHEN c.vocabulary_id = 'UCUM' AND c.standard_concept = 'S' THEN 3
-                                WHEN c.vocabulary_id = 'LOINC' THEN 4
-                                WHEN c.vocabulary_id = 'SNOMED' THEN 5
-                                WHEN c.vocabulary_id = 'UCUM' THEN 6
-                                ELSE 99 
-                            END,
-                            c.concept_id
-                    ) as rn
-                FROM {self.db_manager.config.schema_cdm}.concept c
-                LEFT JOIN {self.db_manager.config.schema_cdm}.concept_relationship cr 
-                    ON c.concept_id = cr.concept_id_1 
-                    AND cr.relationship_id = 'Maps to'
-                    AND cr.invalid_reason IS NULL
-                WHERE c.concept_code IN ('{code_list}')
-                  AND c.domain_id = 'Measurement'
-                  AND c.vocabulary_id IN ('LOINC', 'SNOMED', 'UCUM')
-                  AND c.invalid_reason IS NULL
+            # Vocabulary priority for measurements: prefer LOINC, then others
+            mapping = self.vocabulary.concept_mapping(
+                df['CODE'], domain='Measurement', vocabularies=MEASUREMENT_VOCABULARIES,
+                priority=MEASUREMENT_VOCABULARY_PRIORITY
             )
-            SELECT 
-                concept_code,
-                source_concept_id,
-                concept_name,
-                vocabulary_id,
-                standard_concept_id
-            FROM ranked_concepts 
-            WHERE rn = 1
-            """
-            
-            result = self.db_manager.execute_query(query)
             
             # Build measurement concept caches
-            for _, row in result.iterrows():
-                code = str(row['concept_code'])
-                self._concept_cache[code] = int(row['standard_concept_id'])
-                self._source_concept_cache[code] = int(row['source_concept_id'])
-                
-                vocab = row['vocabulary_id']
-                name = row['concept_name']
-                print(f"   Code {code}: {name} (from {vocab})")
+            self._concept_cache.update(mapping['standard_concept_id'].to_dict())
+            self._source_concept_cache.update(mapping['source_concept_id'].to_dict())
+            
+            if self.debug:
+                for code, concept_name, vocabulary_id in zip(mapping.index, mapping['concept_name'], mapping['vocabulary_id']):
+                    print(f"   Code {code}: {concept_name} (from {vocabulary_id})")
             
             print(f"✅ Pre-loaded {len(self._concept_cache)} measurement concept mappings")
             
             # Pre-load unit mappings
-            unique_units = df.get('UNITS', pd.Series(dtype='object')).dropna().unique()
+            unique_units = pd.Series(df.get('UNITS', pd.Series(dtype='object')).dropna().unique())
             if len(unique_units) > 0:
-                unit_list = "', '".join(str(unit) for unit in unique_units)
-                unit_query = f"""
-                SELECT concept_name, concept_id 
-                FROM {self.db_manager.config.schema_cdm}.concept
-                WHERE concept_name IN ('{unit_list}')
-                  AND domain_id = 'Unit'
-                  AND standard_concept = 'S'
-                  AND invalid_reason IS NULL
-                """
-                
-                unit_result = self.db_manager.execute_query(unit_query)
-                for _, row in unit_result.iterrows():
-                    self._unit_cache[str(row['concept_name'])] = int(row['concept_id'])
+                unit_ids = self.vocabulary.unit_concept_ids(unique_units.astype(str))
+                self._unit_cache.update({
+                    str(unit): int(unit_id) for unit, unit_id in zip(unique_units, unit_ids) if pd.notna(unit_id)
+                })
                 
                 print(f"✅ Pre-loaded {len(self._unit_cache)} unit mappings")
             
             # Pre-load value concept mappings for categorical results
             unique_values = df.get('VALUE', pd.Series(dtype='object')).dropna().unique()
-            categorical_values = [v for v in unique_values if not self._is_numeric(v)]
+            categorical_values = pd.Series([str(v) for v in unique_values if not self._is_numeric(v)], dtype='object')
             
             if len(categorical_values) > 0:
                 print(f"🔄 Pre-loading {len(categorical_values)} value concept mappings...")
-                for value in categorical_values:
-                    value_concept_id = self._lookup_value_concept(str(value))
-                    self._value_concept_cache[str(value)] = value_concept_id
+                value_ids = self.vocabulary.value_concept_ids(categorical_values)
+                self._value_concept_cache.update({
+                    value: int(value_id) if pd.notna(value_id) else 0
+                    for value, value_id in zip(categorical_values, value_ids)
+                })
                 
                 print(f"✅ Pre-loaded value concept mappings")
             
@@ -314,41 +293,16 @@ class MeasurementTransformer:
         """Filter to only include codes that belong to the Measurement domain"""
         try:
             print("🔍 Validating codes against OMOP vocabulary for Measurement domain...")
+            print(f"📊 Checking {df['CODE'].nunique()} unique codes...")
             
-            unique_codes = df['CODE'].unique()
-            print(f"📊 Checking {len(unique_codes)} unique codes...")
-            
-            # Process codes in batches
-            batch_size = 100
-            valid_codes_set = set()
-            
-            for i in range(0, len(unique_codes), batch_size):
-                batch_codes = unique_codes[i:i+batch_size]
-                code_list = "', '".join(batch_codes.astype(str))
-                
-                domain_query = f"""
-                SELECT DISTINCT 
-                    c.concept_code,
-                    c.concept_id,
-                    c.concept_name,
-                    c.domain_id,
-                    c.vocabulary_id,
-                    c.standard_concept
-                FROM {self.db_manager.config.schema_cdm}.concept c
-                WHERE c.concept_code IN ('{code_list}')
-                  AND c.domain_id = 'Measurement'
-                  AND c.vocabulary_id IN ('LOINC', 'SNOMED', 'UCUM')
-                  AND c.invalid_reason IS NULL
-                """
-                
-                batch_valid_codes = self.db_manager.execute_query(domain_query)
-                if not batch_valid_codes.empty:
-                    valid_codes_set.update(batch_valid_codes['concept_code'].astype(str))
-                    for _, row in batch_valid_codes.iterrows():
-                        print(f"   ✅ Found: {row['concept_code']} -> {row['concept_name']} ({row['vocabulary_id']})")
-                
-                print(f"   Processed batch {i//batch_size + 1}/{(len(unique_codes)-1)//batch_size + 1}")
+            valid_codes = self.vocabulary.valid_codes(
+                df['CODE'], domain='Measurement', vocabularies=MEASUREMENT_VOCABULARIES
+            )
+            if self.debug:
+                for code, concept_name, vocabulary_id in zip(valid_codes['concept_code'], valid_codes['concept_name'], valid_codes['vocabulary_id']):
+                    print(f"   ✅ Found: {code} -> {concept_name} ({vocabulary_id})")
             
+            valid_codes_set = set(valid_codes['concept_code'])
             if not valid_codes_set:
                 print("⚠️ No valid measurement codes found in OMOP vocabulary")
                 return pd.DataFrame()
@@ -377,46 +331,11 @@ class MeasurementTransformer:
         except (ValueError, TypeError):
             return False
     
-    def _lookup_value_concept(self, value_str: str) -> int:
-        """Lookup concept ID for categorical measurement values"""
-        if not self.db_manager:
-            return 0
-        
-        try:
-            # Search for matching concepts in Meas Value domain
-            search_query = f"""
-            SELECT 
-                c.concept_id,
-                c.concept_name,
-                c.vocabulary_id
-            FROM {self.db_manager.config.schema_cdm}.concept c
-            WHERE LOWER(c.concept_name) ILIKE %(search_term)s
-              AND c.domain_id = 'Meas Value'
-              AND c.standard_concept = 'S'
-              AND c.invalid_reason IS NULL
-            ORDER BY 
-                CASE WHEN LOWER(c.concept_name) = LOWER(%(exact_term)s) THEN 1 ELSE 2 END,
-                LENGTH(c.concept_name)
-            LIMIT 1
-            """
-            
-            search_term = f"%{value_str.lower()}%"
-            
-            result = self.db_manager.execute_query(search_query, {
-                'search_term': search_term,
-                'exact_term': value_str
-            })
-            
-            if not result.empty:
-                return int(result.iloc[0]['concept_id'])
-            else:
-                return 0
-                
-        except Exception as e:
-            return 0
-    
     def _filter_existing_patients(self, df: pd.DataFrame) -> pd.DataFrame:
         """Filter to only include patients that exist in person table"""
+        if self.context is not None:
+            return self.context.filter_existing_patients(df, 'PATIENT')
+        
         try:
             query = f"SELECT DISTINCT person_source_value FROM {self.db_manager.config.schema_cdm}.person"
             existing_persons = self.db_manager.execute_query(query)
@@ -1,7 +1,18 @@
 import pandas as pd
-from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
 from src.utils.uuid_converter import UUIDConverter
+from src.utils.date_parser import parse_date_series
+
+# (label, Synthea table, start column, end column, DD/MM/YYYY dates) of each evidence source
+EVIDENCE_SOURCES = [
+    ('encounter', 'encounters', 'START', 'STOP', False),
+    ('condition', 'conditions', 'START', 'STOP', True),
+    ('procedure', 'procedures', 'START', 'STOP', False),
+    ('medication', 'medications', 'START', 'STOP', False),
+    ('observation', 'observations', 'DATE', None, False)    # date only - start = end
+]
+
+DEATH_DATE_COLUMNS = ['DEATHDATE', 'DEATH_DATE', 'death_date']
 
 class ObservationPeriodTransformer:
     """Transform source data to calculate observation periods for each person"""
@@ -22,7 +33,7 @@ class ObservationPeriodTransformer:
             print("❌ No evidence dates found")
             return pd.DataFrame()
         
-        print(f"📊 Collected {len(all_evidence)} evidence dates from source tables")
+        print(f"📊 Collected {len(all_evidence)} per-person evidence ranges from source tables")
         
         # Calculate observation periods per person
         observation_periods = self._calculate_periods(all_evidence)
@@ -31,213 +42,74 @@ class ObservationPeriodTransformer:
         return observation_periods
     
     def _collect_evidence_dates(self) -> pd.DataFrame:
-        """Collect all evidence dates from trusted source tables"""
+        """
+        Collect evidence dates from trusted source tables.
+
+        Each source is reduced to its earliest start and latest end per person
+        before the sources are combined.
+        """
         
         all_evidence = []
         
-        # 1. Encounters (visit evidence - start/end)
-        print("📥 Collecting encounter evidence...")
-        encounter_evidence = self._get_encounter_evidence()
-        if not encounter_evidence.empty:
-            all_evidence.append(encounter_evidence)
-            print(f"  ✅ {len(encounter_evidence)} encounter evidence records")
-        
-        # 2. Conditions (start/end)
-        print("📥 Collecting condition evidence...")
-        condition_evidence = self._get_condition_evidence()
-        if not condition_evidence.empty:
-            all_evidence.append(condition_evidence)
-            print(f"  ✅ {len(condition_evidence)} condition evidence records")
-        
-        # 3. Procedures (start/end)
-        print("📥 Collecting procedure evidence...")
-        procedure_evidence = self._get_procedure_evidence()
-        if not procedure_evidence.empty:
-            all_evidence.append(procedure_evidence)
-            print(f"  ✅ {len(procedure_evidence)} procedure evidence records")
-        
-        # 4. Medications (start/end)
-        print("📥 Collecting medication evidence...")
-        medication_evidence = self._get_medication_evidence()
-        if not medication_evidence.empty:
-            all_evidence.append(medication_evidence)
-            print(f"  ✅ {len(medication_evidence)} medication evidence records")
-        
-        # 5. Observations (date only - normalize to start=end)
-        print("📥 Collecting observation evidence...")
-        observation_evidence = self._get_observation_evidence()
-        if not observation_evidence.empty:
-            all_evidence.append(observation_evidence)
-            print(f"  ✅ {len(observation_evidence)} observation evidence records")
+        for label, table, start_col, end_col, dayfirst_format in EVIDENCE_SOURCES:
+            print(f"📥 Collecting {label} evidence...")
+            evidence, record_count = self._get_source_evidence(label, table, start_col, end_col, dayfirst_format)
+            if not evidence.empty:
+                all_evidence.append(evidence)
+                print(f"  ✅ {record_count} {label} evidence records")
         
         # Combine all evidence
         if all_evidence:
-            combined = pd.concat(all_evidence, ignore_index=True)
-            # Remove duplicates
-            combined = combined.drop_duplicates(subset=['person_id', 'start_date', 'end_date'])
-            return combined
+            return pd.concat(all_evidence, ignore_index=True)
         else:
             return pd.DataFrame()
     
-    def _get_encounter_evidence(self) -> pd.DataFrame:
-        """Extract evidence from encounters (visit_occurrence equivalent)"""
-        try:
-            encounters_df = self.extractor.get_encounters()
-            if encounters_df.empty:
-                return pd.DataFrame()
-            
-            # Filter required columns
-            if not all(col in encounters_df.columns for col in ['PATIENT', 'START', 'STOP']):
-                print("⚠️ Missing required columns in encounters")
-                return pd.DataFrame()
-            
-            evidence = []
-            for _, row in encounters_df.iterrows():
-                if pd.notna(row['PATIENT']) and pd.notna(row['START']):
-                    start_date = self._parse_datetime(row['START'])
-                    end_date = self._parse_datetime(row['STOP']) if pd.notna(row['STOP']) else start_date
-                    
-                    if start_date:
-                        evidence.append({
-                            'person_id': str(row['PATIENT']),
-                            'start_date': start_date.date(),
-                            'end_date': end_date.date() if end_date else start_date.date(),
-                            'source': 'encounter'
-                        })
-            
-            return pd.DataFrame(evidence)
-            
-        except Exception as e:
-            print(f"⚠️ Error collecting encounter evidence: {e}")
-            return pd.DataFrame()
-    
-    def _get_condition_evidence(self) -> pd.DataFrame:
-        """Extract evidence from conditions"""
+    def _get_source_evidence(self, label: str, table: str, start_col: str, end_col: Optional[str],
+                             dayfirst_format: bool) -> Tuple[pd.DataFrame, int]:
+        """
+        Earliest start and latest end date per person in one source table.
+
+        A missing or unparseable end date counts as the start date.
+
+        Returns:
+            (DataFrame of person_id / start_date / end_date, number of evidence records)
+        """
         try:
-            conditions_df = self.extractor.get_conditions()
-            if conditions_df.empty:
-                return pd.DataFrame()
+            columns = ['PATIENT', start_col] + ([end_col] if end_col else [])
+            source_df = self.extractor.read_table(table, columns=columns)
+            if source_df.empty:
+                return pd.DataFrame(), 0
             
             # Filter required columns
-            if not all(col in conditions_df.columns for col in ['PATIENT', 'START']):
-                print("⚠️ Missing required columns in conditions")
-                return pd.DataFrame()
-            
-            evidence = []
-            for _, row in conditions_df.iterrows():
-                if pd.notna(row['PATIENT']) and pd.notna(row['START']):
-                    start_date = self._parse_datetime_condition_format(row['START'])
-                    end_date = self._parse_datetime_condition_format(row['STOP']) if pd.notna(row.get('STOP')) else start_date
-                    
-                    if start_date:
-                        evidence.append({
-                            'person_id': str(row['PATIENT']),
-                            'start_date': start_date.date(),
-                            'end_date': end_date.date() if end_date else start_date.date(),
-                            'source': 'condition'
-                        })
-            
-            return pd.DataFrame(evidence)
+            if not all(col in source_df.columns for col in ['PATIENT', start_col]):
+                print(f"⚠️ Missing required columns in {table}")
+                return pd.DataFrame(), 0
+            
+            source_df = source_df.dropna(subset=['PATIENT', start_col])
+            start_dates = parse_date_series(source_df[start_col], dayfirst_format)
+            if end_col in source_df.columns:
+                end_dates = parse_date_series(source_df[end_col], dayfirst_format).fillna(start_dates)
+            else:
+                end_dates = start_dates
+            
+            valid = start_dates.notna()
+            evidence = pd.DataFrame({
+                'person_id': source_df['PATIENT'][valid].astype(str),
+                'start_date': start_dates[valid],
+                'end_date': end_dates[valid]
+            })
+            if evidence.empty:
+                return pd.DataFrame(), 0
+            
+            per_person = evidence.groupby('person_id', sort=False).agg(
+                start_date=('start_date', 'min'),
+                end_date=('end_date', 'max')
+            ).reset_index()
+            return per_person, len(evidence)
             
         except Exception as e:
-            print(f"⚠️ Error collecting condition evidence: {e}")
-            return pd.DataFrame()
-    
-    def _get_procedure_evidence(self) -> pd.DataFrame:
-        """Extract evidence from procedures"""
-        try:
-            procedures_df = self.extractor.get_procedures()
-            if procedures_df.empty:
-                return pd.DataFrame()
-            
-            # Check if procedures data has required columns
-            if not all(col in procedures_df.columns for col in ['PATIENT', 'START']):
-                print("⚠️ Missing required columns in procedures")
-                return pd.DataFrame()
-            
-            evidence = []
-            for _, row in procedures_df.iterrows():
-                if pd.notna(row['PATIENT']) and pd.notna(row['START']):
-                    start_date = self._parse_datetime(row['START'])
-                    end_date = self._parse_datetime(row['STOP']) if pd.notna(row.get('STOP')) else start_date
-                    
-                    if start_date:
-                        evidence.append({
-                            'person_id': str(row['PATIENT']),
-                            'start_date': start_date.date(),
-                            'end_date': end_date.date() if end_date else start_date.date(),
-                            'source': 'procedure'
-                        })
-            
-            return pd.DataFrame(evidence)
-            
-        except Exception as e:
-            print(f"⚠️ Error collecting procedure evidence: {e}")
-            return pd.DataFrame()
-    
-    def _get_medication_evidence(self) -> pd.DataFrame:
-        """Extract evidence from medications"""
-        try:
-            medications_df = self.extractor.get_medications()
-            if medications_df.empty:
-                return pd.DataFrame()
-            
-            # Check if medications data has required columns
-            if not all(col in medications_df.columns for col in ['PATIENT', 'START']):
-                print("⚠️ Missing required columns in medications")
-                return pd.DataFrame()
-            
-            evidence = []
-            for _, row in medications_df.iterrows():
-                if pd.notna(row['PATIENT']) and pd.notna(row['START']):
-                    start_date = self._parse_datetime(row['START'])
-                    end_date = self._parse_datetime(row['STOP']) if pd.notna(row.get('STOP')) else start_date
-                    
-                    if start_date:
-                        evidence.append({
-                            'person_id': str(row['PATIENT']),
-                            'start_date': start_date.date(),
-                            'end_date': end_date.date() if end_date else start_date.date(),
-                            'source': 'medication'
-                        })
-            
-            return pd.DataFrame(evidence)
-            
-        except Exception as e:
-            print(f"⚠️ Error collecting medication evidence: {e}")
-            return pd.DataFrame()
-    
-    def _get_observation_evidence(self) -> pd.DataFrame:
-        """Extract evidence from observations (date only - normalize to start=end)"""
-        try:
-            observations_df = self.extractor.get_observations()
-            if observations_df.empty:
-                return pd.DataFrame()
-            
-            # Check if observations data has required columns
-            if not all(col in observations_df.columns for col in ['PATIENT', 'DATE']):
-                print("⚠️ Missing required columns in observations")
-                return pd.DataFrame()
-            
-            evidence = []
-            for _, row in observations_df.iterrows():
-                if pd.notna(row['PATIENT']) and pd.notna(row['DATE']):
-                    obs_date = self._parse_datetime(row['DATE'])
-                    
-                    if obs_date:
-                        # For observations, use same date for both start and end
-                        evidence.append({
-                            'person_id': str(row['PATIENT']),
-                            'start_date': obs_date.date(),
-                            'end_date': obs_date.date(),  # Same date for both
-                            'source': 'observation'
-                        })
-            
-            return pd.DataFrame(evidence)
-            
-        except Exception as e:
-            print(f"⚠️ Error collecting observation evidence: {e}")
-            return pd.DataFrame()
+            print(f"⚠️ Error collecting {label} evidence: {e}")
+            return pd.DataFrame(), 0
     
     def _calculate_periods(self, evidence_df: pd.DataFrame) -> pd.DataFrame:
         """Calculate observation periods per person with death date capping"""
@@ -269,27 +141,29 @@ class ObservationPeriodTransformer:
             )
             
             # Apply death date capping
-            def apply_death_cap(row):
-                if pd.notna(row.get('death_date')):
-                    return min(row['observation_period_end_date'], row['death_date'])
-                return row['observation_period_end_date']
-            
-            person_periods['observation_period_end_date'] = person_periods.apply(apply_death_cap, axis=1)
+            capped = person_periods['death_date'].notna() & (
+                person_periods['death_date'] < person_periods['observation_period_end_date']
+            )
+            person_periods.loc[capped, 'observation_period_end_date'] = person_periods.loc[capped, 'death_date']
             
             # Clean up merge columns
             person_periods = person_periods[['person_id', 'observation_period_start_date', 'observation_period_end_date']]
         
         # Convert person_id to OMOP person_id using UUID converter
-        person_periods['omop_person_id'] = person_periods['person_id'].apply(UUIDConverter.person_id)
+        person_periods['omop_person_id'] = UUIDConverter.person_ids(person_periods['person_id'])
         
         # Generate deterministic observation_period_id based on person_id
-        person_periods['observation_period_id'] = person_periods['person_id'].apply(
-            lambda x: UUIDConverter.generic_id(f"obs_period_{x}")
+        person_periods['observation_period_id'] = UUIDConverter.generic_ids(
+            'obs_period_' + person_periods['person_id'].astype(str)
         )
         
         # Add period type
         person_periods['period_type_concept_id'] = self.period_type_concept_id
         
+        # Dates are loaded as calendar dates
+        for col in ['observation_period_start_date', 'observation_period_end_date']:
+            person_periods[col] = person_periods[col].dt.date
+        
         # Final column selection
         result_df = person_periods[[
             'observation_period_id',
@@ -305,13 +179,13 @@ class ObservationPeriodTransformer:
     def _get_death_dates(self) -> pd.DataFrame:
         """Extract death dates from patient source data"""
         try:
-            patients_df = self.extractor.get_patients()
+            patients_df = self.extractor.read_table('patients', columns=['Id'] + DEATH_DATE_COLUMNS)
             if patients_df.empty:
                 return pd.DataFrame()
             
             # Check if death date column exists
             death_col = None
-            for col in ['DEATHDATE', 'DEATH_DATE', 'death_date']:
+            for col in DEATH_DATE_COLUMNS:
                 if col in patients_df.columns:
                     death_col = col
                     break
@@ -326,43 +200,12 @@ class ObservationPeriodTransformer:
             if death_data.empty:
                 return pd.DataFrame()
             
-            death_dates = []
-            for _, row in death_data.iterrows():
-                death_date = self._parse_datetime_condition_format(row[death_col])
-                if death_date:
-                    death_dates.append({
-                        'patient_id': str(row['Id']),
-                        'death_date': death_date.date()
-                    })
-            
-            return pd.DataFrame(death_dates)
+            death_dates = pd.DataFrame({
+                'patient_id': death_data['Id'].astype(str),
+                'death_date': parse_date_series(death_data[death_col], dayfirst_format=True)
+            })
+            return death_dates.dropna(subset=['death_date']).reset_index(drop=True)
             
         except Exception as e:
             print(f"⚠️ Error collecting death dates: {e}")
             return pd.DataFrame()
-    
-    def _parse_datetime(self, datetime_str: str) -> Optional[datetime]:
-        """Parse ISO datetime format"""
-        if pd.isna(datetime_str):
-            return None
-        
-        try:
-            # Handle ISO format: 2015-10-21T13:30:04Z
-            return pd.to_datetime(datetime_str).to_pydatetime()
-        except:
-            return None
-    
-    def _parse_datetime_condition_format(self, date_str: str) -> Optional[datetime]:
-        """Parse DD/MM/YYYY date format from condition/patient data"""
-        if pd.isna(date_str):
-            return None
-        
-        try:
-            # Handle DD/MM/YYYY format: 21/10/2015
-            return pd.to_datetime(date_str, format='%d/%m/%Y').to_pydatetime()
-        except:
-            try:
-                # Fallback to auto-parsing
-                return pd.to_datetime(date_str).to_pydatetime()
-            except:
-                return None
\ No newline at end of file
@@ -1,13 +1,45 @@
+import re
+import numpy as np
 import pandas as pd
-from datetime import datetime
 from typing import Optional, Union, Dict
-from src.utils.uuid_converter import UUIDConverter
+from src.utils.uuid_converter import UUIDConverter, optional_key_part
+from src.vocabulary.vocabulary_service import VocabularyService
+from src.pipeline.run_context import RunContext
+from src.pipeline.encounter_resolver import EncounterResolver
+from src.utils.date_parser import parse_timestamp_series
+
+OBSERVATION_VOCABULARIES = ['SNOMED', 'ICD10CM', 'ICD9CM', 'ICD10', 'ICD9Proc', 'LOINC']
+
+OBSERVATION_REQUIRED_COLUMNS = ['DATE', 'PATIENT', 'CODE', 'DESCRIPTION']
+EXCLUDED_CONDITION_REQUIRED_COLUMNS = ['START', 'PATIENT', 'CODE', 'DESCRIPTION']
+
+# Values containing one of these (lowercased) are kept as text even when numeric-looking
+VALUE_TEXT_MARKERS = ['{nominal}', '{ordinal}', 'finding', 'normal', 'abnormal']
+VALUE_TEXT_MARKER_PATTERN = '|'.join(re.escape(marker) for marker in VALUE_TEXT_MARKERS)
+
+OBSERVATION_COLUMNS = [
+    'observation_id', 'person_id', 'observation_concept_id', 'observation_date',
+    'observation_datetime', 'observation_type_concept_id', 'value_as_number',
+    'value_as_string', 'value_as_concept_id', 'qualifier_concept_id', 'unit_concept_id',
+    'provider_id', 'visit_occurrence_id', 'visit_detail_id', 'observation_source_value',
+    'observation_source_concept_id', 'unit_source_value', 'qualifier_source_value',
+    'value_source_value', 'observation_event_id', 'obs_event_field_concept_id'
+]
 
 class ObservationTransformer:
     """Transform observation data and excluded condition data to OMOP observation format"""
     
-    def __init__(self, db_manager=None):
+    def __init__(self, db_manager=None, vocabulary: Optional[VocabularyService] = None,
+                 context: Optional[RunContext] = None, debug: bool = False):
         self.db_manager = db_manager
+        self.vocabulary = vocabulary or (VocabularyService(db_manager) if db_manager else None)
+        # Person and visit sets shared across the run (queried here when absent)
+        self.context = context
+        # Encounter -> visit_occurrence_id, one hash join per transform call
+        self.encounters = EncounterResolver(db_manager, context)
+        
+        # Print every matched code while filtering
+        self.debug = debug
         
         # Standard observation_type_concept_id for EHR data
         self.observation_type_concept_id = 32817  # EHR
@@ -19,23 +51,91 @@ class ObservationTransformer:
             'QOLS': 4129922
         }
         
+        # Rows given a row number by the last transform call (for streamed chunks)
+        self.rows_numbered = 0
+        
         # Cache for concept lookups to avoid repeated queries
         self._concept_cache = {}
         self._source_concept_cache = {}
         self._unit_cache = {}
     
-    def transform_observations(self, observations_df: pd.DataFrame) -> pd.DataFrame:
-        """Transform observation source data to OMOP observation format"""
+    def transform(self, observations_df: pd.DataFrame, excluded_conditions_df: pd.DataFrame,
+                  row_offset: int = 0) -> pd.DataFrame:
+        """
+        Transform observations and excluded conditions to one OMOP observation frame
+        
+        Both sources share one concept/unit preload, one visit join and one type
+        fix, so the result is ready for a single bulk load. IDs are the same as
+        transform_observations and transform_excluded_conditions would give.
+        
+        Args:
+            observations_df: Observation source rows
+            excluded_conditions_df: Condition rows whose codes are in the Observation domain
+            row_offset: Observation rows numbered by earlier chunks
+        
+        Returns:
+            Observation rows followed by excluded condition rows
+        """
+        self.rows_numbered = 0
+        
+        print(f"🔄 Transforming {len(observations_df)} observations and {len(excluded_conditions_df)} "
+              f"excluded conditions to OMOP observation format...")
+        
+        result_df = self._transform_sources(
+            self._valid_observations(observations_df), self._valid_excluded_conditions(excluded_conditions_df),
+            row_offset
+        )
+        if result_df.empty:
+            print("❌ No valid observation records created")
+            return result_df
+        
+        print(f"✅ Successfully transformed {len(result_df)} observations")
+        return result_df
+    
+    def transform_observations(self, observations_df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+        """
+        Transform observation source data to OMOP observation format
+        
+        Args:
+            observations_df: Observation rows (a whole table or one streamed chunk)
+            row_offset: Rows numbered by earlier chunks, so IDs continue across chunks
+        """
+        self.rows_numbered = 0
         
         print(f"🔄 Transforming {len(observations_df)} observations to OMOP observation format...")
         
+        result_df = self._transform_sources(self._valid_observations(observations_df), None, row_offset)
+        if result_df.empty:
+            print("❌ No valid observation records created")
+            return result_df
+        
+        print(f"✅ Successfully transformed {len(result_df)} observations")
+        return result_df
+    
+    def transform_excluded_conditions(self, excluded_conditions_df: pd.DataFrame) -> pd.DataFrame:
+        """Transform condition records that were excluded from condition_occurrence to observation format"""
+        
+        print(f"🔄 Transforming {len(excluded_conditions_df)} excluded conditions to observations...")
+        
+        result_df = self._transform_sources(None, self._valid_excluded_conditions(excluded_conditions_df))
+        if result_df.empty:
+            print("❌ No valid observation records created from excluded conditions")
+            return result_df
+        
+        print(f"✅ Successfully transformed {len(result_df)} excluded conditions to observations")
+        return result_df
+    
+    def _valid_observations(self, observations_df: pd.DataFrame) -> pd.DataFrame:
+        """Observations with all required fields, in the Observation domain and for existing patients"""
+        if observations_df.empty:
+            return observations_df
+        
         # Drop observations with missing required fields
-        required_cols = ['DATE', 'PATIENT', 'CODE', 'DESCRIPTION']
-        observations_df = observations_df.dropna(subset=required_cols)
+        observations_df = observations_df.dropna(subset=OBSERVATION_REQUIRED_COLUMNS)
         
         if observations_df.empty:
             print("❌ No valid observations after filtering")
-            return pd.DataFrame()
+            return observations_df
         
         # Filter to only valid observation domain codes
         if self.db_manager:
@@ -43,154 +143,186 @@ class ObservationTransformer:
             print(f"✅ Filtered to {len(observations_df)} records in Observation domain")
         
         # Filter to only include patients that exist in person table
-        if self.db_manager:
+        if self.db_manager and not observations_df.empty:
             observations_df = self._filter_existing_patients(observations_df)
             print(f"✅ Filtered to {len(observations_df)} observations for existing patients")
         
-        # Pre-load concept mappings to avoid individual lookups
-        if self.db_manager:
-            self._preload_concept_mappings(observations_df)
-        
-        observation_records = []
-        total_records = len(observations_df)
-        
-        print(f"🔄 Processing {total_records} observation records...")
-        
-        for idx, (row_idx, observation) in enumerate(observations_df.iterrows()):
-            try:
-                # Print progress every 100 records
-                if idx % 100 == 0:
-                    print(f"   Progress: {idx}/{total_records} ({idx/total_records*100:.1f}%)")
-                
-                obs_record = self._transform_observation_record(observation, row_index=idx)
-                if obs_record:
-                    observation_records.append(obs_record)
-            except Exception as e:
-                print(f"⚠️ Error with observation {idx}: {e}")
-                continue
-        
-        if not observation_records:
-            print("❌ No valid observation records created")
-            return pd.DataFrame()
-        
-        result_df = pd.DataFrame(observation_records)
-        
-        # Fix data types to ensure database compatibility
-        result_df = self._fix_data_types(result_df)
-        
-        print(f"✅ Successfully transformed {len(result_df)} observations")
-        return result_df
+        return observations_df
     
-    def transform_excluded_conditions(self, excluded_conditions_df: pd.DataFrame) -> pd.DataFrame:
-        """Transform condition records that were excluded from condition_occurrence to observation format"""
-        
-        print(f"🔄 Transforming {len(excluded_conditions_df)} excluded conditions to observations...")
+    def _valid_excluded_conditions(self, excluded_conditions_df: pd.DataFrame) -> pd.DataFrame:
+        """Excluded conditions with all required fields"""
+        if excluded_conditions_df.empty:
+            return excluded_conditions_df
         
         # Drop conditions with missing required fields
-        required_cols = ['START', 'PATIENT', 'CODE', 'DESCRIPTION']
-        excluded_conditions_df = excluded_conditions_df.dropna(subset=required_cols)
+        excluded_conditions_df = excluded_conditions_df.dropna(subset=EXCLUDED_CONDITION_REQUIRED_COLUMNS)
         
         if excluded_conditions_df.empty:
             print("❌ No valid excluded conditions after filtering")
+        return excluded_conditions_df
+    
+    def _transform_sources(self, observations: Optional[pd.DataFrame], conditions: Optional[pd.DataFrame],
+                           row_offset: int = 0) -> pd.DataFrame:
+        """Shared concept, ID, value and visit stages for both observation sources"""
+        observations = observations if observations is not None else pd.DataFrame()
+        conditions = conditions if conditions is not None else pd.DataFrame()
+        sources = [source for source in (observations, conditions) if not source.empty]
+        if not sources:
             return pd.DataFrame()
         
-        # Pre-load concept mappings
+        # Pre-load concept and unit mappings for both sources at once
         if self.db_manager:
-            self._preload_concept_mappings(excluded_conditions_df, code_column='CODE')
-        
-        observation_records = []
-        total_records = len(excluded_conditions_df)
-        
-        print(f"🔄 Processing {total_records} excluded condition records...")
-        
-        for idx, (row_idx, condition) in enumerate(excluded_conditions_df.iterrows()):
-            try:
-                # Print progress every 100 records
-                if idx % 100 == 0:
-                    print(f"   Progress: {idx}/{total_records} ({idx/total_records*100:.1f}%)")
-                
-                obs_record = self._transform_condition_to_observation(condition)
-                if obs_record:
-                    observation_records.append(obs_record)
-            except Exception as e:
-                print(f"⚠️ Error with excluded condition {idx}: {e}")
-                continue
-        
-        if not observation_records:
-            print("❌ No valid observation records created from excluded conditions")
+            self._preload_concept_mappings(pd.concat(
+                [source[[col for col in ('CODE', 'UNITS') if col in source.columns]] for source in sources],
+                ignore_index=True
+            ))
+        
+        frames = []
+        if not observations.empty:
+            # Hash all IDs in one batch
+            observations = self._assign_observation_ids(observations, row_offset)
+            self.rows_numbered = len(observations)
+            
+            print(f"🔄 Processing {len(observations)} observation records...")
+            no_values = pd.Series(None, index=observations.index, dtype=object)
+            frames.append(self._build_observations(
+                observations, parse_timestamp_series(observations['DATE']),
+                observations.get('VALUE', no_values), observations.get('UNITS', no_values)
+            ))
+        
+        if not conditions.empty:
+            # Hash all IDs in one batch
+            conditions = self._assign_condition_observation_ids(conditions)
+            
+            print(f"🔄 Processing {len(conditions)} excluded condition records...")
+            # Excluded conditions carry no value or unit; START is tried as DD/MM/YYYY, then ISO
+            no_values = pd.Series(None, index=conditions.index, dtype=object)
+            frames.append(self._build_observations(
+                conditions, parse_timestamp_series(conditions['START'], dayfirst_format=True),
+                no_values, no_values
+            ))
+        
+        result_df = pd.concat(frames, ignore_index=True)
+        if result_df.empty:
             return pd.DataFrame()
         
-        result_df = pd.DataFrame(observation_records)
+        # One visit join for both sources
+        visits = self.encounters.resolve(result_df.pop('_encounter'))
+        result_df['visit_occurrence_id'] = visits['visit_occurrence_id']
         
         # Fix data types to ensure database compatibility
-        result_df = self._fix_data_types(result_df)
-        
-        print(f"✅ Successfully transformed {len(result_df)} excluded conditions to observations")
-        return result_df
+        return self._fix_data_types(result_df[OBSERVATION_COLUMNS])
+    
+    def _build_observations(self, df: pd.DataFrame, obs_datetime: pd.Series, values: pd.Series,
+                            units: pd.Series) -> pd.DataFrame:
+        """Assemble observation rows from whole columns, dropping rows without a date"""
+        valid = obs_datetime.notna()
+        df = df[valid]
+        obs_datetime = obs_datetime[valid]
+        values = values[valid]
+        units = units[valid]
+        
+        # Special mappings take precedence over the vocabulary caches
+        codes = df['CODE'].astype(str)
+        special_concepts = codes.str.upper().map(self.special_mappings)
+        value_columns = self._classify_values(values)
+        
+        # Units through the preloaded unit cache
+        has_unit = units.notna() & (units.astype(str) != '')
+        
+        return pd.DataFrame({
+            'observation_id': df['_observation_id'],
+            'person_id': df['_person_id'],
+            'observation_concept_id': special_concepts.fillna(codes.map(self._concept_cache)).fillna(0).astype('int64'),
+            'observation_date': obs_datetime.dt.date,
+            'observation_datetime': obs_datetime,
+            'observation_type_concept_id': self.observation_type_concept_id,
+            'value_as_number': value_columns['value_as_number'],
+            'value_as_string': value_columns['value_as_string'],
+            'value_as_concept_id': value_columns['value_as_concept_id'],
+            'qualifier_concept_id': None,
+            'unit_concept_id': units.astype(str).map(self._unit_cache).where(has_unit),
+            'provider_id': None,
+            'visit_detail_id': None,
+            'observation_source_value': df['DESCRIPTION'].astype(str).str[:50],
+            'observation_source_concept_id': special_concepts.fillna(codes.map(self._source_concept_cache)).fillna(0).astype('int64'),
+            'unit_source_value': units.astype(str).str[:50].where(units.notna()),
+            'qualifier_source_value': None,
+            'value_source_value': values.astype(str).str[:50].where(values.notna()),
+            'observation_event_id': None,
+            'obs_event_field_concept_id': None,
+            '_encounter': df.get('ENCOUNTER', pd.Series(None, index=df.index, dtype=object))
+        })
+    
+    def _classify_values(self, values: pd.Series) -> pd.DataFrame:
+        """
+        Split raw values into value_as_number, value_as_string and value_as_concept_id.
+        
+        Special mappings (QALY, DALY, QOLS) become concepts, text containing a
+        nominal/ordinal/finding marker stays a string, anything that parses as a
+        number is numeric and everything else is a string. Each distinct value is
+        classified once.
+        """
+        codes, uniques = pd.factorize(values)
+        text = pd.Series([str(value) for value in uniques], dtype=object)
+        
+        special = text.str.upper().map(self.special_mappings)
+        marked = text.str.lower().str.contains(VALUE_TEXT_MARKER_PATTERN, regex=True)
+        
+        number = pd.to_numeric(text, errors='coerce')
+        parsed = number.notna()
+        # float() reads a few spellings to_numeric does not (' nan', '1_000'), keep them numeric
+        for i in np.flatnonzero(~parsed.to_numpy()):
+            try:
+                number.iloc[i] = float(text.iloc[i])
+                parsed.iloc[i] = True
+            except (ValueError, TypeError):
+                pass
+        
+        present = text != ''
+        is_special = present & special.notna()
+        is_string = present & ~is_special & (marked | ~parsed)
+        is_number = present & ~is_special & ~marked & parsed
+        
+        classified = pd.DataFrame({
+            'value_as_number': number.where(is_number).astype('float64'),
+            'value_as_string': text.str[:60].where(is_string),
+            'value_as_concept_id': pd.array(special.where(is_special), dtype='Int64')
+        })
+        # Trailing all-null row picked by the -1 code of missing values
+        classified.loc[len(classified)] = [np.nan, None, pd.NA]
+        classified = classified.iloc[codes]
+        classified.index = values.index
+        return classified
     
     def _preload_concept_mappings(self, df: pd.DataFrame, code_column: str = 'CODE') -> None:
         """Pre-load all concept mappings to avoid individual lookups"""
-        if not self.db_manager:
+        if not self.vocabulary:
             return
             
         try:
             print("🔄 Pre-loading concept mappings...")
             
-            # Get unique codes
-            unique_codes = df[code_column].unique()
-            
-            if len(unique_codes) == 0:
+            if df[code_column].empty:
                 return
             
-            # Build query for all codes at once
-            code_list = "', '".join(str(code) for code in unique_codes)
+            # Get all concept mappings from the shared vocabulary service
+            mapping = self.vocabulary.concept_mapping(df[code_column], domain='Observation')
             
-            # Get all concept mappings in one query
-            query = f"""
-            SELECT 
-                c.concept_code,
-                c.concept_id as source_concept_id,
-                c.concept_name,
-                c.standard_concept,
-                COALESCE(cr.concept_id_2, c.concept_id) as standard_concept_id
-            FROM {self.db_manager.config.schema_cdm}.concept c
-            LEFT JOIN {self.db_manager.config.schema_cdm}.concept_relationship cr 
-                ON c.concept_id = cr.concept_id_1 
-                AND cr.relationship_id = 'Maps to'
-                AND cr.invalid_reason IS NULL
-            WHERE c.concept_code IN ('{code_list}')
-              AND c.domain_id = 'Observation'
-              AND c.invalid_reason IS NULL
-            """
-            
-            result = self.db_manager.execute_query(query)
-            
-            # Build caches
-            for _, row in result.iterrows():
-                code = str(row['concept_code'])
-                # Store both standard and source concept IDs
-                self._concept_cache[code] = int(row['standard_concept_id'])
-                self._source_concept_cache[code] = int(row['source_concept_id'])
+            # Store both standard and source concept IDs
+            self._concept_cache.update(mapping['standard_concept_id'].to_dict())
+            self._source_concept_cache.update(mapping['source_concept_id'].to_dict())
             
             print(f"✅ Pre-loaded {len(self._concept_cache)} concept mappings")
             
             # Also pre-load unit mappings if we have units
             if 'UNITS' in df.columns:
-                unique_units = df['UNITS'].dropna().unique()
+                unique_units = pd.Series(df['UNITS'].dropna().unique())
                 if len(unique_units) > 0:
-                    unit_list = "', '".join(str(unit) for unit in unique_units)
-                    unit_query = f"""
-                    SELECT concept_name, concept_id 
-                    FROM {self.db_manager.config.schema_cdm}.concept
-                    WHERE concept_name IN ('{unit_list}')
-                      AND domain_id = 'Unit'
-                      AND standard_concept = 'S'
-                      AND invalid_reason IS NULL
-                    """
-                    
-                    unit_result = self.db_manager.execute_query(unit_query)
-                    for _, row in unit_result.iterrows():
-                        self._unit_cache[str(row['concept_name'])] = int(row['concept_id'])
+                    unit_ids = self.vocabulary.unit_concept_ids(unique_units.astype(str))
+                    self._unit_cache.update({
+                        str(unit): int(unit_id) for unit, unit_id in zip(unique_units, unit_ids) if pd.notna(unit_id)
+                    })
                     
                     print(f"✅ Pre-loaded {len(self._unit_cache)} unit mappings")
             
@@ -212,40 +344,20 @@ class ObservationTransformer:
             for code in unique_codes:
                 if str(code).upper() in self.special_mappings:
                     special_codes.add(str(code))
-                    print(f"   ✅ Special mapping: {code} -> {self.special_mappings[str(code).upper()]}")
+                    if self.debug:
+                        print(f"   ✅ Special mapping: {code} -> {self.special_mappings[str(code).upper()]}")
             
-            # Process remaining codes in smaller batches to avoid memory issues
             remaining_codes = [code for code in unique_codes if str(code) not in special_codes]
-            batch_size = 100
             valid_codes_set = set(special_codes)  # Start with special codes
             
-            for i in range(0, len(remaining_codes), batch_size):
-                batch_codes = remaining_codes[i:i+batch_size]
-                code_list = "', '".join(str(code) for code in batch_codes)
-                
-                domain_query = f"""
-                SELECT DISTINCT 
-                    c.concept_code,
-                    c.concept_id,
-                    c.concept_name,
-                    c.domain_id,
-                    c.vocabulary_id,
-                    c.standard_concept
-                FROM {self.db_manager.config.schema_cdm}.concept c
-                WHERE c.concept_code IN ('{code_list}')
-                  AND c.domain_id = 'Observation'
-                  AND c.vocabulary_id IN ('SNOMED', 'ICD10CM', 'ICD9CM', 'ICD10', 'ICD9Proc', 'LOINC')
-                  AND c.invalid_reason IS NULL
-                """
-                
-                batch_valid_codes = self.db_manager.execute_query(domain_query)
-                if not batch_valid_codes.empty:
-                    valid_codes_set.update(batch_valid_codes['concept_code'].astype(str))
-                    # Log found codes
-                    for _, row in batch_valid_codes.iterrows():
-                        print(f"   ✅ Found: {row['concept_code']} -> {row['concept_name']} ({row['vocabulary_id']})")
-                
-                print(f"   Processed batch {i//batch_size + 1}/{(len(remaining_codes)-1)//batch_size + 1}")
+            valid_codes = self.vocabulary.valid_codes(
+                remaining_codes, domain='Observation', vocabularies=OBSERVATION_VOCABULARIES
+            )
+            valid_codes_set.update(valid_codes['concept_code'])
+            # Log found codes
+            if self.debug:
+                for code, concept_name, vocabulary_id in zip(valid_codes['concept_code'], valid_codes['concept_name'], valid_codes['vocabulary_id']):
+                    print(f"   ✅ Found: {code} -> {concept_name} ({vocabulary_id})")
             
             if not valid_codes_set:
                 print("⚠️ No valid observation codes found in OMOP vocabulary")
@@ -267,173 +379,47 @@ class ObservationTransformer:
             print("⚠️ Proceeding without domain validation")
             return df
     
-    def _transform_observation_record(self, observation: pd.Series, row_index: int = 0) -> Optional[dict]:
-        """Transform single observation record to OMOP observation format"""
-        
-        # Parse date
-        obs_datetime = self._parse_datetime(observation['DATE'])
-        if not obs_datetime:
-            return None
-        
-        # Generate observation_id using patient, date, code, and value for uniqueness
-        unique_string = f"{observation['PATIENT']}_{observation['DATE']}_{observation['CODE']}"
-        
-        # Add value to make it unique when same code appears multiple times
-        if pd.notna(observation.get('VALUE')):
-            unique_string += f"_{observation['VALUE']}"
-        
-        # Add encounter if available for additional uniqueness
-        if pd.notna(observation.get('ENCOUNTER')):
-            unique_string += f"_{observation['ENCOUNTER']}"
-        
-        # Add row index as final guarantee of uniqueness
-        unique_string += f"_row_{row_index}"
-        
-        observation_id = UUIDConverter.generic_id(unique_string)
-        person_id = UUIDConverter.person_id(observation['PATIENT'])
-        
-        # Look up visit_occurrence_id if encounter is provided
-        visit_occurrence_id = None
-        if pd.notna(observation.get('ENCOUNTER')) and self.db_manager:
-            visit_occurrence_id = self._lookup_visit_occurrence_id(observation['ENCOUNTER'])
-        
-        # Map observation concept using cache
-        observation_concept_id = self._get_cached_concept_id(observation['CODE'])
-        observation_source_concept_id = self._get_cached_source_concept_id(observation['CODE'])
-        
-        # Handle value - determine if numeric or string
-        value_as_number, value_as_string, value_as_concept_id = self._process_value(observation.get('VALUE'))
-        
-        # Map units to concept_id using cache
-        unit_concept_id = self._get_cached_unit_id(observation.get('UNITS'))
-        
-        return {
-            'observation_id': observation_id,
-            'person_id': person_id,
-            'observation_concept_id': observation_concept_id,
-            'observation_date': obs_datetime.date(),
-            'observation_datetime': obs_datetime,
-            'observation_type_concept_id': self.observation_type_concept_id,
-            'value_as_number': value_as_number,
-            'value_as_string': value_as_string,
-            'value_as_concept_id': value_as_concept_id,
-            'qualifier_concept_id': None,
-            'unit_concept_id': unit_concept_id,
-            'provider_id': None,
-            'visit_occurrence_id': visit_occurrence_id,
-            'visit_detail_id': None,
-            'observation_source_value': str(observation['DESCRIPTION'])[:50],
-            'observation_source_concept_id': observation_source_concept_id,  # Fixed!
-            'unit_source_value': str(observation.get('UNITS', ''))[:50] if pd.notna(observation.get('UNITS')) else None,
-            'qualifier_source_value': None,
-            'value_source_value': str(observation.get('VALUE', ''))[:50] if pd.notna(observation.get('VALUE')) else None,
-            'observation_event_id': None,
-            'obs_event_field_concept_id': None
-        }
-    
-    def _transform_condition_to_observation(self, condition: pd.Series) -> Optional[dict]:
-        """Transform excluded condition record to OMOP observation format"""
-        
-        # Parse date (different format from observations)
-        obs_datetime = self._parse_datetime_condition_format(condition['START'])
-        if not obs_datetime:
-            return None
-        
-        # Generate observation_id using patient, date, code, and additional unique elements
-        unique_string = f"{condition['PATIENT']}_{condition['START']}_{condition['CODE']}"
-        
-        # Add encounter if available for additional uniqueness
-        if pd.notna(condition.get('ENCOUNTER')):
-            unique_string += f"_{condition['ENCOUNTER']}"
-        
-        # Add stop date if available for additional uniqueness
-        if pd.notna(condition.get('STOP')):
-            unique_string += f"_{condition['STOP']}"
-        
-        observation_id = UUIDConverter.generic_id(unique_string)
-        person_id = UUIDConverter.person_id(condition['PATIENT'])
-        
-        # Look up visit_occurrence_id if encounter is provided
-        visit_occurrence_id = None
-        if pd.notna(condition.get('ENCOUNTER')) and self.db_manager:
-            visit_occurrence_id = self._lookup_visit_occurrence_id(condition['ENCOUNTER'])
-        
-        # Map observation concept using cache
-        observation_concept_id = self._get_cached_concept_id(condition['CODE'])
-        observation_source_concept_id = self._get_cached_source_concept_id(condition['CODE'])
-        
-        return {
-            'observation_id': observation_id,
-            'person_id': person_id,
-            'observation_concept_id': observation_concept_id,
-            'observation_date': obs_datetime.date(),
-            'observation_datetime': obs_datetime,
-            'observation_type_concept_id': self.observation_type_concept_id,
-            'value_as_number': None,
-            'value_as_string': None,
-            'value_as_concept_id': None,
-            'qualifier_concept_id': None,
-            'unit_concept_id': None,
-            'provider_id': None,
-            'visit_occurrence_id': visit_occurrence_id,
-            'visit_detail_id': None,
-            'observation_source_value': str(condition['DESCRIPTION'])[:50],
-            'observation_source_concept_id': observation_source_concept_id,  # Fixed!
-            'unit_source_value': None,
-            'qualifier_source_value': None,
-            'value_source_value': None,
-            'observation_event_id': None,
-            'obs_event_field_concept_id': None
-        }
+    def _assign_observation_ids(self, df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+        """Batch-generate observation_id and person_id for observation rows"""
+        df = df.copy()
+        
+        # patient, date, code, value and encounter when present, and the row position
+        # as final guarantee of uniqueness
+        unique_strings = (
+            df['PATIENT'].astype(str) + '_' +
+            df['DATE'].astype(str) + '_' +
+            df['CODE'].astype(str) +
+            optional_key_part(df, 'VALUE') +
+            optional_key_part(df, 'ENCOUNTER') +
+            '_row_' + pd.Series(range(row_offset, row_offset + len(df)), index=df.index).astype(str)
+        )
+        
+        df['_observation_id'] = UUIDConverter.generic_ids(unique_strings)
+        df['_person_id'] = UUIDConverter.person_ids(df['PATIENT'])
+        return df
     
-    def _get_cached_concept_id(self, code: str) -> int:
-        """Get standard concept ID from cache or return 0"""
-        # Check special mappings first (bypass database entirely)
-        if str(code).upper() in self.special_mappings:
-            return self.special_mappings[str(code).upper()]
-        
-        return self._concept_cache.get(str(code), 0)
-    
-    def _get_cached_source_concept_id(self, code: str) -> int:
-        """Get source concept ID from cache or return 0"""
-        # For special mappings, use the same concept as standard
-        if str(code).upper() in self.special_mappings:
-            return self.special_mappings[str(code).upper()]
-        
-        return self._source_concept_cache.get(str(code), 0)
-    
-    def _get_cached_unit_id(self, unit: str) -> Optional[int]:
-        """Get unit concept ID from cache"""
-        if pd.isna(unit) or unit == '':
-            return None
-        return self._unit_cache.get(str(unit))
-    
-    def _process_value(self, value) -> tuple[Optional[float], Optional[str], Optional[int]]:
-        """Process observation value and determine appropriate OMOP field"""
-        if pd.isna(value) or value == '':
-            return None, None, None
-        
-        value_str = str(value)
-        
-        # Check for special mappings first
-        if value_str.upper() in self.special_mappings:
-            return None, None, self.special_mappings[value_str.upper()]
-        
-        # Try to parse as number
-        try:
-            # Remove common text markers that indicate non-numeric
-            if any(marker in value_str.lower() for marker in ['{nominal}', '{ordinal}', 'finding', 'normal', 'abnormal']):
-                return None, value_str[:60], None
-            
-            # Try to extract numeric value
-            numeric_value = float(value_str)
-            return numeric_value, None, None
-        except (ValueError, TypeError):
-            # Not numeric, store as string
-            return None, value_str[:60], None
+    def _assign_condition_observation_ids(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Batch-generate observation_id and person_id for excluded condition rows"""
+        df = df.copy()
+        
+        # patient, start, code, then encounter and stop date when present
+        unique_strings = (
+            df['PATIENT'].astype(str) + '_' +
+            df['START'].astype(str) + '_' +
+            df['CODE'].astype(str) +
+            optional_key_part(df, 'ENCOUNTER') +
+            optional_key_part(df, 'STOP')
+        )
+        
+        df['_observation_id'] = UUIDConverter.generic_ids(unique_strings)
+        df['_person_id'] = UUIDConverter.person_ids(df['PATIENT'])
+        return df
     
     def _filter_existing_patients(self, df: pd.DataFrame) -> pd.DataFrame:
         """Filter to only include patients that exist in person table"""
+        if self.context is not None:
+            return self.context.filter_existing_patients(df, 'PATIENT')
+        
         try:
             query = f"SELECT DISTINCT person_source_value FROM {self.db_manager.config.schema_cdm}.person"
             existing_persons = self.db_manager.execute_query(query)
@@ -451,47 +437,6 @@ class ObservationTransformer:
             print(f"⚠️ Error filtering patients: {e}")
             return df
     
-    def _lookup_visit_occurrence_id(self, encounter_uuid: str) -> Optional[int]:
-        """Lookup visit_occurrence_id based on encounter UUID"""
-        try:
-            visit_occurrence_id = UUIDConverter.visit_occurrence_id(encounter_uuid)
-            
-            query = f"""
-                SELECT visit_occurrence_id 
-                FROM {self.db_manager.config.schema_cdm}.visit_occurrence
-                WHERE visit_occurrence_id = %(visit_id)s
-                LIMIT 1
-            """
-            result = self.db_manager.execute_query(query, {'visit_id': visit_occurrence_id})
-            
-            return visit_occurrence_id if not result.empty else None
-                
-        except Exception as e:
-            return None
-    
-    def _parse_datetime(self, datetime_str: str) -> Optional[datetime]:
-        """Parse ISO datetime format from observation data"""
-        if pd.isna(datetime_str):
-            return None
-        
-        try:
-            return pd.to_datetime(datetime_str).to_pydatetime()
-        except:
-            return None
-    
-    def _parse_datetime_condition_format(self, date_str: str) -> Optional[datetime]:
-        """Parse DD/MM/YYYY date format from condition data"""
-        if pd.isna(date_str):
-            return None
-        
-        try:
-            return pd.to_datetime(date_str, format='%d/%m/%Y').to_pydatetime()
-        except:
-            try:
-                return pd.to_datetime(date_str).to_pydatetime()
-            except:
-                return None
-    
     def _fix_data_types(self, df: pd.DataFrame) -> pd.DataFrame:
         """Fix data types for database compatibility"""
         
@@ -1,13 +1,15 @@
 import pandas as pd
-import hashlib
-from datetime import datetime
 from typing import Optional
+from src.utils.uuid_converter import UUIDConverter
+from src.utils.date_parser import parse_datetime_series
+from src.pipeline.run_context import RunContext, LOCATION_KEY_COLUMNS, location_keys
 
 class PersonTransformer:
     """Simple Person transformer with hardcoded concept mappings"""
     
-    def __init__(self, db_manager=None):
+    def __init__(self, db_manager=None, context: Optional[RunContext] = None):
         self.db_manager = db_manager  # Add this line
+        self.context = context
         
         # Hardcoded OMOP concept mappings (these are standard and won't change)
         self.gender_concepts = {
@@ -32,134 +34,87 @@ class PersonTransformer:
         
         print(f"🔄 Transforming {len(patients_df)} patients to OMOP Person format...")
         
-        omop_persons = []
+        # Patients without a parseable birth date are skipped
+        birth_datetime = parse_datetime_series(patients_df['BIRTHDATE'], dayfirst_format=True)
+        valid = birth_datetime.notna()
+        patients_df = patients_df[valid]
+        birth_datetime = birth_datetime[valid]
         
-        for idx, patient in patients_df.iterrows():
-            try:
-                person_record = self._transform_patient(patient)
-                if person_record:
-                    omop_persons.append(person_record)
-            except Exception as e:
-                print(f"⚠️ Error with patient {patient['Id']}: {e}")
-                continue
-        
-        if not omop_persons:
+        if patients_df.empty:
             print("❌ No valid records created")
             return pd.DataFrame()
         
-        result_df = pd.DataFrame(omop_persons)
-        print(f"✅ Successfully transformed {len(result_df)} persons")
-        return result_df
-    
-    def _transform_patient(self, patient: pd.Series) -> Optional[dict]:
-        """Transform single patient to OMOP person record"""
-        
-        # Parse birth date
-        birth_date = self._parse_date(patient['BIRTHDATE'])
-        if not birth_date:
-            return None
-        
-        # Generate person_id
-        person_id = self._uuid_to_int(patient['Id'])
+        gender = patients_df['GENDER']
+        race = self._optional_column(patients_df, 'RACE')
+        ethnicity = self._optional_column(patients_df, 'ETHNICITY')
         
-        # Map concepts
-        gender_concept_id = self._map_gender(patient['GENDER'])
-        race_concept_id = self._map_race(patient.get('RACE', ''))
-        ethnicity_concept_id = self._map_ethnicity(patient.get('ETHNICITY', ''))
-        
-        # Lookup location_id based on patient address
-        location_id = self._lookup_location_id(patient) if self.db_manager else None
-        
-        # Create OMOP person record
-        return {
-            'person_id': person_id,
-            'gender_concept_id': gender_concept_id,
-            'year_of_birth': birth_date.year,
-            'month_of_birth': birth_date.month,
-            'day_of_birth': birth_date.day,
-            'birth_datetime': birth_date,
-            'race_concept_id': race_concept_id,
-            'ethnicity_concept_id': ethnicity_concept_id,
-            'location_id': location_id,  # Now populated!
+        result_df = pd.DataFrame({
+            'person_id': UUIDConverter.person_ids(patients_df['Id']),
+            'gender_concept_id': self._map_concepts(gender.astype(str).str.upper(), self.gender_concepts, 8551),
+            'year_of_birth': birth_datetime.dt.year.astype('int64'),
+            'month_of_birth': birth_datetime.dt.month.astype('int64'),
+            'day_of_birth': birth_datetime.dt.day.astype('int64'),
+            'birth_datetime': birth_datetime,
+            'race_concept_id': self._map_concepts(race.astype(str).str.lower(), self.race_concepts, 8552),
+            'ethnicity_concept_id': self._map_concepts(ethnicity.astype(str).str.lower(), self.ethnicity_concepts, 0),
+            'location_id': self._lookup_location_ids(patients_df) if self.db_manager or self.context else None,
             'provider_id': None,
             'care_site_id': None,
-            'person_source_value': patient['Id'],
-            'gender_source_value': str(patient['GENDER']),
+            'person_source_value': patients_df['Id'],
+            'gender_source_value': gender.astype(object).map(str),
             'gender_source_concept_id': 0,
-            'race_source_value': str(patient.get('RACE', '')),
+            'race_source_value': race.astype(object).map(str),
             'race_source_concept_id': 0,
-            'ethnicity_source_value': str(patient.get('ETHNICITY', '')),
+            'ethnicity_source_value': ethnicity.astype(object).map(str),
             'ethnicity_source_concept_id': 0,
-        }
+        }).reset_index(drop=True)
+        
+        print(f"✅ Successfully transformed {len(result_df)} persons")
+        return result_df
     
-    def _lookup_location_id(self, patient: pd.Series) -> Optional[int]:
-        """Lookup location_id based on patient address"""
-        # Check if patient has address data
-        required_address_fields = ['ADDRESS', 'CITY', 'STATE', 'ZIP']
-        if not all(field in patient.index for field in required_address_fields):
-            return None
-            
-        # Truncate address fields to match what we stored in location table
-        address = str(patient['ADDRESS'])[:50]
-        city = str(patient['CITY'])[:50]
-        state = str(patient['STATE'])[:2]
-        zip_code = str(patient['ZIP']).zfill(5)[:5]
+    @staticmethod
+    def _optional_column(df: pd.DataFrame, column: str) -> pd.Series:
+        """Column values, or empty strings when the column is absent"""
+        if column in df.columns:
+            return df[column]
+        return pd.Series('', index=df.index, dtype=object)
+    
+    @staticmethod
+    def _map_concepts(values: pd.Series, concepts: dict, default: int) -> pd.Series:
+        """Map normalized source values to concept_ids (default when missing or unknown)"""
+        return values.map(concepts).fillna(default).astype('int64')
+    
+    def _lookup_location_ids(self, patients_df: pd.DataFrame) -> pd.Series:
+        """
+        Resolve location_id for every patient with one fetch of the location table
+        (or the keys the run context recorded when location was loaded).
         
-        query = f"""
-            SELECT location_id FROM {self.db_manager.config.schema_cdm}.location
-            WHERE address_1 = %(address)s
-              AND city = %(city)s
-              AND state = %(state)s
-              AND zip = %(zip)s
-            LIMIT 1
+        Patient addresses are normalized the way LocationTransformer stores them
+        (truncated address/city, 2-char state, 5-char zip) and joined on that key.
         """
+        if not all(field in patients_df.columns for field in ['ADDRESS', 'CITY', 'STATE', 'ZIP']):
+            return pd.Series(pd.NA, index=patients_df.index, dtype='Int64')
+        
+        patient_keys = pd.DataFrame({
+            'address_1': patients_df['ADDRESS'].astype(object).map(str).str[:50],
+            'city': patients_df['CITY'].astype(object).map(str).str[:50],
+            'state': patients_df['STATE'].astype(object).map(str).str[:2],
+            'zip': patients_df['ZIP'].astype(object).map(str).str.zfill(5).str[:5]
+        }, index=patients_df.index)
+        
         try:
-            result = self.db_manager.execute_query(query, {
-                "address": address,
-                "city": city,
-                "state": state,
-                "zip": zip_code
-            })
-
-            if not result.empty:
-                return result.iloc[0]["location_id"]
+            if self.context is not None:
+                locations = self.context.locations()
             else:
-                return None
-        except Exception:
-            return None
-    
-    def _parse_date(self, date_str: str) -> Optional[datetime]:
-        """Parse DD/MM/YYYY date format"""
-        if pd.isna(date_str):
-            return None
+                locations = location_keys(self.db_manager.execute_query(f"""
+                    SELECT location_id, address_1, city, state, zip
+                    FROM {self.db_manager.config.schema_cdm}.location
+                """))
+        except Exception as e:
+            print(f"⚠️ Could not fetch locations: {e}")
+            return pd.Series(pd.NA, index=patients_df.index, dtype='Int64')
         
-        try:
-            return pd.to_datetime(date_str, format='%d/%m/%Y').to_pydatetime()
-        except:
-            try:
-                return pd.to_datetime(date_str).to_pydatetime()
-            except:
-                return None
-    
-    def _uuid_to_int(self, uuid_str: str) -> int:
-        """Convert UUID to integer safely within 32-bit signed integer range"""
-        raw_hash = int(hashlib.md5(str(uuid_str).encode()).hexdigest()[:8], 16)
-        return raw_hash % (2**31 - 1)
-    
-    def _map_gender(self, gender) -> int:
-        """Map gender to concept_id"""
-        if pd.isna(gender):
-            return 8551  # Unknown
-        return self.gender_concepts.get(str(gender).upper(), 8551)
-    
-    def _map_race(self, race) -> int:
-        """Map race to concept_id"""
-        if pd.isna(race) or race == '':
-            return 8552  # Unknown
-        return self.race_concepts.get(str(race).lower(), 8552)
-    
-    def _map_ethnicity(self, ethnicity) -> int:
-        """Map ethnicity to concept_id"""
-        if pd.isna(ethnicity) or ethnicity == '':
-            return 0  # Unknown
-        return self.ethnicity_concepts.get(str(ethnicity).lower(), 0)
\ No newline at end of file
+        matched = patient_keys.merge(locations, on=LOCATION_KEY_COLUMNS, how='left')
+        location_ids = pd.Series(matched['location_id'].values, index=patients_df.index).astype('Int64')
+        print(f"📍 Matched {location_ids.notna().sum()} of {len(location_ids)} patients to a location")
+        return location_ids
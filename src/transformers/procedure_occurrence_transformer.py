@@ -1,236 +1,298 @@
+import numpy as np
 import pandas as pd
-from datetime import datetime
 from typing import Optional, Dict
-from src.utils.uuid_converter import UUIDConverter
+from src.utils.uuid_converter import UUIDConverter, optional_key_part
+from src.vocabulary.vocabulary_service import VocabularyService
+from src.pipeline.run_context import RunContext
+from src.pipeline.encounter_resolver import EncounterResolver
+from src.utils.date_parser import parse_timestamp_series
+
+PROCEDURE_VOCABULARIES = ['SNOMED', 'LOINC', 'CPT4', 'HCPCS', 'ICD10PCS', 'ICD9Proc']
+
+PROCEDURE_REQUIRED_COLUMNS = ['START', 'PATIENT', 'CODE', 'DESCRIPTION']
+OBSERVATION_PROCEDURE_REQUIRED_COLUMNS = ['DATE', 'PATIENT', 'CODE', 'DESCRIPTION']
+
+PROCEDURE_OCCURRENCE_COLUMNS = [
+    'procedure_occurrence_id', 'person_id', 'procedure_concept_id', 'procedure_date',
+    'procedure_datetime', 'procedure_end_date', 'procedure_end_datetime',
+    'procedure_type_concept_id', 'modifier_concept_id', 'quantity', 'provider_id',
+    'visit_occurrence_id', 'visit_detail_id', 'procedure_source_value',
+    'procedure_source_concept_id', 'modifier_source_value'
+]
+
+# Standard vocabularies first, then source vocabularies (ICD10PCS / ICD9Proc are non-standard)
+PROCEDURE_VOCABULARY_PRIORITY = [
+    ('SNOMED', True),
+    ('LOINC', True),
+    ('CPT4', True),
+    ('HCPCS', True),
+    ('SNOMED', False),
+    ('LOINC', False),
+    ('CPT4', False),
+    ('HCPCS', False),
+    ('ICD10PCS', False),
+    ('ICD9Proc', False)
+]
 
 class ProcedureOccurrenceTransformer:
     """Transform procedure data and procedure observations to OMOP procedure_occurrence format"""
     
-    def __init__(self, db_manager=None):
+    def __init__(self, db_manager=None, vocabulary: Optional[VocabularyService] = None,
+                 context: Optional[RunContext] = None, debug: bool = False):
         self.db_manager = db_manager
+        self.vocabulary = vocabulary or (VocabularyService(db_manager) if db_manager else None)
+        # Person and visit sets shared across the run (queried here when absent)
+        self.context = context
+        # Encounter -> visit_occurrence_id, one hash join per transform call
+        self.encounters = EncounterResolver(db_manager, context)
+        
+        # Print every matched code while filtering and mapping
+        self.debug = debug
         
         # Standard procedure_type_concept_id for EHR data
         self.procedure_type_concept_id = 32817  # EHR
         
+        # Rows given a row number by the last transform call (for streamed chunks)
+        self.rows_numbered = 0
+        
         # Cache for concept lookups to avoid repeated queries
         self._concept_cache = {}
         self._source_concept_cache = {}
     
-    def transform_procedures(self, procedures_df: pd.DataFrame) -> pd.DataFrame:
-        """Transform procedure source data to OMOP procedure_occurrence format"""
-        
-        print(f"🔄 Transforming {len(procedures_df)} procedures to OMOP procedure_occurrence format...")
-        
-        # Drop procedures with missing required fields
-        required_cols = ['START', 'PATIENT', 'CODE', 'DESCRIPTION']
-        procedures_df = procedures_df.dropna(subset=required_cols)
+    def transform(self, procedures_df: pd.DataFrame, observations_df: pd.DataFrame,
+                  procedure_offset: int = 0, observation_offset: int = 0) -> pd.DataFrame:
+        """
+        Transform procedures and procedure observations to OMOP procedure_occurrence in one pass
+        
+        Both sources go through a single domain filter, patient filter, concept
+        preload and visit join. IDs are the same as transform_procedures and
+        transform_observation_procedures would give each source.
+        
+        Args:
+            procedures_df: Procedure source rows
+            observations_df: Observation source rows (only CATEGORY='procedure' is used)
+            procedure_offset: Procedure rows numbered by earlier chunks
+            observation_offset: Procedure observations numbered by earlier chunks
+        
+        Returns:
+            Procedure rows followed by observation procedure rows
+        """
+        self.rows_numbered = 0
+        
+        print(f"🔄 Transforming {len(procedures_df)} procedures and procedure observations from "
+              f"{len(observations_df)} observation records to OMOP procedure_occurrence format...")
+        
+        result_df = self._transform_sources(
+            self._valid_procedures(procedures_df), self._valid_observation_procedures(observations_df),
+            procedure_offset, observation_offset
+        )
+        if result_df.empty:
+            print("❌ No valid procedure occurrence records created")
+            return result_df
         
-        if procedures_df.empty:
-            print("❌ No valid procedures after filtering")
-            return pd.DataFrame()
+        print(f"✅ Successfully transformed {len(result_df)} procedure occurrences")
+        return result_df
+    
+    def transform_procedures(self, procedures_df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+        """
+        Transform procedure source data to OMOP procedure_occurrence format
         
-        # Filter to only valid procedure domain codes
-        if self.db_manager:
-            procedures_df = self._filter_procedure_domain(procedures_df)
-            print(f"✅ Filtered to {len(procedures_df)} records in Procedure domain")
+        Args:
+            procedures_df: Source rows (a whole table or one streamed chunk)
+            row_offset: Rows numbered by earlier chunks, so IDs continue across chunks
+        """
+        self.rows_numbered = 0
         
-        # Filter to only include patients that exist in person table
-        if self.db_manager:
-            procedures_df = self._filter_existing_patients(procedures_df)
-            print(f"✅ Filtered to {len(procedures_df)} procedures for existing patients")
+        print(f"🔄 Transforming {len(procedures_df)} procedures to OMOP procedure_occurrence format...")
         
-        # Pre-load concept mappings to avoid individual lookups
-        if self.db_manager:
-            self._preload_concept_mappings(procedures_df, code_column='CODE')
-        
-        procedure_records = []
-        total_records = len(procedures_df)
-        
-        print(f"🔄 Processing {total_records} procedure records...")
-        
-        for idx, (row_idx, procedure) in enumerate(procedures_df.iterrows()):
-            try:
-                # Print progress every 100 records
-                if idx % 100 == 0:
-                    print(f"   Progress: {idx}/{total_records} ({idx/total_records*100:.1f}%)")
-                
-                proc_record = self._transform_procedure_record(procedure, row_index=idx)
-                if proc_record:
-                    procedure_records.append(proc_record)
-            except Exception as e:
-                print(f"⚠️ Error with procedure {idx}: {e}")
-                continue
-        
-        if not procedure_records:
+        result_df = self._transform_sources(self._valid_procedures(procedures_df), None, procedure_offset=row_offset)
+        if result_df.empty:
             print("❌ No valid procedure occurrence records created")
-            return pd.DataFrame()
-        
-        result_df = pd.DataFrame(procedure_records)
-        
-        # Fix data types to ensure database compatibility
-        result_df = self._fix_data_types(result_df)
+            return result_df
         
         print(f"✅ Successfully transformed {len(result_df)} procedure occurrences")
         return result_df
     
-    def transform_observation_procedures(self, observations_df: pd.DataFrame) -> pd.DataFrame:
-        """Transform observation records with CATEGORY='procedure' to procedure_occurrence format"""
+    def transform_observation_procedures(self, observations_df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+        """
+        Transform observation records with CATEGORY='procedure' to procedure_occurrence format
+        
+        Args:
+            observations_df: Source rows (a whole table or one streamed chunk)
+            row_offset: Rows numbered by earlier chunks, so IDs continue across chunks
+        """
+        self.rows_numbered = 0
         
         print(f"🔄 Extracting procedure observations from {len(observations_df)} observation records...")
         
-        # Filter to only procedure category observations
-        procedure_obs = observations_df[observations_df['CATEGORY'] == 'procedure'].copy()
+        result_df = self._transform_sources(None, self._valid_observation_procedures(observations_df),
+                                            observation_offset=row_offset)
+        if result_df.empty:
+            print("❌ No valid procedure occurrence records created from observations")
+            return result_df
+        
+        print(f"✅ Successfully transformed {len(result_df)} observation procedures")
+        return result_df
+    
+    def _valid_procedures(self, procedures_df: pd.DataFrame) -> pd.DataFrame:
+        """Procedure rows with all required fields"""
+        procedures = procedures_df.dropna(subset=PROCEDURE_REQUIRED_COLUMNS) if not procedures_df.empty else procedures_df
+        if procedures.empty:
+            print("❌ No valid procedures after filtering")
+        return procedures
+    
+    def _valid_observation_procedures(self, observations_df: pd.DataFrame) -> pd.DataFrame:
+        """Observation rows with CATEGORY='procedure' and all required fields"""
+        if 'CATEGORY' not in observations_df.columns:
+            print("❌ No procedure observations found")
+            return observations_df.iloc[0:0]
         
+        procedure_obs = observations_df[observations_df['CATEGORY'] == 'procedure']
         if procedure_obs.empty:
             print("❌ No procedure observations found")
-            return pd.DataFrame()
+            return procedure_obs
         
         print(f"✅ Found {len(procedure_obs)} procedure observations")
         
-        # Drop observations with missing required fields
-        required_cols = ['DATE', 'PATIENT', 'CODE', 'DESCRIPTION']
-        procedure_obs = procedure_obs.dropna(subset=required_cols)
-        
+        procedure_obs = procedure_obs.dropna(subset=OBSERVATION_PROCEDURE_REQUIRED_COLUMNS)
         if procedure_obs.empty:
             print("❌ No valid procedure observations after filtering")
+        return procedure_obs
+    
+    def _transform_sources(self, procedures: Optional[pd.DataFrame], procedure_obs: Optional[pd.DataFrame],
+                           procedure_offset: int = 0, observation_offset: int = 0) -> pd.DataFrame:
+        """
+        Shared filter, concept, ID and visit stages for both procedure sources.
+        
+        Filtering runs on the patient and code columns of both sources at once;
+        IDs are then numbered per source over the rows that remain, exactly as
+        each source was numbered on its own.
+        """
+        sources = [
+            source if source is not None and not source.empty else pd.DataFrame(columns=['PATIENT', 'CODE'])
+            for source in (procedures, procedure_obs)
+        ]
+        if all(source.empty for source in sources):
             return pd.DataFrame()
         
-        # Filter to only valid procedure domain codes
-        if self.db_manager:
-            procedure_obs = self._filter_procedure_domain(procedure_obs)
-            print(f"✅ Filtered to {len(procedure_obs)} observation procedures in Procedure domain")
+        # Patient and code of every row, tagged with its source and position
+        keys = pd.concat([
+            pd.DataFrame({
+                'PATIENT': source['PATIENT'].to_numpy(),
+                'CODE': source['CODE'].to_numpy(),
+                '_source': i,
+                '_position': np.arange(len(source))
+            })
+            for i, source in enumerate(sources)
+        ], ignore_index=True)
         
-        # Filter to only include patients that exist in person table
         if self.db_manager:
-            procedure_obs = self._filter_existing_patients(procedure_obs)
-            print(f"✅ Filtered to {len(procedure_obs)} observation procedures for existing patients")
+            # Filter to only valid procedure domain codes
+            keys = self._filter_procedure_domain(keys)
+            print(f"✅ Filtered to {len(keys)} records in Procedure domain")
+            
+            # Filter to only include patients that exist in person table
+            if not keys.empty:
+                keys = self._filter_existing_patients(keys)
+            print(f"✅ Filtered to {len(keys)} procedures for existing patients")
+            
+            # Pre-load concept mappings to avoid individual lookups
+            if not keys.empty:
+                self._preload_concept_mappings(keys, code_column='CODE')
         
-        # Pre-load concept mappings
-        if self.db_manager:
-            self._preload_concept_mappings(procedure_obs, code_column='CODE')
-        
-        procedure_records = []
-        total_records = len(procedure_obs)
-        
-        print(f"🔄 Processing {total_records} observation procedure records...")
-        
-        for idx, (row_idx, obs_procedure) in enumerate(procedure_obs.iterrows()):
-            try:
-                # Print progress every 100 records
-                if idx % 100 == 0:
-                    print(f"   Progress: {idx}/{total_records} ({idx/total_records*100:.1f}%)")
-                
-                proc_record = self._transform_observation_procedure_record(obs_procedure, row_index=idx)
-                if proc_record:
-                    procedure_records.append(proc_record)
-            except Exception as e:
-                print(f"⚠️ Error with observation procedure {idx}: {e}")
-                continue
-        
-        if not procedure_records:
-            print("❌ No valid procedure occurrence records created from observations")
+        if keys.empty:
+            return pd.DataFrame()
+        
+        procedures, procedure_obs = (
+            source.iloc[keys.loc[keys['_source'] == i, '_position'].to_numpy()]
+            for i, source in enumerate(sources)
+        )
+        
+        # Hash all IDs in one batch per source
+        if not procedures.empty:
+            procedures = self._assign_procedure_ids(procedures, procedure_offset)
+        if not procedure_obs.empty:
+            procedure_obs = self._assign_observation_procedure_ids(procedure_obs, observation_offset)
+        self.rows_numbered = len(procedures) + len(procedure_obs)
+        
+        print(f"🔄 Processing {self.rows_numbered} procedure records...")
+        
+        frames = []
+        if not procedures.empty:
+            # Dates - DD/MM/YYYY for procedures; an empty STOP means the procedure ends when it starts
+            start_datetime = parse_timestamp_series(procedures['START'], dayfirst_format=True)
+            stop = procedures.get('STOP', pd.Series(None, index=procedures.index, dtype=object))
+            end_datetime = parse_timestamp_series(stop, dayfirst_format=True).where(stop.notna(), start_datetime)
+            frames.append(self._build_procedures(procedures, start_datetime, end_datetime))
+        if not procedure_obs.empty:
+            # Single DATE field (ISO format), used as both start and end
+            proc_datetime = parse_timestamp_series(procedure_obs['DATE'])
+            frames.append(self._build_procedures(procedure_obs, proc_datetime, proc_datetime))
+        
+        result_df = pd.concat(frames, ignore_index=True)
+        if result_df.empty:
             return pd.DataFrame()
         
-        result_df = pd.DataFrame(procedure_records)
+        # One visit join for both sources
+        visits = self.encounters.resolve(result_df.pop('_encounter'))
+        result_df['visit_occurrence_id'] = visits['visit_occurrence_id']
         
         # Fix data types to ensure database compatibility
-        result_df = self._fix_data_types(result_df)
-        
-        print(f"✅ Successfully transformed {len(result_df)} observation procedures")
-        return result_df
+        return self._fix_data_types(result_df[PROCEDURE_OCCURRENCE_COLUMNS])
+    
+    def _build_procedures(self, df: pd.DataFrame, start_datetime: pd.Series, end_datetime: pd.Series) -> pd.DataFrame:
+        """Assemble procedure_occurrence rows from whole columns, dropping rows without a start date"""
+        valid = start_datetime.notna()
+        df = df[valid]
+        start_datetime = start_datetime[valid]
+        end_datetime = end_datetime[valid]
+        
+        codes = df['CODE'].astype(str)
+        
+        return pd.DataFrame({
+            'procedure_occurrence_id': df['_procedure_occurrence_id'],
+            'person_id': df['_person_id'],
+            'procedure_concept_id': codes.map(self._concept_cache).fillna(0).astype('int64'),
+            'procedure_date': start_datetime.dt.date,
+            'procedure_datetime': start_datetime,
+            'procedure_end_date': end_datetime.dt.date,
+            'procedure_end_datetime': end_datetime,
+            'procedure_type_concept_id': self.procedure_type_concept_id,
+            'modifier_concept_id': None,
+            'quantity': 1,  # Default to 1 procedure
+            'provider_id': None,
+            'visit_detail_id': None,
+            'procedure_source_value': df['DESCRIPTION'].astype(str).str[:50],
+            'procedure_source_concept_id': codes.map(self._source_concept_cache).fillna(0).astype('int64'),
+            'modifier_source_value': None,
+            '_encounter': df.get('ENCOUNTER', pd.Series(None, index=df.index, dtype=object))
+        })
     
     def _preload_concept_mappings(self, df: pd.DataFrame, code_column: str = 'CODE') -> None:
         """Pre-load all concept mappings to avoid individual lookups"""
-        if not self.db_manager:
+        if not self.vocabulary:
             return
             
         try:
             print("🔄 Pre-loading concept mappings with vocabulary priority...")
             
-            # Get unique codes
-            unique_codes = df[code_column].unique()
-            
-            if len(unique_codes) == 0:
+            if df[code_column].empty:
                 return
             
-            # Build query for all codes at once
-            code_list = "', '".join(str(code) for code in unique_codes)
-            
-            # Query with vocabulary priority to handle code collisions
-            query = f"""
-            WITH ranked_concepts AS (
-                SELECT 
-                    c.concept_code,
-                    c.concept_id as source_concept_id,
-                    c.concept_name,
-                    c.vocabulary_id,
-                    c.standard_concept,
-                    COALESCE(cr.concept_id_2, c.concept_id) as standard_concept_id,
-                    -- Priority ranking: prefer standard vocabularies first, then source vocabularies
-                    CASE 
-                        WHEN c.vocabulary_id = 'SNOMED' AND c.standard_concept = 'S' THEN 1
-                        WHEN c.vocabulary_id = 'LOINC' AND c.standard_concept = 'S' THEN 2
-                        WHEN c.vocabulary_id = 'CPT4' AND c.standard_concept = 'S' THEN 3
-                        WHEN c.vocabulary_id = 'HCPCS' AND c.standard_concept = 'S' THEN 4
-                        WHEN c.vocabulary_id = 'SNOMED' THEN 5
-                        WHEN c.vocabulary_id = 'LOINC' THEN 6
-                        WHEN c.vocabulary_id = 'CPT4' THEN 7
-                        WHEN c.vocabulary_id = 'HCPCS' THEN 8
-                        WHEN c.vocabulary_id = 'ICD10PCS' THEN 9  -- Non-standard source
-                        WHEN c.vocabulary_id = 'ICD9Proc' THEN 10  -- Non-standard source
-                        ELSE 99
-                    END as vocab_priority,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY c.concept_code 
-                        ORDER BY 
-                            CASE 
-                                WHEN c.vocabulary_id = 'SNOMED' AND c.standard_concept = 'S' THEN 1
-                                WHEN c.vocabulary_id = 'LOINC' AND c.standard_concept = 'S' THEN 2
-                                WHEN c.vocabulary_id = 'CPT4' AND c.standard_concept = 'S' THEN 3
-                                WHEN c.vocabulary_id = 'HCPCS' AND c.standard_concept = 'S' THEN 4
-                                WHEN c.vocabulary_id = 'SNOMED' THEN 5
-                                WHEN c.vocabulary_id = 'LOINC' THEN 6
-                                WHEN c.vocabulary_id = 'CPT4' THEN 7
-                                WHEN c.vocabulary_id = 'HCPCS' THEN 8
-                                WHEN c.vocabulary_id = 'ICD10PCS' THEN 9
-                                WHEN c.vocabulary_id = 'ICD9Proc' THEN 10
-                                ELSE 99 
-                            END,
-                            c.concept_id
-                    ) as rn
-                FROM {self.db_manager.config.schema_cdm}.concept c
-                LEFT JOIN {self.db_manager.config.schema_cdm}.concept_relationship cr 
-                    ON c.concept_id = cr.concept_id_1 
-                    AND cr.relationship_id = 'Maps to'
-                    AND cr.invalid_reason IS NULL
-                WHERE c.concept_code IN ('{code_list}')
-                  AND c.domain_id = 'Procedure'
-                  AND c.vocabulary_id IN ('SNOMED', 'LOINC', 'CPT4', 'HCPCS', 'ICD10PCS', 'ICD9Proc')
-                  AND c.invalid_reason IS NULL
+            # Vocabulary priority handles code collisions across vocabularies
+            mapping = self.vocabulary.concept_mapping(
+                df[code_column], domain='Procedure', vocabularies=PROCEDURE_VOCABULARIES,
+                priority=PROCEDURE_VOCABULARY_PRIORITY
             )
-            SELECT 
-                concept_code,
-                source_concept_id,
-                concept_name,
-                vocabulary_id,
-                standard_concept_id
-            FROM ranked_concepts 
-            WHERE rn = 1
-            """
             
-            result = self.db_manager.execute_query(query)
+            # Store both standard and source concept IDs
+            self._concept_cache.update(mapping['standard_concept_id'].to_dict())
+            self._source_concept_cache.update(mapping['source_concept_id'].to_dict())
             
-            # Build caches
-            for _, row in result.iterrows():
-                code = str(row['concept_code'])
-                # Store both standard and source concept IDs
-                self._concept_cache[code] = int(row['standard_concept_id'])
-                self._source_concept_cache[code] = int(row['source_concept_id'])
-                
-                # Log vocabulary used for debugging
-                vocab = row['vocabulary_id']
-                name = row['concept_name']
-                print(f"   Code {code}: {name} (from {vocab})")
+            # Log vocabulary used for debugging
+            if self.debug:
+                for code, concept_name, vocabulary_id in zip(mapping.index, mapping['concept_name'], mapping['vocabulary_id']):
+                    print(f"   Code {code}: {concept_name} (from {vocabulary_id})")
             
             print(f"✅ Pre-loaded {len(self._concept_cache)} concept mappings")
             
@@ -242,43 +304,17 @@ class ProcedureOccurrenceTransformer:
         """Filter to only include codes that belong to the Procedure domain"""
         try:
             print("🔍 Validating codes against OMOP vocabulary for Procedure domain...")
+            print(f"📊 Checking {df['CODE'].nunique()} unique codes...")
             
-            # Get unique codes from the data
-            unique_codes = df['CODE'].unique()
-            print(f"📊 Checking {len(unique_codes)} unique codes...")
-            
-            # Process codes in smaller batches to avoid memory issues
-            batch_size = 100
-            valid_codes_set = set()
-            
-            for i in range(0, len(unique_codes), batch_size):
-                batch_codes = unique_codes[i:i+batch_size]
-                code_list = "', '".join(batch_codes.astype(str))
-                
-                domain_query = f"""
-                SELECT DISTINCT 
-                    c.concept_code,
-                    c.concept_id,
-                    c.concept_name,
-                    c.domain_id,
-                    c.vocabulary_id,
-                    c.standard_concept
-                FROM {self.db_manager.config.schema_cdm}.concept c
-                WHERE c.concept_code IN ('{code_list}')
-                  AND c.domain_id = 'Procedure'
-                  AND c.vocabulary_id IN ('SNOMED', 'LOINC', 'CPT4', 'HCPCS', 'ICD10PCS', 'ICD9Proc')
-                  AND c.invalid_reason IS NULL
-                """
-                
-                batch_valid_codes = self.db_manager.execute_query(domain_query)
-                if not batch_valid_codes.empty:
-                    valid_codes_set.update(batch_valid_codes['concept_code'].astype(str))
-                    # Log found codes
-                    for _, row in batch_valid_codes.iterrows():
-                        print(f"   ✅ Found: {row['concept_code']} -> {row['concept_name']} ({row['vocabulary_id']})")
-                
-                print(f"   Processed batch {i//batch_size + 1}/{(len(unique_codes)-1)//batch_size + 1}")
+            valid_codes = self.vocabulary.valid_codes(
+                df['CODE'], domain='Procedure', vocabularies=PROCEDURE_VOCABULARIES
+            )
+            # Log found codes
+            if self.debug:
+                for code, concept_name, vocabulary_id in zip(valid_codes['concept_code'], valid_codes['concept_name'], valid_codes['vocabulary_id']):
+                    print(f"   ✅ Found: {code} -> {concept_name} ({vocabulary_id})")
             
+            valid_codes_set = set(valid_codes['concept_code'])
             if not valid_codes_set:
                 print("⚠️ No valid procedure codes found in OMOP vocabulary")
                 return pd.DataFrame()
@@ -299,120 +335,46 @@ class ProcedureOccurrenceTransformer:
             print("⚠️ Proceeding without domain validation")
             return df
     
-    def _transform_procedure_record(self, procedure: pd.Series, row_index: int = 0) -> Optional[dict]:
-        """Transform single procedure record to OMOP procedure_occurrence format"""
-        
-        # Parse dates - handle DD/MM/YYYY format for procedures
-        start_datetime = self._parse_datetime_procedure_format(procedure['START'])
-        end_datetime = self._parse_datetime_procedure_format(procedure.get('STOP')) if pd.notna(procedure.get('STOP')) else start_datetime
-        
-        if not start_datetime:
-            return None
-        
-        # Generate unique procedure_occurrence_id
-        unique_string = f"{procedure['PATIENT']}_{procedure['START']}_{procedure['CODE']}"
-        
-        # Add encounter if available for additional uniqueness
-        if pd.notna(procedure.get('ENCOUNTER')):
-            unique_string += f"_{procedure['ENCOUNTER']}"
-        
-        # Add row index as final guarantee of uniqueness
-        unique_string += f"_row_{row_index}"
-        
-        procedure_occurrence_id = UUIDConverter.generic_id(unique_string)
-        person_id = UUIDConverter.person_id(procedure['PATIENT'])
-        
-        # Look up visit_occurrence_id if encounter is provided
-        visit_occurrence_id = None
-        if pd.notna(procedure.get('ENCOUNTER')) and self.db_manager:
-            visit_occurrence_id = self._lookup_visit_occurrence_id(procedure['ENCOUNTER'])
-        
-        # Map procedure concept using cache
-        procedure_concept_id = self._get_cached_concept_id(procedure['CODE'])
-        procedure_source_concept_id = self._get_cached_source_concept_id(procedure['CODE'])
-        
-        return {
-            'procedure_occurrence_id': procedure_occurrence_id,
-            'person_id': person_id,
-            'procedure_concept_id': procedure_concept_id,
-            'procedure_date': start_datetime.date(),
-            'procedure_datetime': start_datetime,
-            'procedure_end_date': end_datetime.date() if end_datetime else None,
-            'procedure_end_datetime': end_datetime,
-            'procedure_type_concept_id': self.procedure_type_concept_id,
-            'modifier_concept_id': None,
-            'quantity': 1,  # Default to 1 procedure
-            'provider_id': None,
-            'visit_occurrence_id': visit_occurrence_id,
-            'visit_detail_id': None,
-            'procedure_source_value': str(procedure['DESCRIPTION'])[:50],
-            'procedure_source_concept_id': procedure_source_concept_id,
-            'modifier_source_value': None
-        }
-    
-    def _transform_observation_procedure_record(self, obs_procedure: pd.Series, row_index: int = 0) -> Optional[dict]:
-        """Transform observation procedure record to OMOP procedure_occurrence format"""
-        
-        # Parse date (single DATE field, use as both start and end) - ISO format for observations
-        proc_datetime = self._parse_datetime_iso_format(obs_procedure['DATE'])
-        if not proc_datetime:
-            return None
-        
-        # Generate unique procedure_occurrence_id
-        unique_string = f"{obs_procedure['PATIENT']}_{obs_procedure['DATE']}_{obs_procedure['CODE']}"
-        
-        # Add value to make it unique when same code appears multiple times
-        if pd.notna(obs_procedure.get('VALUE')):
-            unique_string += f"_{obs_procedure['VALUE']}"
-        
-        # Add encounter if available for additional uniqueness
-        if pd.notna(obs_procedure.get('ENCOUNTER')):
-            unique_string += f"_{obs_procedure['ENCOUNTER']}"
-        
-        # Add row index as final guarantee of uniqueness
-        unique_string += f"_obs_row_{row_index}"
-        
-        procedure_occurrence_id = UUIDConverter.generic_id(unique_string)
-        person_id = UUIDConverter.person_id(obs_procedure['PATIENT'])
-        
-        # Look up visit_occurrence_id if encounter is provided
-        visit_occurrence_id = None
-        if pd.notna(obs_procedure.get('ENCOUNTER')) and self.db_manager:
-            visit_occurrence_id = self._lookup_visit_occurrence_id(obs_procedure['ENCOUNTER'])
-        
-        # Map procedure concept using cache
-        procedure_concept_id = self._get_cached_concept_id(obs_procedure['CODE'])
-        procedure_source_concept_id = self._get_cached_source_concept_id(obs_procedure['CODE'])
-        
-        return {
-            'procedure_occurrence_id': procedure_occurrence_id,
-            'person_id': person_id,
-            'procedure_concept_id': procedure_concept_id,
-            'procedure_date': proc_datetime.date(),
-            'procedure_datetime': proc_datetime,
-            'procedure_end_date': proc_datetime.date(),  # Same as start for observation procedures
-            'procedure_end_datetime': proc_datetime,     # Same as start for observation procedures
-            'procedure_type_concept_id': self.procedure_type_concept_id,
-            'modifier_concept_id': None,
-            'quantity': 1,  # Default to 1 procedure
-            'provider_id': None,
-            'visit_occurrence_id': visit_occurrence_id,
-            'visit_detail_id': None,
-            'procedure_source_value': str(obs_procedure['DESCRIPTION'])[:50],
-            'procedure_source_concept_id': procedure_source_concept_id,
-            'modifier_source_value': None
-        }
-    
-    def _get_cached_concept_id(self, code: str) -> int:
-        """Get standard concept ID from cache or return 0"""
-        return self._concept_cache.get(str(code), 0)
+    def _assign_procedure_ids(self, df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+        """Batch-generate procedure_occurrence_id and person_id for procedure rows"""
+        df = df.copy()
+        
+        # patient, start, code, encounter when present, and the row position
+        unique_strings = (
+            df['PATIENT'].astype(str) + '_' +
+            df['START'].astype(str) + '_' +
+            df['CODE'].astype(str) +
+            optional_key_part(df, 'ENCOUNTER') +
+            '_row_' + pd.Series(range(row_offset, row_offset + len(df)), index=df.index).astype(str)
+        )
+        
+        df['_procedure_occurrence_id'] = UUIDConverter.generic_ids(unique_strings)
+        df['_person_id'] = UUIDConverter.person_ids(df['PATIENT'])
+        return df
     
-    def _get_cached_source_concept_id(self, code: str) -> int:
-        """Get source concept ID from cache or return 0"""
-        return self._source_concept_cache.get(str(code), 0)
+    def _assign_observation_procedure_ids(self, df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+        """Batch-generate procedure_occurrence_id and person_id for procedure observations"""
+        df = df.copy()
+        
+        # patient, date, code, value and encounter when present, and the row position
+        unique_strings = (
+            df['PATIENT'].astype(str) + '_' +
+            df['DATE'].astype(str) + '_' +
+            df['CODE'].astype(str) +
+            optional_key_part(df, 'VALUE') +
+            optional_key_part(df, 'ENCOUNTER') +
+            '_obs_row_' + pd.Series(range(row_offset, row_offset + len(df)), index=df.index).astype(str)
+        )
+        
+        df['_procedure_occurrence_id'] = UUIDConverter.generic_ids(unique_strings)
+        df['_person_id'] = UUIDConverter.person_ids(df['PATIENT'])
+        return df
     
     def _filter_existing_patients(self, df: pd.DataFrame) -> pd.DataFrame:
         """Filter to only include patients that exist in person table"""
+        if self.context is not None:
+            return self.context.filter_existing_patients(df, 'PATIENT')
+        
         try:
             query = f"SELECT DISTINCT person_source_value FROM {self.db_manager.config.schema_cdm}.person"
             existing_persons = self.db_manager.execute_query(query)
@@ -430,50 +392,6 @@ class ProcedureOccurrenceTransformer:
             print(f"⚠️ Error filtering patients: {e}")
             return df
     
-    def _lookup_visit_occurrence_id(self, encounter_uuid: str) -> Optional[int]:
-        """Lookup visit_occurrence_id based on encounter UUID"""
-        try:
-            visit_occurrence_id = UUIDConverter.visit_occurrence_id(encounter_uuid)
-            
-            query = f"""
-                SELECT visit_occurrence_id 
-                FROM {self.db_manager.config.schema_cdm}.visit_occurrence
-                WHERE visit_occurrence_id = %(visit_id)s
-                LIMIT 1
-            """
-            result = self.db_manager.execute_query(query, {'visit_id': visit_occurrence_id})
-            
-            return visit_occurrence_id if not result.empty else None
-                
-        except Exception as e:
-            return None
-    
-    def _parse_datetime_procedure_format(self, date_str: str) -> Optional[datetime]:
-        """Parse procedure date format (likely DD/MM/YYYY or similar)"""
-        if pd.isna(date_str):
-            return None
-        
-        try:
-            # Try DD/MM/YYYY format first
-            return pd.to_datetime(date_str, format='%d/%m/%Y').to_pydatetime()
-        except:
-            try:
-                # Fallback to auto-parsing
-                return pd.to_datetime(date_str).to_pydatetime()
-            except:
-                return None
-    
-    def _parse_datetime_iso_format(self, datetime_str: str) -> Optional[datetime]:
-        """Parse ISO datetime format from observation data"""
-        if pd.isna(datetime_str):
-            return None
-        
-        try:
-            # Handle ISO format: 2015-10-21T13:30:04Z
-            return pd.to_datetime(datetime_str).to_pydatetime()
-        except:
-            return None
-    
     def _fix_data_types(self, df: pd.DataFrame) -> pd.DataFrame:
         """Fix data types for database compatibility"""
         
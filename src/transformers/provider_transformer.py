@@ -1,6 +1,6 @@
 import pandas as pd
-import hashlib
 from src.database.connection import DatabaseManager
+from src.utils.uuid_converter import UUIDConverter
 
 
 class ProviderTransformer:
@@ -14,7 +14,7 @@ class ProviderTransformer:
         df["ZIP"] = df["ZIP"].astype(str).str.zfill(5)
 
         # Convert UUID to deterministic integer using hash
-        df["provider_id"] = df["Id"].apply(self._uuid_to_int)
+        df["provider_id"] = UUIDConverter.provider_ids(df["Id"])
         
         # Keep original UUID as source value
         df["provider_source_value"] = df["Id"].astype(str)
@@ -37,8 +37,8 @@ class ProviderTransformer:
 
         # Convert organization UUID to care_site_id (direct mapping - no lookup needed)
         # Note: In OMOP CDM, provider links to location through care_site, not directly
-        df["care_site_id"] = df["organization_uuid"].apply(
-            lambda x: self._uuid_to_int(x) if pd.notna(x) and x != "" else None
+        df["care_site_id"] = UUIDConverter.optional_ids(
+            df["organization_uuid"].where(df["organization_uuid"] != ""), UUIDConverter.care_site_ids
         )
 
         df_omop = df[[
@@ -53,15 +53,6 @@ class ProviderTransformer:
 
         return df_omop
 
-    def _uuid_to_int(self, uuid_str: str) -> int:
-        """Convert UUID string to deterministic 32-bit signed integer"""
-        # Use first 4 bytes of MD5 hash to create 32-bit integer
-        hash_bytes = hashlib.md5(str(uuid_str).encode()).digest()[:4]
-        # Convert to signed 32-bit integer to avoid database issues
-        unsigned_int = int.from_bytes(hash_bytes, byteorder='big', signed=False)
-        # Convert to signed 32-bit range (0 to 2^31-1)
-        return unsigned_int % 2147483647 + 1
-
     def _lookup_location_id(self, row):
         """Lookup location_id using address information (foreign key)"""
         # Apply same truncation as LocationTransformer to ensure matching
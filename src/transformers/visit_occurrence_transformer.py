@@ -1,14 +1,18 @@
+import numpy as np
 import pandas as pd
-import hashlib
-from datetime import datetime
 from typing import Optional
 from src.utils.uuid_converter import UUIDConverter
+from src.utils.date_parser import parse_timestamp_series
+from src.pipeline.run_context import RunContext
+
+VISIT_REQUIRED_COLUMNS = ['Id', 'START', 'STOP', 'PATIENT', 'ENCOUNTERCLASS']
 
 class VisitOccurrenceTransformer:
     """Transform encounter data to OMOP visit_occurrence format"""
     
-    def __init__(self, db_manager=None):
+    def __init__(self, db_manager=None, context: Optional[RunContext] = None):
         self.db_manager = db_manager
+        self.context = context
         
         # OMOP visit concept mappings for Synthea encounter classes
         self.visit_concepts = {
@@ -37,43 +41,76 @@ class VisitOccurrenceTransformer:
         print(f"🔄 Transforming {len(encounters_df)} encounters to OMOP visit_occurrence format...")
         
         # Drop encounters with missing required fields
-        required_cols = ['Id', 'START', 'STOP', 'PATIENT', 'ENCOUNTERCLASS']
-        encounters_df = encounters_df.dropna(subset=required_cols)
+        encounters_df = encounters_df.dropna(subset=VISIT_REQUIRED_COLUMNS)
         
         if encounters_df.empty:
             print("❌ No valid encounters after filtering")
             return pd.DataFrame()
         
         # Filter encounters to only include patients that exist in person table
-        if self.db_manager:
+        if self.db_manager or self.context:
             encounters_df = self._filter_existing_patients(encounters_df)
             print(f"✅ Filtered to {len(encounters_df)} encounters for existing patients")
         
-        visit_occurrences = []
-        
-        for idx, encounter in encounters_df.iterrows():
-            try:
-                visit_record = self._transform_encounter(encounter)
-                if visit_record:
-                    visit_occurrences.append(visit_record)
-            except Exception as e:
-                print(f"⚠️ Error with encounter {encounter['Id']}: {e}")
-                continue
+        # Hash all IDs in one batch
+        encounters_df = self._assign_ids(encounters_df)
         
-        if not visit_occurrences:
+        result_df = self._build_visits(encounters_df)
+        if result_df.empty:
             print("❌ No valid visit occurrence records created")
             return pd.DataFrame()
         
-        result_df = pd.DataFrame(visit_occurrences)
-        
         # Fix data types to ensure database compatibility
         result_df = self._fix_data_types(result_df)
         
         print(f"✅ Successfully transformed {len(result_df)} visit occurrences")
         return result_df
     
+    def _build_visits(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Build the visit_occurrence frame from whole columns, dropping rows whose START or STOP does not parse"""
+        start_datetime = parse_timestamp_series(df['START'])
+        end_datetime = parse_timestamp_series(df['STOP'])
+        valid = start_datetime.notna() & end_datetime.notna()
+        df = df[valid]
+        start_datetime = start_datetime[valid]
+        end_datetime = end_datetime[valid]
+        if df.empty:
+            return pd.DataFrame()
+        
+        encounter_classes = df['ENCOUNTERCLASS'].astype(str)
+        
+        return pd.DataFrame({
+            'visit_occurrence_id': df['_visit_occurrence_id'],
+            'person_id': df['_person_id'],
+            'visit_concept_id': self._map_visit_concepts(encounter_classes),
+            'visit_start_date': start_datetime.dt.date,
+            'visit_start_datetime': start_datetime,
+            'visit_end_date': end_datetime.dt.date,
+            'visit_end_datetime': end_datetime,
+            'visit_type_concept_id': self.visit_type_concept_id,  # 32817 (EHR)
+            'provider_id': df['_provider_id'],
+            'care_site_id': df['_care_site_id'],
+            'visit_source_value': encounter_classes,
+            'visit_source_concept_id': 0,  # No source concept mapping
+            'admitted_from_concept_id': None,  # Not available in Synthea
+            'admitted_from_source_value': None,  # Not available in Synthea
+            'discharged_to_concept_id': None,  # Not available in Synthea
+            'discharged_to_source_value': None,  # Not available in Synthea
+            'preceding_visit_occurrence_id': None  # Would need complex visit linking logic
+        }, index=df.index).reset_index(drop=True)
+    
+    def _map_visit_concepts(self, encounter_classes: pd.Series) -> np.ndarray:
+        """Map encounter classes to OMOP visit concept_ids (0 for unknown classes), once per distinct class"""
+        classes = encounter_classes.astype('category')
+        categories = classes.cat.categories
+        concepts = pd.Series(categories.str.lower(), index=categories).map(self.visit_concepts)
+        return concepts.fillna(0).astype('int64').to_numpy()[classes.cat.codes.to_numpy()]
+    
     def _filter_existing_patients(self, encounters_df: pd.DataFrame) -> pd.DataFrame:
         """Filter encounters to only include patients that exist in person table"""
+        if self.context is not None:
+            return self.context.filter_existing_patients(encounters_df)
+        
         try:
             # Get list of existing person_ids from database
             query = f"SELECT DISTINCT person_source_value FROM {self.db_manager.config.schema_cdm}.person"
@@ -98,6 +135,42 @@ class VisitOccurrenceTransformer:
             print("⚠️ Proceeding without patient filtering - may cause foreign key errors")
             return encounters_df
     
+    def _assign_ids(self, encounters_df: pd.DataFrame) -> pd.DataFrame:
+        """Batch-generate visit, person, care site and provider IDs"""
+        encounters_df = encounters_df.copy()
+        no_values = pd.Series(None, index=encounters_df.index, dtype=object)
+        
+        encounters_df['_visit_occurrence_id'] = UUIDConverter.visit_occurrence_ids(encounters_df['Id'])
+        encounters_df['_person_id'] = UUIDConverter.person_ids(encounters_df['PATIENT'])
+        encounters_df['_care_site_id'] = self._link_loaded(
+            UUIDConverter.optional_ids(encounters_df.get('ORGANIZATION', no_values), UUIDConverter.care_site_ids),
+            'care_site'
+        )
+        encounters_df['_provider_id'] = self._link_loaded(
+            UUIDConverter.optional_ids(encounters_df.get('PROVIDER', no_values), UUIDConverter.provider_ids),
+            'provider'
+        )
+        return encounters_df
+    
+    def _link_loaded(self, ids: pd.Series, table: str) -> pd.Series:
+        """
+        Keep only IDs present in the loaded provider or care_site table.
+        
+        One hash lookup against the key set in the run context; without a context (or if the keys cannot be read) the hashed IDs are kept.
+        """
+        if self.context is None:
+            return ids
+        
+        try:
+            loaded = self.context.provider_ids() if table == 'provider' else self.context.care_site_ids()
+        except Exception as e:
+            print(f"⚠️ Error loading {table} keys, keeping unchecked {table} IDs: {e}")
+            return ids
+        
+        linked = ids.where(ids.isin(loaded))
+        print(f"📊 {table.capitalize()} links: {linked.nunique()}/{ids.nunique()} distinct {table}s loaded")
+        return linked
+    
     def _fix_data_types(self, df: pd.DataFrame) -> pd.DataFrame:
         """Fix data types for database compatibility"""
         
@@ -141,64 +214,3 @@ class VisitOccurrenceTransformer:
                 df[col] = df[col].astype('string')
         
         return df
-    
-    def _transform_encounter(self, encounter: pd.Series) -> Optional[dict]:
-        """Transform single encounter to OMOP visit_occurrence record"""
-        
-        # Parse dates
-        start_datetime = self._parse_datetime(encounter['START'])
-        end_datetime = self._parse_datetime(encounter['STOP'])
-        
-        if not start_datetime or not end_datetime:
-            return None
-        
-        # Generate IDs using centralized UUID converter
-        visit_occurrence_id = UUIDConverter.visit_occurrence_id(encounter['Id'])
-        person_id = UUIDConverter.person_id(encounter['PATIENT'])
-        
-        # Map visit concept from encounter class
-        visit_concept_id = self._map_visit_concept(encounter['ENCOUNTERCLASS'])
-        
-        # Convert organization and provider UUIDs to IDs (if present)
-        care_site_id = UUIDConverter.care_site_id(encounter['ORGANIZATION']) if pd.notna(encounter.get('ORGANIZATION')) else None
-        provider_id = UUIDConverter.provider_id(encounter['PROVIDER']) if pd.notna(encounter.get('PROVIDER')) else None
-        
-        # Create OMOP visit_occurrence record
-        return {
-            'visit_occurrence_id': visit_occurrence_id,
-            'person_id': person_id,
-            'visit_concept_id': visit_concept_id,
-            'visit_start_date': start_datetime.date(),
-            'visit_start_datetime': start_datetime,
-            'visit_end_date': end_datetime.date(),
-            'visit_end_datetime': end_datetime,
-            'visit_type_concept_id': self.visit_type_concept_id,  # 32817 (EHR)
-            'provider_id': provider_id,
-            'care_site_id': care_site_id,
-            'visit_source_value': str(encounter['ENCOUNTERCLASS']),
-            'visit_source_concept_id': 0,  # No source concept mapping
-            'admitted_from_concept_id': None,  # Not available in Synthea
-            'admitted_from_source_value': None,  # Not available in Synthea
-            'discharged_to_concept_id': None,  # Not available in Synthea
-            'discharged_to_source_value': None,  # Not available in Synthea
-            'preceding_visit_occurrence_id': None  # Would need complex visit linking logic
-        }
-    
-    def _parse_datetime(self, datetime_str: str) -> Optional[datetime]:
-        """Parse ISO datetime format from Synthea"""
-        if pd.isna(datetime_str):
-            return None
-        
-        try:
-            # Synthea uses ISO format: 2018-06-22T23:55:48Z
-            return pd.to_datetime(datetime_str).to_pydatetime()
-        except:
-            return None
-    
-    def _map_visit_concept(self, encounter_class) -> int:
-        """Map encounter class to OMOP visit concept_id"""
-        if pd.isna(encounter_class):
-            return 0  # Unknown
-        
-        encounter_class_lower = str(encounter_class).lower()
-        return self.visit_concepts.get(encounter_class_lower, 0)  # Default to Unknown
\ No newline at end of file
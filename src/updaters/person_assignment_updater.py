@@ -1,85 +1,74 @@
-import pandas as pd
 from sqlalchemy import text
 from src.database.connection import DatabaseManager
 
+# Latest visit with a provider or care site per person (DISTINCT ON keeps the first
+# row of each person in the ORDER BY, the same row FIRST_VALUE picked). Unchanged
+# persons are skipped so the row count is the number of persons actually updated.
+ASSIGNMENT_UPDATE_SQL = """
+UPDATE {schema}.person AS p
+SET provider_id = v.provider_id,
+    care_site_id = v.care_site_id
+FROM (
+    SELECT DISTINCT ON (person_id) person_id, provider_id, care_site_id
+    FROM {schema}.visit_occurrence
+    WHERE (provider_id IS NOT NULL OR care_site_id IS NOT NULL){range_filter}
+    ORDER BY person_id, visit_start_date DESC, visit_start_datetime DESC, visit_occurrence_id DESC
+) v
+WHERE p.person_id = v.person_id
+  AND (p.provider_id IS DISTINCT FROM v.provider_id OR p.care_site_id IS DISTINCT FROM v.care_site_id)
+"""
+
+PERSON_RANGE_FILTER = "\n      AND person_id >= :low AND person_id < :high"
+
 
 class PersonAssignmentUpdater:
     """Update person table with provider and care site assignments from visit data"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, slices: int = 1):
+        """
+        Initialize person assignment updater.
+        
+        Args:
+            db_manager: Database connection manager
+            slices: Split the update into this many person_id ranges, each committed
+                on its own (keeps transactions and locks small on very large CDMs)
+        """
         self.db_manager = db_manager
+        self.slices = max(1, slices)
     
     def update_assignments(self) -> bool:
         """
         Update person table with provider_id and care_site_id based on visit_occurrence data.
         Uses the most recent visit for each patient to determine their primary provider and care site.
+        
+        The assignment runs inside PostgreSQL as one UPDATE ... FROM per slice, so no
+        visit or person rows are fetched and no statement is issued per person.
         """
         try:
             print("🔄 Updating person table with provider and care site assignments...")
             
-            # Get the most recent visit for each person
-            most_recent_visits_query = f"""
-            WITH most_recent_visits AS (
-                SELECT DISTINCT
-                    person_id,
-                    FIRST_VALUE(provider_id) OVER (
-                        PARTITION BY person_id 
-                        ORDER BY visit_start_date DESC, visit_start_datetime DESC
-                        ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
-                    ) as latest_provider_id,
-                    FIRST_VALUE(care_site_id) OVER (
-                        PARTITION BY person_id 
-                        ORDER BY visit_start_date DESC, visit_start_datetime DESC
-                        ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
-                    ) as latest_care_site_id
-                FROM {self.db_manager.config.schema_cdm}.visit_occurrence
-                WHERE provider_id IS NOT NULL 
-                   OR care_site_id IS NOT NULL
-            )
-            SELECT DISTINCT person_id, latest_provider_id, latest_care_site_id
-            FROM most_recent_visits
-            """
-            
-            print("📊 Finding most recent provider and care site for each patient...")
-            assignments = self.db_manager.execute_query(most_recent_visits_query)
-            
-            if assignments.empty:
-                print("⚠️ No visit data found to update person assignments")
-                return True
+            schema = self.db_manager.config.schema_cdm
+            if self.slices == 1:
+                ranges = [None]
+            else:
+                ranges = self._person_ranges(schema)
+                if not ranges:
+                    print("⚠️ No visit data found to update person assignments")
+                    return True
             
-            print(f"✅ Found assignments for {len(assignments)} patients")
-            
-            # Update person table in batches
             update_count = 0
-            batch_size = 100
-            
-            for i in range(0, len(assignments), batch_size):
-                batch = assignments.iloc[i:i+batch_size]
+            for number, person_range in enumerate(ranges, 1):
+                query = ASSIGNMENT_UPDATE_SQL.format(
+                    schema=schema, range_filter=PERSON_RANGE_FILTER if person_range else ""
+                )
+                params = {'low': person_range[0], 'high': person_range[1]} if person_range else {}
                 
-                for _, row in batch.iterrows():
-                    # Convert numpy types to native Python types to avoid psycopg2 adaptation errors
-                    person_id = int(row['person_id']) if pd.notna(row['person_id']) else None
-                    provider_id = int(row['latest_provider_id']) if pd.notna(row['latest_provider_id']) else None
-                    care_site_id = int(row['latest_care_site_id']) if pd.notna(row['latest_care_site_id']) else None
-                    
-                    # Update the person record
-                    update_query = f"""
-                    UPDATE {self.db_manager.config.schema_cdm}.person 
-                    SET provider_id = :provider_id,
-                        care_site_id = :care_site_id
-                    WHERE person_id = :person_id
-                    """
-                    
-                    with self.db_manager.engine.begin() as conn:
-                        conn.execute(text(update_query), {
-                            'provider_id': provider_id,
-                            'care_site_id': care_site_id,
-                            'person_id': person_id
-                        })
-                    
-                    update_count += 1
+                with self.db_manager.engine.begin() as conn:
+                    updated = conn.execute(text(query), params).rowcount
+                update_count += updated
                 
-                print(f"   ✅ Updated batch {i//batch_size + 1} ({len(batch)} records)")
+                if person_range:
+                    print(f"   ✅ Updated slice {number}/{len(ranges)} ({updated} records)")
             
             print(f"✅ Successfully updated {update_count} person records with provider/care site assignments")
             
@@ -92,6 +81,18 @@ class PersonAssignmentUpdater:
             print(f"❌ Failed to update person assignments: {e}")
             return False
     
+    def _person_ranges(self, schema: str) -> list:
+        """Half-open person_id ranges covering every visit's person, self.slices of them"""
+        bounds = self.db_manager.execute_query(
+            f"SELECT MIN(person_id) AS low, MAX(person_id) AS high FROM {schema}.visit_occurrence"
+        ).iloc[0]
+        if bounds.isna().any():
+            return []
+        
+        low, high = int(bounds['low']), int(bounds['high']) + 1
+        step = -(-(high - low) // self.slices)
+        return [(start, min(start + step, high)) for start in range(low, high, step)]
+    
     def _verify_updates(self):
         """Verify the person table updates"""
         try:
@@ -130,87 +131,5 @@ class PersonAssignmentUpdater:
             print(f"⚠️ Verification failed: {e}")
 
 
-# Alternative: More efficient bulk update approach
-class PersonAssignmentUpdaterBulk:
-    """More efficient version using bulk updates"""
-    
-    def __init__(self, db_manager: DatabaseManager):
-        self.db_manager = db_manager
-    
-    def update_assignments(self) -> bool:
-        """
-        Update person table using a single bulk UPDATE statement with JOIN.
-        More efficient for large datasets.
-        """
-        try:
-            print("🔄 Updating person table with provider and care site assignments (bulk method)...")
-            
-            # Single bulk update using WITH clause and UPDATE...FROM
-            bulk_update_query = f"""
-            WITH most_recent_visits AS (
-                SELECT DISTINCT
-                    person_id,
-                    FIRST_VALUE(provider_id) OVER (
-                        PARTITION BY person_id 
-                        ORDER BY visit_start_date DESC, visit_start_datetime DESC
-                        ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
-                    ) as latest_provider_id,
-                    FIRST_VALUE(care_site_id) OVER (
-                        PARTITION BY person_id 
-                        ORDER BY visit_start_date DESC, visit_start_datetime DESC
-                        ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
-                    ) as latest_care_site_id
-                FROM {self.db_manager.config.schema_cdm}.visit_occurrence
-                WHERE provider_id IS NOT NULL 
-                   OR care_site_id IS NOT NULL
-            ),
-            assignments AS (
-                SELECT DISTINCT person_id, latest_provider_id, latest_care_site_id
-                FROM most_recent_visits
-            )
-            UPDATE {self.db_manager.config.schema_cdm}.person 
-            SET 
-                provider_id = assignments.latest_provider_id,
-                care_site_id = assignments.latest_care_site_id
-            FROM assignments
-            WHERE person.person_id = assignments.person_id
-            """
-            
-            print("📊 Executing bulk update...")
-            with self.db_manager.engine.begin() as conn:
-                result = conn.execute(text(bulk_update_query))
-                update_count = result.rowcount
-            
-            print(f"✅ Successfully updated {update_count} person records with provider/care site assignments")
-            
-            # Verify the updates
-            self._verify_updates()
-            
-            return True
-            
-        except Exception as e:
-            print(f"❌ Failed to update person assignments: {e}")
-            return False
-    
-    def _verify_updates(self):
-        """Verify the person table updates"""
-        try:
-            verification_query = f"""
-            SELECT 
-                COUNT(*) as total_persons,
-                COUNT(provider_id) as persons_with_provider,
-                COUNT(care_site_id) as persons_with_care_site,
-                COUNT(CASE WHEN provider_id IS NOT NULL AND care_site_id IS NOT NULL THEN 1 END) as persons_with_both
-            FROM {self.db_manager.config.schema_cdm}.person
-            """
-            
-            result = self.db_manager.execute_query(verification_query).iloc[0]
-            
-            print("\n🔍 Person table update verification:")
-            print(f"  Total persons: {result['total_persons']}")
-            print(f"  With provider_id: {result['persons_with_provider']}")
-            print(f"  With care_site_id: {result['persons_with_care_site']}")
-            print(f"  With both: {result['persons_with_both']}")
-            
-        except Exception as e:
-            print(f"⚠️ Verification failed: {e}")
\ No newline at end of file
+# Earlier name of the set-based updater
+PersonAssignmentUpdaterBulk = PersonAssignmentUpdater
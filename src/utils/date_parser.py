@@ -0,0 +1,129 @@
+# src/utils/date_parser.py
+"""
+Shared parsing of Synthea date text.
+
+Synthea repeats the same timestamps many times (every observation of an
+encounter shares its DATE), so each distinct string is parsed once: scalar
+parsers are memoized and the Series parser works on unique values only.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+# Distinct date strings kept per parser
+DATE_CACHE_SIZE = 1 << 20
+
+DMY_FORMAT = '%d/%m/%Y'
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_iso(value) -> Optional[datetime]:
+    try:
+        return pd.to_datetime(value).to_pydatetime()
+    except:
+        return None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_dmy(value) -> Optional[datetime]:
+    try:
+        return pd.to_datetime(value, format=DMY_FORMAT).to_pydatetime()
+    except:
+        return _parse_iso(value)
+
+
+def parse_iso_datetime(value) -> Optional[datetime]:
+    """Parse ISO datetime text (2015-10-21T13:30:04Z); None when missing or invalid"""
+    if pd.isna(value):
+        return None
+    return _parse_iso(value)
+
+
+def parse_dmy_datetime(value) -> Optional[datetime]:
+    """Parse DD/MM/YYYY text, falling back to automatic parsing; None when missing or invalid"""
+    if pd.isna(value):
+        return None
+    return _parse_dmy(value)
+
+
+def parse_datetime_series(values: pd.Series, dayfirst_format: bool = False) -> pd.Series:
+    """
+    Vectorized datetime parsing that converts each distinct value once.
+
+    Args:
+        values: Raw date text
+        dayfirst_format: Try DD/MM/YYYY before automatic parsing
+
+    Returns:
+        datetime64 Series aligned with values; NaT where missing or invalid
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Index(uniques).astype(object)
+    if dayfirst_format:
+        parsed = pd.to_datetime(pd.Index([parse_dmy_datetime(value) for value in uniques], dtype=object),
+                                errors='coerce')
+    else:
+        parsed = pd.to_datetime(uniques, errors='coerce')
+
+    result = parsed.take(codes, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(result, index=values.index, name=values.name)
+
+
+def parse_timestamp_series(values: pd.Series, dayfirst_format: bool = False) -> pd.Series:
+    """
+    Datetime of each value as written (UTC offset dropped, time of day kept).
+
+    Distinct values are parsed in vectorized passes (DD/MM/YYYY then ISO 8601 when
+    dayfirst_format is set, ISO 8601 otherwise); the few neither strict format can
+    read go through the same scalar parsers as parse_*_datetime.
+
+    Args:
+        values: Raw date or datetime text
+        dayfirst_format: Try DD/MM/YYYY before automatic parsing
+
+    Returns:
+        Naive datetime64 Series aligned with values; NaT where missing or invalid
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Index(uniques).astype(object)
+    timestamps = pd.Series(pd.NaT, index=range(len(uniques)), dtype='datetime64[ns]')
+
+    # DD/MM/YYYY columns often hold ISO timestamps too, give those a vectorized pass as well
+    for date_format in ([DMY_FORMAT, 'ISO8601'] if dayfirst_format else ['ISO8601']):
+        missing = np.flatnonzero(timestamps.isna().to_numpy())
+        if len(missing) == 0:
+            break
+        try:
+            parsed = pd.to_datetime(uniques[missing], errors='coerce', format=date_format)
+            if parsed.tz is not None:
+                parsed = parsed.tz_localize(None)
+            timestamps.iloc[missing] = parsed.astype('datetime64[ns]')
+        except (ValueError, TypeError):  # e.g. offsets mixed with naive values
+            pass
+
+    scalar_parser = _parse_dmy if dayfirst_format else _parse_iso
+    for i in np.flatnonzero(timestamps.isna().to_numpy()):
+        parsed_value = scalar_parser(uniques[i])
+        if parsed_value is not None:
+            timestamps.iloc[i] = pd.Timestamp(parsed_value).tz_localize(None)
+
+    result = timestamps.to_numpy().take(codes)
+    result[codes == -1] = np.datetime64('NaT')
+    return pd.Series(result, index=values.index, name=values.name)
+
+
+def parse_date_series(values: pd.Series, dayfirst_format: bool = False) -> pd.Series:
+    """
+    Calendar date of each value as written (time of day and UTC offset dropped).
+
+    Args:
+        values: Raw date or datetime text
+        dayfirst_format: Try DD/MM/YYYY before automatic parsing
+
+    Returns:
+        datetime64 Series of midnights aligned with values; NaT where missing or invalid
+    """
+    return parse_timestamp_series(values, dayfirst_format).dt.normalize()
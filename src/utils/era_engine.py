@@ -0,0 +1,183 @@
+# src/utils/era_engine.py
+"""
+Shared era-collapsing engine.
+
+Condition, drug and dose eras all merge a person's records of the same kind into
+eras when the next record starts within gap_days of the end of the era so far.
+This does that gap-and-island computation for every person at once on sorted
+NumPy arrays: a running maximum of end dates per group, a gap flag where a record
+starts more than gap_days after it, segment numbers from the cumulative sum of
+the flags, and per-segment aggregates with ufunc.reduceat.
+
+era_sql() is the same computation as a PostgreSQL query, for building eras with
+INSERT ... SELECT without pulling the source rows into Python.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List
+
+ERA_MODE_PYTHON = "python"
+ERA_MODE_DATABASE = "database"
+ERA_MODES = (ERA_MODE_PYTHON, ERA_MODE_DATABASE)
+
+_DAY_NS = np.int64(86400 * 10**9)
+
+
+def _to_ns(values: pd.Series) -> np.ndarray:
+    """Dates of any type (datetime.date, datetime64, Timestamp) as int64 nanoseconds"""
+    return pd.to_datetime(values).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+
+def collapse_eras(records: pd.DataFrame, group_columns: List[str], start_column: str,
+                  end_column: str, gap_days: int, missing_end_days: int = 0) -> pd.DataFrame:
+    """
+    Collapse records into eras per group.
+
+    A record joins the current era when its start is at most gap_days after the
+    latest end date seen so far in the group. A missing end date is replaced by
+    the start date plus missing_end_days. The running end is taken across the
+    whole group, which matches a per-era running end whenever end dates do not
+    precede their start dates.
+
+    Args:
+        records: One row per occurrence/exposure
+        group_columns: Columns identifying a group (person, concept, ...)
+        start_column: Record start date column (must not be null)
+        end_column: Record end date column
+        gap_days: Maximum gap in days between eras to merge them
+        missing_end_days: Days added to the start date when the end date is missing
+
+    Returns:
+        DataFrame ordered by group then era start with the group columns and
+        era_start_date, era_end_date, record_count and gap_days. Era dates are the
+        original start/end values of the records, so their type is unchanged.
+    """
+    columns = group_columns + ['era_start_date', 'era_end_date', 'record_count', 'gap_days']
+    records = records.dropna(subset=group_columns)
+    if records.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Same group order as groupby(sort=True), start dates ascending within a group
+    records = records.sort_values(group_columns + [start_column], kind='mergesort')
+
+    starts = records[start_column]
+    ends = records[end_column]
+    missing = ends.isna()
+    if missing.any():
+        ends = ends.where(~missing, starts + pd.Timedelta(days=missing_end_days))
+
+    start_ns = _to_ns(starts)
+    end_ns = _to_ns(ends)
+    n = len(records)
+
+    # Group boundaries: first row of each (person, concept, ...) run
+    group_start = np.zeros(n, dtype=bool)
+    group_start[0] = True
+    for col in group_columns:
+        values = records[col].to_numpy()
+        group_start[1:] |= values[1:] != values[:-1]
+
+    # Running maximum of end dates within each group. Ends are replaced by their
+    # rank and each group is lifted above the previous one, so a single cumulative
+    # max never carries across a group boundary
+    group_id = np.cumsum(group_start) - 1
+    end_values, end_rank = np.unique(end_ns, return_inverse=True)
+    lift = group_id.astype(np.int64) * len(end_values)
+    running_end = end_values[np.maximum.accumulate(end_rank + lift) - lift]
+
+    # Gap from the era's end so far to each record's start (whole days, floored)
+    gaps = np.zeros(n, dtype=np.int64)
+    gaps[1:] = (start_ns[1:] - running_end[:-1]) // _DAY_NS
+    gaps[group_start] = 0
+
+    era_first = group_start | (gaps > gap_days)
+    era_starts = np.flatnonzero(era_first)
+    era_id = np.cumsum(era_first) - 1
+
+    # Positive gaps bridged inside an era
+    bridged = np.where(era_first, 0, np.maximum(gaps, 0))
+
+    era_end_ns = np.maximum.reduceat(end_ns, era_starts)
+    # Row holding each era's latest end, so the end keeps its original value and type
+    at_max = np.flatnonzero(end_ns == era_end_ns[era_id])
+    _, first_at_max = np.unique(era_id[at_max], return_index=True)
+    end_rows = at_max[first_at_max]
+
+    eras = {col: records[col].to_numpy()[era_starts] for col in group_columns}
+    eras['era_start_date'] = starts.to_numpy()[era_starts]
+    eras['era_end_date'] = ends.to_numpy()[end_rows]
+    eras['record_count'] = np.diff(np.append(era_starts, n))
+    eras['gap_days'] = np.add.reduceat(bridged, era_starts)
+
+    return pd.DataFrame(eras, columns=columns)
+
+
+def era_sql(source_sql: str, group_columns: List[str], start_column: str, end_column: str,
+            gap_days: int, missing_end_days: int = 0) -> str:
+    """
+    PostgreSQL query returning the eras collapse_eras() builds from the same rows.
+
+    The running end date is a window MAX over the preceding records of the group,
+    gap flags start a new era and a running SUM of the flags numbers the eras.
+    Start and end columns must be DATE.
+
+    Args:
+        source_sql: Query returning the group, start and end columns
+        group_columns: Columns identifying a group (person, concept, ...)
+        start_column: Record start date column
+        end_column: Record end date column
+        gap_days: Maximum gap in days between eras to merge them
+        missing_end_days: Days added to the start date when the end date is missing
+
+    Returns:
+        Query with the group columns, era_start_date, era_end_date, record_count,
+        gap_days and era_index (0-based position in collapse_eras() order)
+    """
+    groups = ", ".join(group_columns)
+    present = " AND ".join(f"{col} IS NOT NULL" for col in group_columns + [start_column])
+    return f"""
+    WITH era_source AS (
+        SELECT
+            {groups},
+            {start_column} AS start_date,
+            COALESCE({end_column}, {start_column} + {int(missing_end_days)}) AS end_date,
+            ROW_NUMBER() OVER (
+                PARTITION BY {groups} ORDER BY {start_column}, {end_column}
+            ) AS record_seq
+        FROM ({source_sql}) era_records
+        WHERE {present}
+    ),
+    era_running AS (
+        SELECT
+            era_source.*,
+            MAX(end_date) OVER (
+                PARTITION BY {groups} ORDER BY record_seq
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+            ) AS prior_end
+        FROM era_source
+    ),
+    era_flagged AS (
+        SELECT
+            era_running.*,
+            CASE WHEN prior_end IS NULL OR start_date - prior_end > {int(gap_days)} THEN 1 ELSE 0 END AS starts_era
+        FROM era_running
+    ),
+    era_numbered AS (
+        SELECT
+            era_flagged.*,
+            SUM(starts_era) OVER (
+                PARTITION BY {groups} ORDER BY record_seq ROWS UNBOUNDED PRECEDING
+            ) AS era_number
+        FROM era_flagged
+    )
+    SELECT
+        {groups},
+        MIN(start_date) AS era_start_date,
+        MAX(end_date) AS era_end_date,
+        COUNT(*) AS record_count,
+        SUM(CASE WHEN starts_era = 0 THEN GREATEST(start_date - prior_end, 0) ELSE 0 END) AS gap_days,
+        ROW_NUMBER() OVER (ORDER BY {groups}, MIN(start_date)) - 1 AS era_index
+    FROM era_numbered
+    GROUP BY {groups}, era_number
+    """
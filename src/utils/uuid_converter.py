@@ -1,4 +1,21 @@
 import hashlib
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional
+
+# Distinct values above which batch hashing is fanned out over a process pool
+PARALLEL_HASH_THRESHOLD = 500000
+
+# Modulus shared by the provider / care_site / visit / generic algorithms
+ID_MODULUS = 2147483647
+
+
+def _md5_prefix_bytes(strings: list, nbytes: int) -> bytes:
+    """Concatenated first nbytes of the MD5 digest of each string"""
+    md5 = hashlib.md5
+    return b"".join([md5(s.encode()).digest()[:nbytes] for s in strings])
 
 
 class UUIDConverter:
@@ -7,8 +24,15 @@ class UUIDConverter:
     
     This class provides consistent UUID-to-integer conversion methods
     to ensure foreign key relationships work correctly across all OMOP tables.
+    
+    Every scalar method has a batch counterpart (person_ids, provider_ids, ...)
+    that hashes a whole column at once and returns an int64 numpy array with
+    bit-identical values.
     """
     
+    # Worker processes used for very large columns (None = os.cpu_count())
+    max_workers: Optional[int] = None
+    
     @staticmethod
     def person_id(uuid_str: str) -> int:
         """
@@ -130,6 +154,152 @@ class UUIDConverter:
         unsigned_int = int.from_bytes(hash_bytes, byteorder='big', signed=False)
         return unsigned_int % 2147483647 + 1
 
+    
+    # ------------------------------------------------------------------
+    # Batch APIs
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def md5_prefixes(values: Iterable, nbytes: int = 4) -> np.ndarray:
+        """
+        Hash a column of values and return the big-endian integer of each digest prefix
+        
+        Values are converted with str() exactly like the scalar methods. Each distinct
+        value is hashed once; columns with more than PARALLEL_HASH_THRESHOLD distinct
+        values are split across a process pool.
+        
+        Args:
+            values: Series, array or iterable of values to hash
+            nbytes: Digest bytes to keep (4 or 8)
+            
+        Returns:
+            uint32 (nbytes=4) or uint64 (nbytes=8) array aligned with values
+        """
+        if nbytes not in (4, 8):
+            raise ValueError("nbytes must be 4 or 8")
+        
+        if not isinstance(values, (pd.Series, pd.Index, np.ndarray)):
+            values = list(values)
+        # Factorize the str() forms: values like 5 and 5.0 or 1 and True compare equal
+        # but hash differently on the scalar path
+        if not isinstance(getattr(values, 'dtype', None), pd.StringDtype):
+            values = np.array([str(value) for value in values], dtype=object)
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        strings = list(uniques)
+        
+        # Missing values get code -1; str() of each original gives 'None' / 'nan' like the scalar path
+        na_positions = np.flatnonzero(codes == -1)
+        if len(na_positions) > 0:
+            raw = np.asarray(values, dtype=object)
+            na_strings = pd.unique(np.array([str(raw[i]) for i in na_positions], dtype=object))
+            na_codes = {s: len(strings) + k for k, s in enumerate(na_strings)}
+            codes = codes.copy()
+            codes[na_positions] = [na_codes[str(raw[i])] for i in na_positions]
+            strings.extend(na_strings)
+        
+        digests = UUIDConverter._hash_strings(strings, nbytes)
+        prefixes = np.frombuffer(digests, dtype=f">u{nbytes}").astype(f"u{nbytes}")
+        return prefixes[codes]
+    
+    @staticmethod
+    def _hash_strings(strings: list, nbytes: int) -> bytes:
+        workers = UUIDConverter.max_workers or os.cpu_count() or 1
+        if len(strings) <= PARALLEL_HASH_THRESHOLD or workers <= 1:
+            return _md5_prefix_bytes(strings, nbytes)
+        
+        chunk = -(-len(strings) // workers)
+        slices = [strings[i:i + chunk] for i in range(0, len(strings), chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return b"".join(pool.map(_md5_prefix_bytes, slices, [nbytes] * len(slices)))
+    
+    @staticmethod
+    def person_ids(values: Iterable) -> np.ndarray:
+        """Batch person_id: int64 array in range 0 to 2^31-2"""
+        return (UUIDConverter.md5_prefixes(values, 4) % (2**31 - 1)).astype(np.int64)
+    
+    @staticmethod
+    def generic_ids(values: Iterable) -> np.ndarray:
+        """Batch generic_id: int64 array in range 1 to 2147483647"""
+        return (UUIDConverter.md5_prefixes(values, 4) % ID_MODULUS + 1).astype(np.int64)
+    
+    @staticmethod
+    def provider_ids(values: Iterable) -> np.ndarray:
+        """Batch provider_id (same algorithm as generic_id)"""
+        return UUIDConverter.generic_ids(values)
+    
+    @staticmethod
+    def care_site_ids(values: Iterable) -> np.ndarray:
+        """Batch care_site_id (same algorithm as generic_id)"""
+        return UUIDConverter.generic_ids(values)
+    
+    @staticmethod
+    def visit_occurrence_ids(values: Iterable) -> np.ndarray:
+        """Batch visit_occurrence_id (same algorithm as generic_id)"""
+        return UUIDConverter.generic_ids(values)
+    
+    @staticmethod
+    def optional_ids(values: pd.Series, id_func) -> pd.Series:
+        """
+        Apply a batch ID function to the non-null entries of a Series
+        
+        Args:
+            values: Source values (e.g. ENCOUNTER, PROVIDER)
+            id_func: Batch method such as UUIDConverter.visit_occurrence_ids
+            
+        Returns:
+            Nullable Int64 Series aligned with values (NA where the source is null)
+        """
+        result = pd.Series(pd.NA, index=values.index, dtype="Int64")
+        present = values.notna()
+        if present.any():
+            result[present] = id_func(values[present])
+        return result
+    
+    # ------------------------------------------------------------------
+    # SQL counterparts (PostgreSQL)
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def md5_prefix_sql(key_sql: str, nbytes: int = 4) -> str:
+        """
+        PostgreSQL expression equal to md5_prefixes() of a text expression
+        
+        Args:
+            key_sql: SQL text expression (already formatted like Python's str())
+            nbytes: Digest bytes to keep (4 or 8)
+            
+        Returns:
+            bigint (nbytes=4) or numeric (nbytes=8) SQL expression
+        """
+        if nbytes not in (4, 8):
+            raise ValueError("nbytes must be 4 or 8")
+        # Each 4-byte word is read separately so an 8-byte prefix cannot overflow bigint
+        words = [
+            f"('x' || lpad(substr(md5({key_sql}), {1 + 8 * i}, 8), 16, '0'))::bit(64)::bigint"
+            for i in range(nbytes // 4)
+        ]
+        if nbytes == 4:
+            return words[0]
+        return f"({words[0]}::numeric * 4294967296 + {words[1]})"
+    
+    @staticmethod
+    def generic_id_sql(key_sql: str, nbytes: int = 4) -> str:
+        """PostgreSQL expression equal to generic_ids() (or its 8-byte variant) of a text expression"""
+        return f"(mod({UUIDConverter.md5_prefix_sql(key_sql, nbytes)}, {ID_MODULUS}) + 1)::bigint"
+
+
+def optional_key_part(df: pd.DataFrame, column: str, prefix: str = "_") -> pd.Series:
+    """
+    Vectorized f"{prefix}{value}" for non-null values of a column, '' otherwise
+    
+    Mirrors the row-wise `if pd.notna(row.get(column)): key += f"_{row[column]}"`
+    pattern used to build deterministic ID strings.
+    """
+    if column not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    values = df[column]
+    return (prefix + values.astype(str)).where(values.notna(), "")
+
 
 # Convenience functions for backward compatibility
 def uuid_to_person_id(uuid_str: str) -> int:
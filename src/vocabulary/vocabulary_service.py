@@ -0,0 +1,404 @@
+# src/vocabulary/vocabulary_service.py
+"""
+Vocabulary Service
+
+Single in-memory view of the OMOP vocabulary slice used by a pipeline run.
+Concepts for the source codes seen by the transformers are fetched once (together
+with their "Maps to" targets) and every lookup is answered with vectorized
+pandas operations instead of per-transformer concept SQL. When a VocabularySnapshot
+is attached, concepts are read from the memory-mapped snapshot instead of PostgreSQL.
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from src.database.connection import DatabaseManager
+from src.vocabulary.vocabulary_snapshot import VocabularySnapshot
+
+CONCEPT_COLUMNS: List[str] = [
+    "concept_id",
+    "concept_code",
+    "concept_name",
+    "vocabulary_id",
+    "domain_id",
+    "standard_concept",
+    "maps_to_concept_id"
+]
+
+# (vocabulary_id, standard_only) pairs; the first matching entry gives a concept's rank
+VocabularyPriority = Sequence[Tuple[str, bool]]
+
+NO_PRIORITY = 99
+
+
+class VocabularyService:
+    """Indexed in-memory lookups over concept and "Maps to" relationships"""
+
+    def __init__(self, db_manager: DatabaseManager, fetch_batch_size: int = 10000,
+                 snapshot: Optional[VocabularySnapshot] = None):
+        """
+        Initialize vocabulary service.
+
+        Args:
+            db_manager: Database connection manager
+            fetch_batch_size: Maximum number of codes sent per concept query
+            snapshot: Optional on-disk snapshot used instead of querying the database
+        """
+        self.db_manager = db_manager
+        self.schema = db_manager.config.schema_vocab
+        self.fetch_batch_size = fetch_batch_size
+        self.snapshot = snapshot
+
+        self._lock = threading.RLock()
+        self._concepts = pd.DataFrame(columns=CONCEPT_COLUMNS)
+        self._loaded_codes = set()
+
+        self._unit_ids: Dict[str, int] = {}
+        self._loaded_units = set()
+
+        self._meas_values: Optional[pd.DataFrame] = None
+        self._value_concept_ids: Dict[str, float] = {}
+        self._name_search_cache: Dict[Tuple[str, str], Optional[pd.Series]] = {}
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def prefetch(self, codes: Iterable) -> None:
+        """Load concepts (and their "Maps to" targets) for any codes not seen yet"""
+        wanted = {str(code) for code in pd.unique(pd.Series(list(codes), dtype="object").dropna())}
+
+        with self._lock:
+            missing = sorted(wanted - self._loaded_codes)
+            if not missing:
+                return
+
+            print(f"🔄 Loading vocabulary for {len(missing)} new source codes "
+                  f"(schema={self.schema})...")
+
+            frames = [self._concepts] if not self._concepts.empty else []
+            for i in range(0, len(missing), self.fetch_batch_size):
+                batch = missing[i:i + self.fetch_batch_size]
+                frames.append(self._fetch_concepts(batch))
+
+            if frames:
+                concepts = pd.concat(frames, ignore_index=True)
+                concepts["concept_code"] = concepts["concept_code"].astype(str)
+                self._concepts = concepts.drop_duplicates(subset=["concept_id"]).reset_index(drop=True)
+
+            self._loaded_codes.update(missing)
+            print(f"✅ Vocabulary index holds {len(self._concepts)} concepts "
+                  f"for {len(self._loaded_codes)} source codes")
+
+    def _use_snapshot(self) -> bool:
+        """Open the snapshot on first use; fall back to direct queries if that fails"""
+        if self.snapshot is None:
+            return False
+        if not self.snapshot.is_open:
+            try:
+                self.snapshot.open()
+            except Exception as e:
+                print(f"⚠️ Vocabulary snapshot unavailable, querying {self.schema} directly: {e}")
+                self.snapshot = None
+                return False
+        return True
+
+    def _fetch_concepts(self, codes: List[str]) -> pd.DataFrame:
+        """Fetch valid concepts for a batch of codes with their smallest "Maps to" target"""
+        if self._use_snapshot():
+            return self.snapshot.concepts_for_codes(codes)
+
+        query = f"""
+        SELECT
+            c.concept_id,
+            c.concept_code,
+            c.concept_name,
+            c.vocabulary_id,
+            c.domain_id,
+            c.standard_concept,
+            MIN(cr.concept_id_2) AS maps_to_concept_id
+        FROM {self.schema}.concept c
+        LEFT JOIN {self.schema}.concept_relationship cr
+            ON c.concept_id = cr.concept_id_1
+            AND cr.relationship_id = 'Maps to'
+            AND cr.invalid_reason IS NULL
+        WHERE c.concept_code = ANY(%(codes)s)
+          AND c.invalid_reason IS NULL
+        GROUP BY c.concept_id, c.concept_code, c.concept_name,
+                 c.vocabulary_id, c.domain_id, c.standard_concept
+        """
+        return self.db_manager.execute_query(query, {"codes": codes})
+
+    # ------------------------------------------------------------------
+    # Code lookups
+    # ------------------------------------------------------------------
+
+    def concept_mapping(self, codes: Iterable, domain: Optional[str] = None,
+                        vocabularies: Optional[Sequence[str]] = None,
+                        priority: Optional[VocabularyPriority] = None,
+                        standard_only: bool = False) -> pd.DataFrame:
+        """
+        Resolve source codes to one concept each.
+
+        Args:
+            codes: Source codes (any iterable, duplicates allowed)
+            domain: Restrict to concepts of this domain_id
+            vocabularies: Restrict to these vocabulary_ids
+            priority: (vocabulary_id, standard_only) ranking used when a code matches
+                      several concepts; ties are broken by the lowest concept_id
+            standard_only: Restrict to standard concepts
+
+        Returns:
+            DataFrame indexed by concept_code with source_concept_id,
+            standard_concept_id (the "Maps to" target, else the concept itself),
+            concept_name and vocabulary_id
+        """
+        codes = pd.Series(list(codes), dtype="object").dropna().astype(str).unique()
+        self.prefetch(codes)
+
+        with self._lock:
+            concepts = self._concepts
+
+        candidates = concepts[concepts["concept_code"].isin(codes)]
+        if domain is not None:
+            candidates = candidates[candidates["domain_id"] == domain]
+        if vocabularies is not None:
+            candidates = candidates[candidates["vocabulary_id"].isin(vocabularies)]
+        if standard_only:
+            candidates = candidates[candidates["standard_concept"] == "S"]
+
+        candidates = candidates.assign(rank=self._rank(candidates, priority))
+        best = (candidates
+                .sort_values(["rank", "concept_id"], kind="mergesort")
+                .drop_duplicates(subset=["concept_code"], keep="first"))
+
+        mapping = pd.DataFrame({
+            "source_concept_id": best["concept_id"].astype("int64").values,
+            "standard_concept_id": best["maps_to_concept_id"].fillna(best["concept_id"]).astype("int64").values,
+            "concept_name": best["concept_name"].values,
+            "vocabulary_id": best["vocabulary_id"].values
+        }, index=pd.Index(best["concept_code"].values, name="concept_code"))
+        return mapping
+
+    def map_concepts(self, codes: pd.Series, **filters) -> pd.DataFrame:
+        """
+        Vectorized lookup aligned to the input Series.
+
+        Accepts the same filters as concept_mapping() and returns a DataFrame with
+        the input's index and int64 source_concept_id / standard_concept_id columns
+        (0 where the code has no concept).
+        """
+        keys = codes.astype(str)
+        mapping = self.concept_mapping(keys.unique(), **filters)
+        return pd.DataFrame({
+            "source_concept_id": keys.map(mapping["source_concept_id"]).fillna(0).astype("int64"),
+            "standard_concept_id": keys.map(mapping["standard_concept_id"]).fillna(0).astype("int64")
+        }, index=codes.index)
+
+    def valid_codes(self, codes: Iterable, domain: Optional[str] = None,
+                    vocabularies: Optional[Sequence[str]] = None,
+                    standard_only: bool = False) -> pd.DataFrame:
+        """Distinct (concept_code, concept_id, concept_name, vocabulary_id) rows matching the filters"""
+        codes = pd.Series(list(codes), dtype="object").dropna().astype(str).unique()
+        self.prefetch(codes)
+
+        with self._lock:
+            concepts = self._concepts
+
+        matches = concepts[concepts["concept_code"].isin(codes)]
+        if domain is not None:
+            matches = matches[matches["domain_id"] == domain]
+        if vocabularies is not None:
+            matches = matches[matches["vocabulary_id"].isin(vocabularies)]
+        if standard_only:
+            matches = matches[matches["standard_concept"] == "S"]
+
+        return matches[["concept_code", "concept_id", "concept_name", "vocabulary_id"]].reset_index(drop=True)
+
+    def in_domain(self, codes: pd.Series, domain: str,
+                  vocabularies: Optional[Sequence[str]] = None) -> pd.Series:
+        """Boolean mask of codes that have a valid concept in the given domain"""
+        keys = codes.astype(str)
+        valid = self.valid_codes(keys.unique(), domain=domain, vocabularies=vocabularies)
+        return keys.isin(set(valid["concept_code"]))
+
+    @staticmethod
+    def _rank(candidates: pd.DataFrame, priority: Optional[VocabularyPriority]) -> np.ndarray:
+        """Rank of each candidate concept under a vocabulary priority list (lower wins)"""
+        rank = np.full(len(candidates), NO_PRIORITY, dtype="int64")
+        if not priority or candidates.empty:
+            return rank
+
+        vocab = candidates["vocabulary_id"].values
+        standard = (candidates["standard_concept"] == "S").values
+        # Walk the list backwards so earlier entries overwrite later ones
+        for position in range(len(priority) - 1, -1, -1):
+            vocabulary_id, standard_only = priority[position]
+            mask = vocab == vocabulary_id
+            if standard_only:
+                mask &= standard
+            rank[mask] = position + 1
+        return rank
+
+    # ------------------------------------------------------------------
+    # Units and categorical values
+    # ------------------------------------------------------------------
+
+    def unit_concept_ids(self, units: pd.Series) -> pd.Series:
+        """Map unit strings to standard Unit concept_ids by concept_name (NaN when unknown)"""
+        names = units.dropna().astype(str).unique()
+
+        with self._lock:
+            missing = [name for name in names if name not in self._loaded_units]
+            if missing:
+                if self._use_snapshot():
+                    result = self.snapshot.concepts_by_name(missing, "Unit").sort_values("concept_id")
+                else:
+                    query = f"""
+                    SELECT concept_name, concept_id
+                    FROM {self.schema}.concept
+                    WHERE concept_name = ANY(%(names)s)
+                      AND domain_id = 'Unit'
+                      AND standard_concept = 'S'
+                      AND invalid_reason IS NULL
+                    ORDER BY concept_id
+                    """
+                    result = self.db_manager.execute_query(query, {"names": missing})
+                for name, concept_id in zip(result["concept_name"].astype(str), result["concept_id"]):
+                    self._unit_ids.setdefault(name, int(concept_id))
+                self._loaded_units.update(missing)
+                print(f"✅ Vocabulary index holds {len(self._unit_ids)} unit mappings")
+
+            unit_ids = dict(self._unit_ids)
+
+        return units.astype(str).map(unit_ids).where(units.notna())
+
+    def value_concept_ids(self, values: pd.Series) -> pd.Series:
+        """
+        Map categorical result strings to standard 'Meas Value' concepts.
+
+        An exact (case-insensitive) name match wins, otherwise the shortest concept
+        name containing the value. Returns NaN where nothing matches.
+        """
+        keys = values.dropna().astype(str).unique()
+
+        with self._lock:
+            missing = [key for key in keys if key not in self._value_concept_ids]
+            if missing:
+                names = self._load_meas_values()
+                lowered = names["name_lower"]
+                for key in missing:
+                    term = key.lower()
+                    exact = names[lowered == term]
+                    if not exact.empty:
+                        self._value_concept_ids[key] = float(exact["concept_id"].iloc[0])
+                        continue
+                    contains = names[lowered.str.contains(term, regex=False)]
+                    self._value_concept_ids[key] = float(contains["concept_id"].iloc[0]) if not contains.empty else np.nan
+
+            value_ids = dict(self._value_concept_ids)
+
+        return values.astype(str).map(value_ids).where(values.notna())
+
+    def _load_meas_values(self) -> pd.DataFrame:
+        """Load the (small) set of standard 'Meas Value' concepts ordered for matching"""
+        if self._meas_values is None:
+            if self._use_snapshot():
+                names = self.snapshot.standard_concepts("Meas Value")
+            else:
+                query = f"""
+                SELECT concept_id, concept_name
+                FROM {self.schema}.concept
+                WHERE domain_id = 'Meas Value'
+                  AND standard_concept = 'S'
+                  AND invalid_reason IS NULL
+                """
+                names = self.db_manager.execute_query(query)
+            names["name_lower"] = names["concept_name"].astype(str).str.lower()
+            names["name_length"] = names["concept_name"].astype(str).str.len()
+            self._meas_values = names.sort_values(["name_length", "concept_id"]).reset_index(drop=True)
+            print(f"✅ Loaded {len(self._meas_values)} 'Meas Value' concepts")
+        return self._meas_values
+
+    def ingredient_rollup(self, drug_concept_ids: Iterable[int]) -> pd.DataFrame:
+        """
+        Standard ingredient ancestors of drug concepts (from concept_ancestor).
+
+        Returns:
+            DataFrame of descendant_concept_id / ingredient_concept_id pairs; a drug
+            with several ingredients appears once per ingredient, drugs without an
+            ingredient ancestor are absent
+        """
+        ids = [int(i) for i in pd.unique(pd.Series(list(drug_concept_ids), dtype="object").dropna())]
+        if not ids:
+            return pd.DataFrame(columns=["descendant_concept_id", "ingredient_concept_id"])
+
+        with self._lock:
+            if self._use_snapshot():
+                return self.snapshot.ingredients_for(ids)
+
+        query = f"""
+        SELECT
+            ca.descendant_concept_id,
+            ca.ancestor_concept_id AS ingredient_concept_id
+        FROM {self.schema}.concept_ancestor ca
+        JOIN {self.schema}.concept c
+            ON c.concept_id = ca.ancestor_concept_id
+            AND c.concept_class_id = 'Ingredient'
+            AND c.standard_concept = 'S'
+        WHERE ca.descendant_concept_id = ANY(%(ids)s)
+        """
+        return self.db_manager.execute_query(query, {"ids": ids})
+
+    def search_concept_by_name(self, term: str, domain: str) -> Optional[pd.Series]:
+        """
+        Best standard concept whose name matches term (exact, starts with, then contains).
+
+        Name searches cannot be answered from the code index, so they run against the
+        database once per (term, domain) and are cached for the rest of the run.
+
+        Returns:
+            Row with concept_id, concept_name and match_priority, or None
+        """
+        key = (term, domain)
+        with self._lock:
+            if key in self._name_search_cache:
+                return self._name_search_cache[key]
+
+        query = f"""
+        SELECT
+            c.concept_id,
+            c.concept_name,
+            c.vocabulary_id,
+            c.standard_concept,
+            CASE
+                WHEN LOWER(c.concept_name) = LOWER(%(exact_term)s) THEN 1
+                WHEN LOWER(c.concept_name) LIKE LOWER(%(starts_with)s) THEN 2
+                WHEN LOWER(c.concept_name) LIKE LOWER(%(contains)s) THEN 3
+                ELSE 4
+            END as match_priority
+        FROM {self.schema}.concept c
+        WHERE (
+            LOWER(c.concept_name) ILIKE LOWER(%(contains)s)
+            OR LOWER(c.concept_name) ILIKE LOWER(%(starts_with)s)
+        )
+          AND c.domain_id = %(domain)s
+          AND c.standard_concept = 'S'
+          AND c.invalid_reason IS NULL
+        ORDER BY
+            match_priority,
+            LENGTH(c.concept_name)
+        LIMIT 1
+        """
+        result = self.db_manager.execute_query(query, {
+            "exact_term": term,
+            "starts_with": f"{term}%",
+            "contains": f"%{term}%",
+            "domain": domain
+        })
+        match = result.iloc[0] if not result.empty else None
+
+        with self._lock:
+            self._name_search_cache[key] = match
+        return match
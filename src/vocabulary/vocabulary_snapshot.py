@@ -0,0 +1,269 @@
+# src/vocabulary/vocabulary_snapshot.py
+"""
+Vocabulary Snapshot
+
+Persistent local copy of the vocabulary tables the pipeline reads: valid concepts
+with their "Maps to" target and the concept_ancestor rollup of drug concepts to
+standard ingredients. The snapshot is written once as uncompressed Arrow IPC files
+and memory-mapped by later runs. It is keyed by the rows of the `vocabulary` table
+and DatabaseConfig.schema_vocab, so a vocabulary refresh (or pointing the pipeline
+at another vocabulary schema) rebuilds it automatically.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from src.database.connection import DatabaseManager
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - snapshot is optional
+    pa = None
+    pc = None
+
+# Bump when the snapshot layout or the queries that build it change
+SNAPSHOT_FORMAT_VERSION = 1
+
+DEFAULT_SNAPSHOT_DIR = ".vocabulary_cache"
+
+SNAPSHOT_PREFIX = "vocab_"
+MANIFEST_FILE = "manifest.json"
+CONCEPT_FILE = "concept.arrow"
+INGREDIENT_FILE = "ingredient.arrow"
+
+
+def _concept_schema():
+    return pa.schema([
+        ("concept_id", pa.int64()),
+        ("concept_code", pa.string()),
+        ("concept_name", pa.string()),
+        ("vocabulary_id", pa.string()),
+        ("domain_id", pa.string()),
+        ("standard_concept", pa.string()),
+        ("maps_to_concept_id", pa.int64())
+    ])
+
+
+def _ingredient_schema():
+    return pa.schema([
+        ("descendant_concept_id", pa.int64()),
+        ("ingredient_concept_id", pa.int64())
+    ])
+
+
+class VocabularySnapshot:
+    """Build, validate and memory-map the on-disk vocabulary snapshot"""
+
+    def __init__(self, db_manager: DatabaseManager, cache_dir: Optional[str] = None,
+                 fetch_chunk_rows: int = 200000):
+        """
+        Initialize vocabulary snapshot.
+
+        Args:
+            db_manager: Database connection manager
+            cache_dir: Directory holding snapshots (default: VOCAB_SNAPSHOT_DIR or .vocabulary_cache)
+            fetch_chunk_rows: Rows streamed from PostgreSQL per Arrow record batch while building
+        """
+        self.db_manager = db_manager
+        self.schema = db_manager.config.schema_vocab
+        self.cache_dir = cache_dir or os.getenv("VOCAB_SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR)
+        self.fetch_chunk_rows = fetch_chunk_rows
+
+        self._lock = threading.Lock()
+        self._concepts = None
+        self._ingredients = None
+        self.path: Optional[str] = None
+
+    @staticmethod
+    def available() -> bool:
+        """True when pyarrow is installed"""
+        return pa is not None
+
+    @property
+    def is_open(self) -> bool:
+        return self._concepts is not None
+
+    def open(self) -> None:
+        """Memory-map the snapshot for the current vocabulary version, building it if needed"""
+        with self._lock:
+            if self._concepts is not None:
+                return
+            if pa is None:
+                raise ImportError("pyarrow is required for the vocabulary snapshot")
+
+            versions = self._get_vocabulary_versions()
+            key = self._snapshot_key(versions)
+            path = os.path.join(self.cache_dir, f"{SNAPSHOT_PREFIX}{key[:16]}")
+
+            if self._is_valid(path, key):
+                print(f"✅ Using vocabulary snapshot {path}")
+            else:
+                print(f"🔄 Vocabulary snapshot missing or stale, building {path}...")
+                self._build(path, key, versions)
+                self._remove_stale_snapshots(keep=path)
+
+            self._concepts = self._map(os.path.join(path, CONCEPT_FILE))
+            self._ingredients = self._map(os.path.join(path, INGREDIENT_FILE))
+            self.path = path
+            print(f"✅ Memory-mapped {self._concepts.num_rows} concepts and "
+                  f"{self._ingredients.num_rows} ingredient rollups")
+
+    # ------------------------------------------------------------------
+    # Lookups (only the matching rows are materialized as pandas)
+    # ------------------------------------------------------------------
+
+    def concepts_for_codes(self, codes: Iterable[str]) -> pd.DataFrame:
+        """Valid concepts whose concept_code is in codes, with their "Maps to" target"""
+        mask = pc.is_in(self._concepts["concept_code"], value_set=pa.array(list(codes), type=pa.string()))
+        return self._concepts.filter(mask).to_pandas()
+
+    def concepts_by_name(self, names: Iterable[str], domain: str) -> pd.DataFrame:
+        """Standard concepts of a domain whose concept_name is in names"""
+        table = self._concepts
+        mask = pc.and_(
+            pc.and_(pc.equal(table["domain_id"], domain), pc.equal(table["standard_concept"], "S")),
+            pc.is_in(table["concept_name"], value_set=pa.array(list(names), type=pa.string()))
+        )
+        return table.filter(mask).select(["concept_name", "concept_id"]).to_pandas()
+
+    def standard_concepts(self, domain: str) -> pd.DataFrame:
+        """All standard concepts of a domain"""
+        table = self._concepts
+        mask = pc.and_(pc.equal(table["domain_id"], domain), pc.equal(table["standard_concept"], "S"))
+        return table.filter(mask).select(["concept_id", "concept_name"]).to_pandas()
+
+    def ingredients_for(self, drug_concept_ids: Iterable[int]) -> pd.DataFrame:
+        """(descendant_concept_id, ingredient_concept_id) pairs for the given drug concepts"""
+        ids = pa.array([int(i) for i in drug_concept_ids], type=pa.int64())
+        mask = pc.is_in(self._ingredients["descendant_concept_id"], value_set=ids)
+        return self._ingredients.filter(mask).to_pandas()
+
+    # ------------------------------------------------------------------
+    # Versioning
+    # ------------------------------------------------------------------
+
+    def _get_vocabulary_versions(self) -> List[Dict[str, str]]:
+        query = f"""
+        SELECT vocabulary_id, vocabulary_version
+        FROM {self.schema}.vocabulary
+        ORDER BY vocabulary_id
+        """
+        result = self.db_manager.execute_query(query)
+        return [
+            {"vocabulary_id": str(row["vocabulary_id"]), "vocabulary_version": str(row["vocabulary_version"])}
+            for _, row in result.iterrows()
+        ]
+
+    def _snapshot_key(self, versions: List[Dict[str, str]]) -> str:
+        payload = json.dumps({
+            "format": SNAPSHOT_FORMAT_VERSION,
+            "schema_vocab": self.schema,
+            "versions": versions
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_valid(self, path: str, key: str) -> bool:
+        try:
+            with open(os.path.join(path, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        return (manifest.get("key") == key
+                and os.path.exists(os.path.join(path, CONCEPT_FILE))
+                and os.path.exists(os.path.join(path, INGREDIENT_FILE)))
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def _build(self, path: str, key: str, versions: List[Dict[str, str]]) -> None:
+        """Stream the vocabulary slice into Arrow files, then swap the directory in atomically"""
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        try:
+            concept_query = f"""
+            SELECT
+                c.concept_id,
+                c.concept_code,
+                c.concept_name,
+                c.vocabulary_id,
+                c.domain_id,
+                c.standard_concept,
+                mt.maps_to_concept_id
+            FROM {self.schema}.concept c
+            LEFT JOIN (
+                SELECT concept_id_1, MIN(concept_id_2) AS maps_to_concept_id
+                FROM {self.schema}.concept_relationship
+                WHERE relationship_id = 'Maps to'
+                  AND invalid_reason IS NULL
+                GROUP BY concept_id_1
+            ) mt ON c.concept_id = mt.concept_id_1
+            WHERE c.invalid_reason IS NULL
+            ORDER BY c.concept_code
+            """
+            concepts = self._write_query(concept_query, os.path.join(tmp_path, CONCEPT_FILE), _concept_schema())
+            print(f"   ✅ Snapshotted {concepts} concepts")
+
+            ingredient_query = f"""
+            SELECT
+                ca.descendant_concept_id,
+                ca.ancestor_concept_id AS ingredient_concept_id
+            FROM {self.schema}.concept_ancestor ca
+            JOIN {self.schema}.concept c
+                ON c.concept_id = ca.ancestor_concept_id
+                AND c.concept_class_id = 'Ingredient'
+                AND c.standard_concept = 'S'
+            ORDER BY ca.descendant_concept_id
+            """
+            ingredients = self._write_query(ingredient_query, os.path.join(tmp_path, INGREDIENT_FILE), _ingredient_schema())
+            print(f"   ✅ Snapshotted {ingredients} ingredient rollups")
+
+            manifest = {
+                "key": key,
+                "format": SNAPSHOT_FORMAT_VERSION,
+                "schema_vocab": self.schema,
+                "versions": versions,
+                "concepts": concepts,
+                "ingredient_rollups": ingredients,
+                "created_at": datetime.now().isoformat()
+            }
+            with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+                json.dump(manifest, f, indent=2)
+
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def _write_query(self, query: str, file_path: str, schema) -> int:
+        """Stream a query into an Arrow IPC file one record batch at a time"""
+        rows = 0
+        with self.db_manager.engine.connect().execution_options(stream_results=True) as conn:
+            with pa.OSFile(file_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+                for chunk in pd.read_sql(query, conn, chunksize=self.fetch_chunk_rows):
+                    writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+                    rows += len(chunk)
+        return rows
+
+    @staticmethod
+    def _map(file_path: str):
+        """Open an Arrow IPC file without copying it into memory"""
+        return pa.ipc.open_file(pa.memory_map(file_path, "r")).read_all()
+
+    def _remove_stale_snapshots(self, keep: str) -> None:
+        for name in os.listdir(self.cache_dir):
+            candidate = os.path.join(self.cache_dir, name)
+            if (name.startswith(SNAPSHOT_PREFIX) and ".tmp-" not in name
+                    and candidate != keep and os.path.isdir(candidate)):
+                shutil.rmtree(candidate, ignore_errors=True)
+                print(f"   🗑️ Removed stale vocabulary snapshot {candidate}")